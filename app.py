@@ -15,25 +15,49 @@ if getattr(sys, 'frozen', False):
     sys.stdout = NULL_FILE
     sys.stderr = NULL_FILE
 import time
+import itertools
+import tracemalloc
+import gc
 import re
 from datetime import datetime
 import subprocess
 import pandas as pd
 import pdfplumber
 from openpyxl import load_workbook, Workbook
+from openpyxl.styles.cell_style import StyleArray
 import traceback
-import tkinter as tk
-from tkinter import filedialog, messagebox, ttk, Toplevel, Label, Radiobutton, Button, StringVar, Frame
-from PIL import Image, ImageTk
+import argparse
+import sqlite3
+import copy
+import atexit
+import random
+import tempfile
+import shutil
+import platform
+# `python app.py batch ...` roda o pipeline sem interface: nesse modo o Tk nem chega a ser importado.
+COMANDOS_HEADLESS = ("batch", "bench", "historico")
+MODO_HEADLESS = len(sys.argv) > 1 and sys.argv[1] in COMANDOS_HEADLESS
+if not MODO_HEADLESS:
+    import tkinter as tk
+    from tkinter import filedialog, messagebox, ttk, Toplevel, Label, Radiobutton, Button, StringVar, Frame
+    from PIL import ImageTk
+from PIL import Image, ImageOps
 from docx import Document
 from docx.shared import Pt
+from docx.oxml.ns import qn
+from docx.table import _Cell
+from docx.text.paragraph import Paragraph as ParagrafoDocx
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 import unicodedata
+from xml.sax.saxutils import escape as xml_escape
 from azure.ai.vision.imageanalysis import ImageAnalysisClient
 from azure.ai.vision.imageanalysis.models import VisualFeatures
 from azure.core.credentials import AzureKeyCredential
 import fitz  # PyMuPDF
-from docx2pdf import convert
+try:
+    from docx2pdf import convert  # Só funciona com o Word instalado; os PDFs novos são gerados pelo reportlab.
+except ImportError:
+    convert = None
 import locale
 import smtplib
 from email.mime.multipart import MIMEMultipart
@@ -49,11 +73,22 @@ import threading
 import queue
 import requests
 import collections
+import ctypes
+import ctypes.util
+import select
+import struct
+import contextlib
+import io
+import zipfile
+import hashlib
+import pickle
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4, landscape
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, LongTable, Flowable
 from reportlab.platypus import Image as ReportLabImage
-from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
@@ -83,120 +118,268 @@ try:
 except Exception as e:
     pass
 
-def gerar_pdf_reportlab_ajustado(path_destino, dados_relatorio, filtros_aplicados):
-    doc = SimpleDocTemplate(
-        path_destino,
+def _fonte_pdf(negrito=False):
+    # Arial só existe se a fonte foi registrada (Windows); no servidor cai para a Helvetica embutida.
+    nome = 'Arial-Bold' if negrito else 'Arial'
+    if nome in pdfmetrics.getRegisteredFontNames():
+        return nome
+    return 'Helvetica-Bold' if negrito else 'Helvetica'
+
+# ==============================================================================
+# Relatório de Pedidos em Fluxo
+# ==============================================================================
+# As linhas vêm de um iterador e só uma página delas existe por vez: a tabela se divide em
+# LongTables do tamanho da página, cada uma com o cabeçalho, e os totais são somados conforme
+# as linhas passam. Estilos e fontes são montados uma vez por processo.
+# O canvas do reportlab guarda todas as páginas até o save, então o relatório é gerado em partes
+# de PAGINAS_POR_PARTE_RELATORIO páginas, anexadas ao arquivo final com gravação incremental.
+PAGINAS_POR_PARTE_RELATORIO = 200
+CABECALHO_RELATORIO_PEDIDOS = ["Data Pedido", "Nro. Pedido", "Cliente", "Cidade Dest.", "Roteiro", "Peso (Ton)", "Valor Frete"]
+LARGURAS_RELATORIO_PEDIDOS = [1.0*inch, 1.0*inch, 2.5*inch, 1.8*inch, 1.5*inch, 1.0*inch, 1.2*inch]
+_ESTILOS_RELATORIO = {}
+
+def _estilos_relatorio_pedidos():
+    if not _ESTILOS_RELATORIO:
+        styles = getSampleStyleSheet()
+        _ESTILOS_RELATORIO["h1"] = ParagraphStyle("RelatorioH1", parent=styles['Heading1'], fontName=_fonte_pdf(True), fontSize=16, alignment=1)
+        _ESTILOS_RELATORIO["h2"] = ParagraphStyle("RelatorioH2", parent=styles['Heading2'], fontName=_fonte_pdf(True), fontSize=12, alignment=1)
+        _ESTILOS_RELATORIO["normal"] = ParagraphStyle("RelatorioNormal", parent=styles['Normal'], fontName=_fonte_pdf(), fontSize=10, alignment=1)
+        _ESTILOS_RELATORIO["cabecalho"] = TableStyle([
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('ALIGN', (0, 0), (0, 0), 'LEFT'),
+            ('ALIGN', (1, 0), (1, 0), 'CENTER'),
+        ])
+        _ESTILOS_RELATORIO["tabela"] = TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#04D9C4')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('FONTNAME', (0, 0), (-1, 0), _fonte_pdf(True)),
+            ('FONTNAME', (0, 1), (-1, -1), _fonte_pdf()),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+        ])
+        _ESTILOS_RELATORIO["totais"] = TableStyle([
+            ('ALIGN', (0, 0), (-1, -1), 'RIGHT'),
+            ('FONTNAME', (0, 0), (0, -1), _fonte_pdf()),
+            ('FONTNAME', (1, 0), (1, -1), _fonte_pdf(True)),
+            ('BACKGROUND', (0, 0), (-1, -1), colors.whitesmoke),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ])
+    return _ESTILOS_RELATORIO
+
+def _numero_relatorio(valor):
+    # Aceita número ou texto no formato brasileiro ("1.234,56", "R$ 350,00").
+    if isinstance(valor, (int, float)):
+        return float(valor)
+    texto = str(valor or "").replace("R$", "").strip()
+    if "," in texto:
+        texto = texto.replace(".", "").replace(",", ".")
+    try:
+        return float(texto)
+    except ValueError:
+        return 0.0
+
+class TotaisRelatorioPedidos:
+    """Acumula os totais enquanto as linhas passam pelo relatório."""
+    def __init__(self):
+        self.pedidos = 0
+        self.peso = 0.0
+        self.frete = 0.0
+
+    def somar(self, item):
+        self.pedidos += 1
+        self.peso += _numero_relatorio(item.get('Peso (Ton)', ''))
+        self.frete += _numero_relatorio(item.get('Valor Frete', ''))
+
+    @property
+    def media_frete_ton(self):
+        return self.frete / self.peso if self.peso else 0.0
+
+class _LinhasRelatorioPedidos:
+    """Iterador de linhas compartilhado pelos pedaços da tabela, com devolução das linhas que
+    não couberam na página e soma dos totais."""
+    def __init__(self, itens, totais):
+        self._itens = iter(itens)
+        self._devolvidas = []
+        self.totais = totais
+        self.altura_linha = None
+        self.emitiu = False
+
+    def proxima(self):
+        if self._devolvidas:
+            return self._devolvidas.pop()
+        item = next(self._itens, None)
+        if item is None:
+            return None
+        self.totais.somar(item)
+        return [item.get(c, '') for c in CABECALHO_RELATORIO_PEDIDOS]
+
+    def devolver(self, linha):
+        self._devolvidas.append(linha)
+
+    def esgotada(self):
+        linha = self.proxima()
+        if linha is None:
+            return True
+        self.devolver(linha)
+        return False
+
+def _tabela_relatorio_pedidos(linhas):
+    return LongTable([CABECALHO_RELATORIO_PEDIDOS] + linhas, colWidths=LARGURAS_RELATORIO_PEDIDOS, repeatRows=1, style=_estilos_relatorio_pedidos()["tabela"])
+
+class _TabelaPedidosEmFluxo(Flowable):
+    """Tabela que nunca cabe inteira: a cada página o frame pede a divisão e ela devolve uma
+    LongTable com o cabeçalho e as linhas que cabem, seguida de um novo pedaço com o restante,
+    até `paginas` pedaços."""
+    def __init__(self, linhas, paginas):
+        Flowable.__init__(self)
+        self._linhas = linhas
+        self._paginas = paginas
+        self._largura = sum(LARGURAS_RELATORIO_PEDIDOS)
+        self._vazia = None
+
+    def wrap(self, availWidth, availHeight):
+        if self._linhas.esgotada():
+            if self._linhas.emitiu:
+                return (self._largura, 0)
+            # Sem itens: só o cabeçalho, como antes.
+            self._vazia = _tabela_relatorio_pedidos([])
+            return self._vazia.wrap(availWidth, availHeight)
+        return (self._largura, availHeight + 1)  # força o split
+
+    def split(self, availWidth, availHeight):
+        if self._linhas.altura_linha is None:
+            self._linhas.altura_linha = _tabela_relatorio_pedidos([["x"] * len(CABECALHO_RELATORIO_PEDIDOS)]).wrap(availWidth, availHeight)[1] / 2
+        linhas = []
+        for _ in range(max(int(availHeight // self._linhas.altura_linha) - 1, 0)):
+            linha = self._linhas.proxima()
+            if linha is None:
+                break
+            linhas.append(linha)
+        tabela = _tabela_relatorio_pedidos(linhas)
+        # Linhas com quebra de texto são mais altas; devolve as que sobrarem até caber.
+        while linhas and tabela.wrap(availWidth, availHeight)[1] > availHeight:
+            self._linhas.devolver(linhas.pop())
+            tabela = _tabela_relatorio_pedidos(linhas)
+        if not linhas:
+            return []
+        self._linhas.emitiu = True
+        if self._paginas <= 1 or self._linhas.esgotada():
+            return [tabela]
+        return [tabela, _TabelaPedidosEmFluxo(self._linhas, self._paginas - 1)]
+
+    def draw(self):
+        if self._vazia is not None:
+            self._vazia.drawOn(self.canv, 0, 0)
+
+class _TotaisRelatorioFlowable(Flowable):
+    # Só é montada quando chega a vez dela, depois de a tabela consumir todas as linhas; numa
+    # parte que termina antes disso não ocupa espaço.
+    def __init__(self, linhas, fixos=None):
+        Flowable.__init__(self)
+        self._linhas = linhas
+        self._fixos = fixos
+        self._tabela = None
+        self.hAlign = 'RIGHT'
+
+    def _montar(self):
+        if self._fixos:
+            pedidos, peso, media = self._fixos
+        else:
+            totais = self._linhas.totais
+            pedidos, peso, media = totais.pedidos, totais.peso, totais.media_frete_ton
+        totais = [
+            ["Total Geral de Pedidos: ", str(pedidos)],
+            ["Peso Total (Ton): ", f"{peso:.2f}".replace('.', ',')],
+            ["Média do Frete/Ton: ", f"R$ {media:.2f}".replace('.', ',')],
+        ]
+        self._tabela = Table(totais, colWidths=[2.5*inch, 1.2*inch], hAlign='RIGHT', style=_estilos_relatorio_pedidos()["totais"])
+
+    def getSpaceBefore(self):
+        return 0.3 * inch if self._linhas.esgotada() else 0
+
+    def wrap(self, availWidth, availHeight):
+        if not self._linhas.esgotada():
+            self.width = self.height = 0
+        else:
+            if self._tabela is None:
+                self._montar()
+            self.width, self.height = self._tabela.wrap(availWidth, availHeight)
+        return self.width, self.height
+
+    def draw(self):
+        if self._tabela is not None:
+            self._tabela.drawOn(self.canv, 0, 0)
+
+def _doc_relatorio_pedidos(caminho):
+    return SimpleDocTemplate(
+        caminho,
         pagesize=landscape(A4),
         leftMargin=0.75 * inch,
         rightMargin=0.75 * inch,
         topMargin=0.5 * inch,
         bottomMargin=0.5 * inch
     )
-    styles = getSampleStyleSheet()
-    Story = []
 
-    style_h1 = styles['Heading1']
-    style_h1.fontName = 'Arial-Bold'
-    style_h1.fontSize = 16
-    style_h1.alignment = 1
-
-    title_paragraph = Paragraph("ATLÂNTICO FERTLOG", style_h1)
+def _cabecalho_relatorio_pedidos(doc, periodo, filtros_aplicados):
+    estilos = _estilos_relatorio_pedidos()
     logo_obj = None
     LOGO_WIDTH = 2.4 * inch
     LOGO_HEIGHT = 1.2 * inch
-
     try:
         if os.path.exists(LOGO_RELATORIO_PATH):
-            logo_obj = ReportLabImage(
-                LOGO_RELATORIO_PATH,
-                width=LOGO_WIDTH,
-                height=LOGO_HEIGHT,
-                kind='proportional'
-            )
+            logo_obj = ReportLabImage(LOGO_RELATORIO_PATH, width=LOGO_WIDTH, height=LOGO_HEIGHT, kind='proportional')
     except Exception as e:
         print(f"Erro ao carregar logo: {e}. Prosseguindo sem a imagem.")
-        logo_obj = Paragraph(" ", styles['Normal'])
-
-    header_data = [[logo_obj, title_paragraph, '']]
-    page_width = doc.width
-    logo_col_width = LOGO_WIDTH
-    center_col_width = page_width - (2 * logo_col_width)
-    header_table = Table(header_data, colWidths=[logo_col_width, center_col_width, logo_col_width])
-    header_table.setStyle(TableStyle([
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('ALIGN', (0, 0), (0, 0), 'LEFT'),
-        ('ALIGN', (1, 0), (1, 0), 'CENTER'),
-    ]))
-    Story.append(header_table)
-    Story.append(Spacer(1, 0.2 * inch))
-
-    style_h2 = styles['Heading2']
-    style_h2.fontName = 'Arial-Bold'
-    style_h2.fontSize = 12
-    style_h2.alignment = 1
-
-    titulo_relatorio = f"RELATÓRIO DE PEDIDOS - {dados_relatorio['Periodo']}"
-    Story.append(Paragraph(titulo_relatorio, style_h2))
-    Story.append(Spacer(1, 0.1 * inch))
-
-    style_normal = styles['Normal']
-    style_normal.fontName = 'Arial'
-    style_normal.fontSize = 10
-    style_normal.alignment = 1
-
+        logo_obj = Paragraph(" ", estilos["normal"])
+    center_col_width = doc.width - (2 * LOGO_WIDTH)
     data_emissao = datetime.now().strftime('%d/%m/%Y')
-    filtros_texto = f"Filtros Aplicados: {filtros_aplicados} | Data de Emissão: {data_emissao}"
-    Story.append(Paragraph(filtros_texto, style_normal))
-    Story.append(Spacer(1, 0.2 * inch))
-
-    headers = ["Data Pedido", "Nro. Pedido", "Cliente", "Cidade Dest.", "Roteiro", "Peso (Ton)", "Valor Frete"]
-    table_data = [headers]
-    for item in dados_relatorio['Itens']:
-        table_data.append([
-            item.get('Data Pedido', ''),
-            item.get('Nro. Pedido', ''),
-            item.get('Cliente', ''),
-            item.get('Cidade Dest.', ''),
-            item.get('Roteiro', ''),
-            item.get('Peso (Ton)', ''),
-            item.get('Valor Frete', ''),
-        ])
-
-    col_widths = [1.0*inch, 1.0*inch, 2.5*inch, 1.8*inch, 1.5*inch, 1.0*inch, 1.2*inch]
-    t = Table(table_data, colWidths=col_widths)
-    table_style = TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#04D9C4')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Arial-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-    ])
-    t.setStyle(table_style)
-    Story.append(t)
-    Story.append(Spacer(1, 0.3 * inch))
-
-    totais = [
-        ["Total Geral de Pedidos: ", str(dados_relatorio['Total Geral de Pedidos'])],
-        ["Peso Total (Ton): ", f"{dados_relatorio['Peso Total (Ton)']:.2f}".replace('.', ',')],
-        ["Média do Frete/Ton: ", f"R$ {dados_relatorio['Media Frete / Ton']:.2f}".replace('.', ',')],
+    return [
+        Table([[logo_obj, Paragraph("ATLÂNTICO FERTLOG", estilos["h1"]), '']], colWidths=[LOGO_WIDTH, center_col_width, LOGO_WIDTH], style=estilos["cabecalho"]),
+        Spacer(1, 0.2 * inch),
+        Paragraph(f"RELATÓRIO DE PEDIDOS - {periodo}", estilos["h2"]),
+        Spacer(1, 0.1 * inch),
+        Paragraph(f"Filtros Aplicados: {filtros_aplicados} | Data de Emissão: {data_emissao}", estilos["normal"]),
+        Spacer(1, 0.2 * inch),
     ]
 
-    t_totais = Table(totais, colWidths=[2.5*inch, 1.2*inch], hAlign='RIGHT')
-    t_totais_style = TableStyle([
-        ('ALIGN', (0, 0), (-1, -1), 'RIGHT'),
-        ('FONTNAME', (0, 0), (0, -1), 'Arial'),
-        ('FONTNAME', (1, 0), (1, -1), 'Arial-Bold'),
-        ('BACKGROUND', (0, 0), (-1, -1), colors.whitesmoke),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
+def gerar_relatorio_pedidos(path_destino, itens, periodo, filtros_aplicados, totais_fixos=None):
+    """Gera o relatório de pedidos a partir de qualquer iterável de itens (dicts com as colunas de
+    CABECALHO_RELATORIO_PEDIDOS). `totais_fixos` = (pedidos, peso, média frete/ton) substitui os
+    totais somados das linhas. Devolve o TotaisRelatorioPedidos acumulado."""
+    totais = TotaisRelatorioPedidos()
+    linhas = _LinhasRelatorioPedidos(itens, totais)
+
+    # Primeira parte direto no destino; as seguintes num temporário, anexadas com saveIncr, que
+    # só acrescenta os objetos novos ao arquivo sem carregar as páginas já gravadas.
+    doc = _doc_relatorio_pedidos(path_destino)
+    doc.build(_cabecalho_relatorio_pedidos(doc, periodo, filtros_aplicados) + [
+        _TabelaPedidosEmFluxo(linhas, PAGINAS_POR_PARTE_RELATORIO),
+        _TotaisRelatorioFlowable(linhas, totais_fixos),
     ])
-    t_totais.setStyle(t_totais_style)
-    Story.append(t_totais)
+    if linhas.esgotada():
+        return totais
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho_parte = os.path.join(pasta, "parte.pdf")
+        while not linhas.esgotada():
+            _doc_relatorio_pedidos(caminho_parte).build([
+                _TabelaPedidosEmFluxo(linhas, PAGINAS_POR_PARTE_RELATORIO),
+                _TotaisRelatorioFlowable(linhas, totais_fixos),
+            ])
+            with fitz.open(path_destino) as saida, fitz.open(caminho_parte) as parte:
+                saida.insert_pdf(parte)
+                saida.saveIncr()
+            # Documento e canvas do reportlab se referenciam em ciclo; sem a coleta, as páginas de
+            # várias partes ficam na memória até o gc rodar sozinho.
+            gc.collect()
+    return totais
 
-    doc.build(Story)
+def gerar_pdf_reportlab_ajustado(path_destino, dados_relatorio, filtros_aplicados):
+    totais_fixos = (dados_relatorio['Total Geral de Pedidos'], dados_relatorio['Peso Total (Ton)'], dados_relatorio['Media Frete / Ton'])
+    gerar_relatorio_pedidos(path_destino, dados_relatorio['Itens'], dados_relatorio['Periodo'], filtros_aplicados, totais_fixos)
 
 BSOFT_CATEGORY_ID_TO_RODADO_ID_MAP = {7: '00', 8: '05', 11: '01', 3: '00', 1: '03', 9: '03', 10: '03', 2: '00', 12: '00', 13: '00', 4: '01', 6: '02', 5: '04'}
 
@@ -227,6 +410,10 @@ SENHA_APP_EMAIL_LEITURA = "pvfk jzdi jicq xonx"
 EMAIL_FABRICA = "elisangela.santos@fertimaxi.com.br"
 LOGO_RELATORIO_PATH = resource_path("dados/file.jpg")
 LOGO_APP_PATH = resource_path("dados/logo.png") # Caminho para o novo logo da UI
+# Caches e dados locais ficam fora do _MEIPASS, que é temporário no executável congelado.
+PASTA_LOCAL = os.path.dirname(sys.executable) if getattr(sys, 'frozen', False) else os.path.abspath(".")
+CACHE_DIR = os.path.join(PASTA_LOCAL, "cache")
+BANCO_CARREGAMENTOS_PATH = os.path.join(PASTA_LOCAL, "carregamentos.sqlite3")
 
 BSOFT_API_BASE_URL = "https://atlanticofertlog.bsoft.app/services/index.php/pessoas/v1/pessoas/fisicas"
 BSOFT_API_USER = "API"
@@ -247,6 +434,305 @@ BSOFT_SIMPLE_BRANDS_LIST = sorted(list(set(marca for marca, categoria in BSOFT_M
 def _get_timestamp():
     return datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
 
+def _notificar(tipo, titulo, mensagem):
+    # tipo: "info", "warning" ou "error". Sem interface a mensagem vai só para o console.
+    if MODO_HEADLESS:
+        print(f"{_get_timestamp()} [{tipo.upper()}] {titulo}: {mensagem}")
+        return
+    getattr(messagebox, f"show{tipo}")(titulo, mensagem)
+
+def _caminho_cache(nome_arquivo):
+    return os.path.join(CACHE_DIR, nome_arquivo)
+
+def _hash_arquivo(caminho):
+    sha = hashlib.sha256()
+    with open(caminho, "rb") as f:
+        for bloco in iter(lambda: f.read(1024 * 1024), b""):
+            sha.update(bloco)
+    return sha.hexdigest()
+
+def _gravar_pickle_atomico(caminho, objeto):
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    caminho_tmp = f"{caminho}.{os.getpid()}.tmp"
+    with open(caminho_tmp, "wb") as f:
+        pickle.dump(objeto, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(caminho_tmp, caminho)
+
+class CacheDisco:
+    """Cache em disco de entradas JSON (um arquivo por chave) com despejo LRU por tamanho total.
+    O mtime de cada arquivo marca o último acesso. Acessos e tamanhos ficam também num índice em
+    memória, montado com uma varredura do diretório na primeira gravação. O diretório só é varrido
+    de novo quando o total do índice passa de `limite_bytes` ou depois de gravar a folga
+    (1 - FRACAO_APOS_DESPEJO) do limite, o que pega o que outros processos gravaram ou apagaram.
+    Passando do limite, os mais antigos saem até FRACAO_APOS_DESPEJO dele, para que o despejo
+    seguinte só venha depois de muitas gravações."""
+    EXTENSAO = ".json"
+    FRACAO_APOS_DESPEJO = 0.9
+
+    def __init__(self, diretorio, limite_bytes):
+        self.diretorio = diretorio
+        self.limite_bytes = limite_bytes
+        self._lock_indice = threading.Lock()
+        self._indice = None  # {caminho: [último acesso, tamanho]}
+        self._total = 0
+        self._gravado_desde_varredura = 0
+
+    def _caminho(self, chave):
+        return os.path.join(self.diretorio, f"{chave}{self.EXTENSAO}")
+
+    def obter(self, chave):
+        caminho = self._caminho(chave)
+        try:
+            with open(caminho, "r", encoding="utf-8") as f:
+                valor = json.load(f)
+            os.utime(caminho)
+            self._registrar_acesso(caminho)
+            return valor
+        except (OSError, ValueError):
+            return None
+
+    def guardar(self, chave, valor):
+        try:
+            os.makedirs(self.diretorio, exist_ok=True)
+            caminho = self._caminho(chave)
+            caminho_tmp = f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(caminho_tmp, "w", encoding="utf-8") as f:
+                json.dump(valor, f, ensure_ascii=False)
+            os.replace(caminho_tmp, caminho)
+            self._registrar_acesso(caminho, os.path.getsize(caminho))
+            self._despejar()
+        except OSError as e:
+            print(f"Aviso: não foi possível gravar no cache '{self.diretorio}': {e}")
+
+    def _registrar_acesso(self, caminho, tamanho=None):
+        # Leitura (tamanho None) ou gravação de `caminho`; sem índice ainda, o despejo monta.
+        with self._lock_indice:
+            if self._indice is None:
+                return
+            anterior = self._indice.get(caminho)
+            if tamanho is None:
+                if anterior:
+                    anterior[0] = time.time()
+                return
+            self._total += tamanho - (anterior[1] if anterior else 0)
+            self._gravado_desde_varredura += tamanho
+            self._indice[caminho] = [time.time(), tamanho]
+
+    def _remover(self, caminho):
+        os.remove(caminho)
+        with self._lock_indice:
+            if self._indice is not None and caminho in self._indice:
+                self._total -= self._indice.pop(caminho)[1]
+
+    def _varrer(self):
+        indice = {}
+        for entrada in os.scandir(self.diretorio):
+            if entrada.name.endswith(self.EXTENSAO):
+                try:
+                    st = entrada.stat()
+                    indice[entrada.path] = [st.st_mtime, st.st_size]
+                except OSError:
+                    continue
+        self._indice, self._total = indice, sum(tamanho for _, tamanho in indice.values())
+        self._gravado_desde_varredura = 0
+
+    def _despejar(self):
+        with self._lock_indice:
+            folga = self.limite_bytes * (1 - self.FRACAO_APOS_DESPEJO)
+            if self._indice is None or self._total > self.limite_bytes or self._gravado_desde_varredura >= folga:
+                self._varrer()
+            if self._total <= self.limite_bytes:
+                return
+            alvo = self.limite_bytes * self.FRACAO_APOS_DESPEJO
+            for caminho, (_, tamanho) in sorted(self._indice.items(), key=lambda item: item[1][0]):
+                if self._total <= alvo:
+                    break
+                try:
+                    os.remove(caminho)
+                except FileNotFoundError:
+                    pass
+                except OSError:
+                    continue
+                del self._indice[caminho]
+                self._total -= tamanho
+
+class CacheSaidas(CacheDisco):
+    """Documentos gerados (O.C., planilha do motorista, Carta Frete) guardados pelo hash dos
+    arquivos de modelo mais todas as entradas. Se a chave já existe, o arquivo é copiado em vez
+    de gerado de novo. Conta acertos e faltas por tipo de documento."""
+    EXTENSAO = ".saida"
+
+    def __init__(self, diretorio, limite_bytes):
+        super().__init__(diretorio, limite_bytes)
+        self._lock = threading.Lock()
+        self._hashes_modelos = {}
+        self.contagem = {}
+
+    def _hash_modelo(self, caminho):
+        # Cada modelo só é lido de novo quando muda no disco; sem o arquivo (ex.: logo opcional) vale None.
+        try:
+            st = os.stat(caminho)
+        except OSError:
+            return None
+        assinatura = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            memo = self._hashes_modelos.get(caminho)
+        if memo and memo[0] == assinatura:
+            return memo[1]
+        sha = _hash_arquivo(caminho)
+        with self._lock:
+            self._hashes_modelos[caminho] = (assinatura, sha)
+        return sha
+
+    def chave(self, tipo, modelos, entradas):
+        base = {"tipo": tipo, "versao": VERSAO_SAIDAS, "modelos": [self._hash_modelo(m) for m in modelos], "entradas": entradas}
+        return hashlib.sha256(json.dumps(base, sort_keys=True, default=str, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+    def _contar(self, tipo, campo):
+        with self._lock:
+            contagem = self.contagem.setdefault(tipo, {"acertos": 0, "faltas": 0})
+            contagem[campo] += 1
+            return dict(contagem)
+
+    def copiar_contagem(self):
+        with self._lock:
+            return {tipo: dict(c) for tipo, c in self.contagem.items()}
+
+    def somar_contagem(self, contagem):
+        # Acertos e faltas de outro processo (ver _com_contagem_cache_saidas).
+        with self._lock:
+            for tipo, c in contagem.items():
+                alvo = self.contagem.setdefault(tipo, {"acertos": 0, "faltas": 0})
+                for campo, valor in c.items():
+                    alvo[campo] += valor
+
+    def produzir(self, tipo, modelos, entradas, destino, gerar):
+        """Copia para `destino` o arquivo guardado sob a mesma chave ou chama `gerar(destino)` e
+        guarda o resultado. Devolve True quando o arquivo veio do cache."""
+        chave = self.chave(tipo, modelos, entradas)
+        guardado = self._caminho(chave)
+        try:
+            shutil.copyfile(guardado, destino)
+            os.utime(guardado)
+            self._registrar_acesso(guardado)
+            contagem = self._contar(tipo, "acertos")
+            print(f"{_get_timestamp()} [CACHE SAÍDAS] {tipo}: '{os.path.basename(destino)}' reaproveitado ({contagem['acertos']} acerto(s), {contagem['faltas']} falta(s)).")
+            return True
+        except OSError:
+            pass
+        gerar(destino)
+        self._contar(tipo, "faltas")
+        try:
+            os.makedirs(self.diretorio, exist_ok=True)
+            caminho_tmp = f"{guardado}.{os.getpid()}.{threading.get_ident()}.tmp"
+            shutil.copyfile(destino, caminho_tmp)
+            os.replace(caminho_tmp, guardado)
+            self._registrar_acesso(guardado, os.path.getsize(guardado))
+            self._despejar()
+        except OSError as e:
+            print(f"Aviso: não foi possível gravar no cache '{self.diretorio}': {e}")
+        return False
+
+    def estatisticas(self):
+        with self._lock:
+            por_tipo = {tipo: dict(c) for tipo, c in self.contagem.items()}
+        acertos = sum(c["acertos"] for c in por_tipo.values())
+        faltas = sum(c["faltas"] for c in por_tipo.values())
+        return {"acertos": acertos, "faltas": faltas, "por_tipo": por_tipo}
+
+# Incrementar VERSAO_SAIDAS sempre que o layout ou o preenchimento de algum documento mudar.
+VERSAO_SAIDAS = 2
+LIMITE_CACHE_SAIDAS_BYTES = 200 * 1024 * 1024
+CACHE_SAIDAS = CacheSaidas(_caminho_cache("saidas"), LIMITE_CACHE_SAIDAS_BYTES)
+
+# ==============================================================================
+# Motor de Regras de Extração
+# ==============================================================================
+# Cada extrator (contrato, CNH, CRLV, pedido Heringer...) declara um ConjuntoRegras com
+# os campos e seus regexes, compilados uma única vez na importação. O texto do documento
+# é normalizado uma única vez (TextoDocumento) e cada campo tenta as regras em ordem até
+# a primeira que casar e for aceita.
+
+class TextoDocumento:
+    """Visões do texto de um documento, calculadas sob demanda e reaproveitadas entre regras."""
+
+    VISOES = {
+        "original": lambda d: d.original,
+        "upper": lambda d: d.original.upper(),
+        "upper_linha_unica": lambda d: d.visao("upper").replace('\n', ' '),
+        "linhas": lambda d: d.original.splitlines(),
+        "linhas_upper": lambda d: d.visao("upper").split('\n'),
+    }
+
+    def __init__(self, texto):
+        self.original = texto or ""
+        self._visoes = {}
+
+    def visao(self, nome):
+        if nome not in self._visoes:
+            self._visoes[nome] = self.VISOES[nome](self)
+        return self._visoes[nome]
+
+class Regra:
+    """Um regex pré-compilado aplicado a uma visão do texto. `extrair` transforma o match no
+    valor bruto, `aceitar` pode recusá-lo (passando a vez para a próxima regra) e `converter`
+    formata o valor aceito."""
+
+    def __init__(self, nome, padrao, visao="original", flags=0, extrair=None, aceitar=None, converter=None):
+        self.nome = nome
+        self.padrao = re.compile(padrao, flags)
+        self.visao = visao
+        self.extrair = extrair or (lambda m: m.group(1).strip())
+        self.aceitar = aceitar
+        self.converter = converter
+
+    def aplicar(self, doc):
+        m = self.padrao.search(doc.visao(self.visao))
+        if not m:
+            return None
+        valor = self.extrair(m)
+        if self.aceitar is not None and not self.aceitar(valor):
+            return None
+        return self.converter(valor) if self.converter else valor
+
+# Acertos e tempo acumulado por (conjunto, campo, regra), para saber quais regras realmente trabalham.
+# Os extratores rodam nas threads do kit e do lote Heringer: atualizar sempre sob LOCK_ESTATISTICAS_REGRAS.
+ESTATISTICAS_REGRAS = collections.defaultdict(lambda: {"acertos": 0, "tentativas": 0, "tempo": 0.0})
+LOCK_ESTATISTICAS_REGRAS = threading.Lock()
+
+class ConjuntoRegras:
+    def __init__(self, nome, campos):
+        self.nome = nome
+        self.campos = campos
+
+    def aplicar(self, doc):
+        """Retorna (valores, diagnostico). Campos sem regra vencedora ficam com None; o
+        diagnóstico informa, por campo, a regra que casou e o tempo gasto em milissegundos."""
+        valores, diagnostico = {}, {}
+        for campo, regras in self.campos.items():
+            inicio = time.perf_counter()
+            valor, vencedora = None, None
+            for regra in regras:
+                valor = regra.aplicar(doc)
+                if valor is not None:
+                    vencedora = regra.nome
+                    break
+            duracao = time.perf_counter() - inicio
+            valores[campo] = valor
+            diagnostico[campo] = {"regra": vencedora, "ms": duracao * 1000}
+        with LOCK_ESTATISTICAS_REGRAS:
+            for campo, d in diagnostico.items():
+                estatistica = ESTATISTICAS_REGRAS[(self.nome, campo, d["regra"])]
+                estatistica["tentativas"] += 1
+                estatistica["tempo"] += d["ms"] / 1000
+                if d["regra"]:
+                    estatistica["acertos"] += 1
+        return valores, diagnostico
+
+def _resumo_diagnostico(nome, diagnostico):
+    partes = [f"{campo}={d['regra'] or '-'} ({d['ms']:.2f} ms)" for campo, d in diagnostico.items()]
+    return f"{_get_timestamp()} [REGRAS] {nome}: " + ", ".join(partes)
+
 # Todas as funções de lógica de backend (cadastrar_veiculo_bsoft, extrair_dados_cnh, etc.)
 # são mantidas exatamente como no seu código original.
 # Para economizar espaço na resposta, elas não serão repetidas aqui, mas
@@ -266,11 +752,11 @@ def cadastrar_veiculo_bsoft(dados_veiculo):
             return response.json()
         else:
             print(f"{_get_timestamp()} [VEÍCULO] ERRO: Status: {response.status_code}, Resposta: {response.text}")
-            messagebox.showerror("Erro na API Bsoft (Veículo)", f"Falha ao cadastrar veículo.\n\nCódigo: {response.status_code}\nResposta: {response.text}")
+            _notificar("error", "Erro na API Bsoft (Veículo)", f"Falha ao cadastrar veículo.\n\nCódigo: {response.status_code}\nResposta: {response.text}")
             return None
     except requests.exceptions.RequestException as e:
         print(f"{_get_timestamp()} [VEÍCULO] ERRO DE CONEXÃO: {e}")
-        messagebox.showerror("Erro de Conexão (Veículo)", f"Não foi possível conectar à API da Bsoft TMS.\n\nErro: {e}")
+        _notificar("error", "Erro de Conexão (Veículo)", f"Não foi possível conectar à API da Bsoft TMS.\n\nErro: {e}")
         return None
 
 def cadastrar_endereco_bsoft(cod_pessoa, dados_endereco):
@@ -293,11 +779,11 @@ def cadastrar_endereco_bsoft(cod_pessoa, dados_endereco):
             return resp.json()
         else:
             print(f"{_get_timestamp()} [ENDEREÇO] ERRO: Status: {resp.status_code}, Resposta: {resp.text}")
-            messagebox.showerror("Erro na API Bsoft (Endereço)", f"Falha ao cadastrar endereço.\nCódigo: {resp.status_code}\nResposta: {resp.text}")
+            _notificar("error", "Erro na API Bsoft (Endereço)", f"Falha ao cadastrar endereço.\nCódigo: {resp.status_code}\nResposta: {resp.text}")
             return None
     except requests.exceptions.RequestException as e:
         print(f"{_get_timestamp()} [ENDEREÇO] ERRO DE CONEXÃO: {e}")
-        messagebox.showerror("Erro de Conexão (Endereço)", f"Não foi possível conectar à API: {e}")
+        _notificar("error", "Erro de Conexão (Endereço)", f"Não foi possível conectar à API: {e}")
         return None
 
 def verificar_agendamentos_email(app_instance, is_manual=False):
@@ -360,44 +846,55 @@ def cadastrar_pessoa_fisica_bsoft(dados_motorista):
             return resp.json()
         else:
             print(f"{_get_timestamp()} [PESSOA FÍSICA] ERRO (CREATE): Status: {resp.status_code}, Resposta: {resp.text}")
-            messagebox.showerror("Erro API Bsoft (Cadastro PF)", f"Falha ao CADASTRAR motorista.\nCódigo: {resp.status_code}\n{resp.text}")
+            _notificar("error", "Erro API Bsoft (Cadastro PF)", f"Falha ao CADASTRAR motorista.\nCódigo: {resp.status_code}\n{resp.text}")
             return None
     except requests.exceptions.RequestException as e:
         print(f"{_get_timestamp()} [PESSOA FÍSICA] ERRO DE CONEXÃO (CREATE): {e}")
-        messagebox.showerror("Erro de Conexão (Cadastro PF)", f"Não foi possível conectar à API: {e}")
+        _notificar("error", "Erro de Conexão (Cadastro PF)", f"Não foi possível conectar à API: {e}")
         return None
 
-def extrair_dados_pedido_heringer(texto_completo: str) -> list:
-    if not texto_completo:
-        return []
-    print("\n--- DEBUG OCR (Pedido Heringer V4 - Multiformato) ---")
-    print(texto_completo)
-    print("----------------------------------------------------\n")
+_PADRAO_HERINGER_ANTIGO = re.compile(r"(\d{7})\s+(?:(\d{9})\s+)?(FERTILIZANTE.+?)\s+([A-Z\s]+ FILHO)\s+(\d+,\d{2})")
+REGRAS_HERINGER_EUROCHEM = ConjuntoRegras("Heringer (Eurochem)", {
+    # O cliente de entrega tem prioridade sobre o de faturamento.
+    "cliente": [
+        Regra("cliente_entrega", r'NOME DO CLIENTE PARA ENTREGA\s+([A-Z\s\d]+)', visao="upper"),
+        Regra("cliente_faturamento", r'NOME DO CLIENTE DE FATURAMENTO POR EXTENSO\s+([A-Z\s\d]+)', visao="upper"),
+    ],
+    "produto": [Regra("linha_fertilizante", r'FERTILIZANTE[^\n]+', visao="upper", extrair=lambda m: m.group(0).strip())],
+    "embalagem": [Regra("bag_kg", r'(BAG\s+\d+\s+KG)', visao="upper")],
+    "ordem": [Regra("ordem_de_venda", r'ORDEM DE\s+VENDA\s+(\d+)', visao="upper")],
+    "quantidade": [Regra("quantidade", r'QUANTIDADE\s+(\d+)', visao="upper")],
+    "local": [Regra("local_carregamento", r'LOCAL DE\s+CARREGAMENTO\s+([A-Z\s]+)', visao="upper")],
+})
+
+def _extrair_pedido_heringer_antigo(texto_completo):
     produtos_encontrados = []
-    padrao_antigo = re.compile(r"(\d{7})\s+(?:(\d{9})\s+)?(FERTILIZANTE.+?)\s+([A-Z\s]+ FILHO)\s+(\d+,\d{2})")
-    for match in padrao_antigo.finditer(texto_completo):
+    for match in _PADRAO_HERINGER_ANTIGO.finditer(texto_completo):
         try:
             p = {'contrato': match.group(2) if match.group(2) else match.group(1), 'produto': match.group(3).strip(), 'cliente': match.group(4).strip(), 'toneladas': match.group(5).replace(',', '.'), 'embalagem': "BIG BAG", 'cidade': ""}
             produtos_encontrados.append(p)
         except Exception:
             continue
-    if not produtos_encontrados:
-        try:
-            cliente_faturamento_match = re.search(r'NOME DO CLIENTE DE FATURAMENTO POR EXTENSO\s+([A-Z\s\d]+)', texto_completo.upper())
-            cliente_entrega_match = re.search(r'NOME DO CLIENTE PARA ENTREGA\s+([A-Z\s\d]+)', texto_completo.upper())
-            cliente_final = cliente_entrega_match.group(1).strip() if cliente_entrega_match else (cliente_faturamento_match.group(1).strip() if cliente_faturamento_match else "")
-            produto_match = re.search(r'FERTILIZANTE[^\n]+', texto_completo.upper())
-            embalagem_match = re.search(r'(BAG\s+\d+\s+KG)', texto_completo.upper())
-            ordem_match = re.search(r'ORDEM DE\s+VENDA\s+(\d+)', texto_completo.upper())
-            quantidade_match = re.search(r'QUANTIDADE\s+(\d+)', texto_completo.upper())
-            local_match = re.search(r'LOCAL DE\s+CARREGAMENTO\s+([A-Z\s]+)', texto_completo.upper())
-            if produto_match and ordem_match and quantidade_match:
-                p = {'contrato': ordem_match.group(1).strip(), 'produto': produto_match.group(0).strip(), 'cliente': cliente_final, 'toneladas': quantidade_match.group(1).strip(), 'embalagem': embalagem_match.group(1).strip() if embalagem_match else "BAG 1000 KG", 'cidade': local_match.group(1).strip() if local_match else ""}
-                produtos_encontrados.append(p)
-        except Exception as e:
-            print(f"Erro ao processar formato Eurochem: {e}")
     return produtos_encontrados
 
+def _extrair_pedido_heringer_eurochem(texto_completo):
+    try:
+        campos, diagnostico = REGRAS_HERINGER_EUROCHEM.aplicar(TextoDocumento(texto_completo))
+        print(_resumo_diagnostico(REGRAS_HERINGER_EUROCHEM.nome, diagnostico))
+        if campos["produto"] and campos["ordem"] and campos["quantidade"]:
+            return [{'contrato': campos["ordem"], 'produto': campos["produto"], 'cliente': campos["cliente"] or "", 'toneladas': campos["quantidade"], 'embalagem': campos["embalagem"] or "BAG 1000 KG", 'cidade': campos["local"] or ""}]
+    except Exception as e:
+        print(f"Erro ao processar formato Eurochem: {e}")
+    return []
+
+def extrair_dados_pedido_heringer(texto_completo: str) -> list:
+    if not texto_completo:
+        return []
+    print("\n--- DEBUG OCR (Pedido Heringer V4 - Multiformato) ---")
+    print(texto_completo)
+    print("----------------------------------------------------\n")
+    return _extrair_pedido_heringer_antigo(texto_completo) or _extrair_pedido_heringer_eurochem(texto_completo)
+
 def atualizar_pessoa_fisica_bsoft(cpf, dados_motorista):
     print(f"\n{_get_timestamp()} [PESSOA FÍSICA] Entrando em 'atualizar_pessoa_fisica_bsoft'...")
     endpoint_url = f"https://atlanticofertlog.bsoft.app/services/index.php/pessoas/v1/pessoas/fisicas/{cpf}"
@@ -413,11 +910,11 @@ def atualizar_pessoa_fisica_bsoft(cpf, dados_motorista):
             return resp.json()
         else:
             print(f"{_get_timestamp()} [PESSOA FÍSICA] ERRO (UPDATE): Status: {resp.status_code}, Resposta: {resp.text}")
-            messagebox.showerror("Erro API Bsoft (Update PF)", f"Falha ao ATUALIZAR motorista.\nCódigo: {resp.status_code}\n{resp.text}")
+            _notificar("error", "Erro API Bsoft (Update PF)", f"Falha ao ATUALIZAR motorista.\nCódigo: {resp.status_code}\n{resp.text}")
             return None
     except requests.exceptions.RequestException as e:
         print(f"{_get_timestamp()} [PESSOA FÍSICA] ERRO DE CONEXÃO (UPDATE): {e}")
-        messagebox.showerror("Erro de Conexão (Update PF)", f"Não foi possível conectar à API: {e}")
+        _notificar("error", "Erro de Conexão (Update PF)", f"Não foi possível conectar à API: {e}")
         return None
 
 def cadastrar_pessoa_juridica_bsoft(dados_empresa):
@@ -435,11 +932,11 @@ def cadastrar_pessoa_juridica_bsoft(dados_empresa):
             return resp.json()
         else:
             print(f"[ERRO PJ CREATE] Status: {resp.status_code}, Resposta: {resp.text}")
-            messagebox.showerror("Erro API Bsoft (Cadastro PJ)", f"Falha ao cadastrar proprietário (PJ).\nCódigo: {resp.status_code}\n{resp.text}")
+            _notificar("error", "Erro API Bsoft (Cadastro PJ)", f"Falha ao cadastrar proprietário (PJ).\nCódigo: {resp.status_code}\n{resp.text}")
             return None
     except requests.exceptions.RequestException as e:
         print(f"[ERRO PJ CREATE] Falha de conexão: {e}")
-        messagebox.showerror("Erro de Conexão (Cadastro PJ)", f"Não foi possível conectar à API: {e}")
+        _notificar("error", "Erro de Conexão (Cadastro PJ)", f"Não foi possível conectar à API: {e}")
         return None
 
 def atualizar_pessoa_juridica_bsoft(cnpj, dados_empresa):
@@ -457,66 +954,572 @@ def atualizar_pessoa_juridica_bsoft(cnpj, dados_empresa):
             return resp.json()
         else:
             print(f"[ERRO PJ UPDATE] Status: {resp.status_code}, Resposta: {resp.text}")
-            messagebox.showerror("Erro API Bsoft (Update PJ)", f"Falha ao ATUALIZAR proprietário (PJ).\nCódigo: {resp.status_code}\n{resp.text}")
+            _notificar("error", "Erro API Bsoft (Update PJ)", f"Falha ao ATUALIZAR proprietário (PJ).\nCódigo: {resp.status_code}\n{resp.text}")
             return None
     except requests.exceptions.RequestException as e:
         print(f"[ERRO PJ UPDATE] Falha de conexão: {e}")
-        messagebox.showerror("Erro de Conexão (Update PJ)", f"Não foi possível conectar à API: {e}")
+        _notificar("error", "Erro de Conexão (Update PJ)", f"Não foi possível conectar à API: {e}")
         return None
 
-def ensure_sheet_and_headers(excel_path):
+# ==============================================================================
+# Sessão da Planilha Geral (workbook em memória)
+# ==============================================================================
+# Carregar produtos e depois vincular o motorista eram duas leituras e duas gravações do xlsx
+# inteiro. A sessão mantém o workbook aberto: as operações alteram a cópia em memória e a
+# gravação acontece depois de alguns segundos sem mudanças, sob demanda ou ao fechar.
+ATRASO_GRAVACAO_PLANILHA = 2.0
+
+def _abrir_planilha_com_cabecalho(excel_path):
+    # Retorna (wb, ws, alterada); `alterada` indica que a aba ou o cabeçalho foram criados agora.
     if not os.path.exists(excel_path):
-        wb = Workbook(); ws = wb.active; ws.title = SHEET_NAME; ws.append(EXPECTED_HEADERS); wb.save(excel_path)
-        return wb, ws
+        wb = Workbook(); ws = wb.active; ws.title = SHEET_NAME; ws.append(EXPECTED_HEADERS)
+        return wb, ws, True
     wb = load_workbook(excel_path)
     if SHEET_NAME not in wb.sheetnames:
         ws = wb.create_sheet(SHEET_NAME); ws.append(EXPECTED_HEADERS)
-    else:
-        ws = wb[SHEET_NAME]
-        if ws.max_row == 0: ws.append(EXPECTED_HEADERS)
+        return wb, ws, True
+    ws = wb[SHEET_NAME]
+    if ws.max_row == 0:
+        ws.append(EXPECTED_HEADERS)
+        return wb, ws, True
+    return wb, ws, False
+
+def normalizar_numero_pedido(valor):
+    # 12345, 12345.0 e " 12345 " são o mesmo pedido; células vazias não entram no índice.
+    if valor is None:
+        return None
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    texto = str(valor).strip()
+    return texto or None
+
+# Diário de gravação: cada operação é anotada (e sincronizada no disco) antes de ser aplicada
+# em memória e o diário só é apagado depois que o xlsx novo substituiu o antigo. Se o programa
+# cair no meio do caminho, as operações são reaplicadas na próxima abertura. As operações são
+# idempotentes em sequência (a exportação reescreve a área do lote; motorista só atribui valores),
+# então reaplicar um diário cuja gravação chegou a acontecer não altera o resultado.
+PASTA_DIARIO_PLANILHAS = "diario_planilhas"
+
+def _caminho_diario_planilha(caminho_planilha):
+    nome = hashlib.sha1(os.path.abspath(caminho_planilha).encode("utf-8")).hexdigest()[:16]
+    return _caminho_cache(os.path.join(PASTA_DIARIO_PLANILHAS, f"{nome}.jsonl"))
+
+def _ler_diario_planilha(caminho_diario):
+    operacoes = []
+    try:
+        with open(caminho_diario, "r", encoding="utf-8") as f:
+            for linha in f:
+                try:
+                    operacoes.append(json.loads(linha))
+                except ValueError:
+                    # Linha cortada por uma queda durante a escrita: a operação nunca foi aplicada.
+                    print(f"{_get_timestamp()} [PLANILHA] Entrada incompleta ignorada no diário '{caminho_diario}'.")
+    except FileNotFoundError:
+        pass
+    return operacoes
+
+class SessaoPlanilha:
+    """Workbook mantido em memória entre operações. Quem altera a planilha deve segurar `lock`,
+    anotar a operação com `registrar_operacao()` e chamar `marcar_alterada()`; se o arquivo mudar
+    no disco por fora, ele é relido no próximo `abrir()`."""
+
+    def __init__(self, caminho, atraso_gravacao=ATRASO_GRAVACAO_PLANILHA):
+        self.caminho = caminho
+        self.atraso_gravacao = atraso_gravacao
+        self.lock = threading.RLock()
+        self.wb = None
+        self.ws = None
+        self.suja = False
+        self.leituras = 0
+        self.gravacoes = 0
+        self._assinatura = None
+        self._timer = None
+        self._indice_pedidos = None
+        self._pedido_por_linha = {}
+        self.caminho_diario = _caminho_diario_planilha(caminho)
+        self.operacoes_pendentes = 0
+        self._reaplicando = False
+
+    def _assinatura_disco(self):
+        try:
+            st = os.stat(self.caminho)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def abrir(self):
+        with self.lock:
+            assinatura = self._assinatura_disco()
+            if self.wb is not None and assinatura != self._assinatura:
+                if self.suja:
+                    # Não há como mesclar as duas versões; a próxima gravação sobrescreve a do disco.
+                    print(f"{_get_timestamp()} [PLANILHA] AVISO: '{os.path.basename(self.caminho)}' mudou no disco com alterações pendentes em memória; as alterações em memória prevalecem.")
+                    self._assinatura = assinatura
+                else:
+                    self.wb = self.ws = None
+            if self.wb is None:
+                self.invalidar_indice()
+                inicio = time.perf_counter()
+                self.wb, self.ws, alterada = _abrir_planilha_com_cabecalho(self.caminho)
+                self._assinatura = assinatura
+                self.leituras += 1
+                print(f"{_get_timestamp()} [PLANILHA] '{os.path.basename(self.caminho)}' carregada em {(time.perf_counter() - inicio) * 1000:.0f} ms (leitura nº {self.leituras}).")
+                if alterada:
+                    self.marcar_alterada()
+                if not self._reaplicando:
+                    self._reaplicar_diario()
+            return self.wb, self.ws
+
+    def registrar_operacao(self, operacao, **dados):
+        with self.lock:
+            if self._reaplicando:
+                return
+            os.makedirs(os.path.dirname(self.caminho_diario), exist_ok=True)
+            entrada = json.dumps({"op": operacao, "planilha": self.caminho, "em": _get_timestamp(), **dados}, ensure_ascii=False, default=str)
+            with open(self.caminho_diario, "a", encoding="utf-8") as f:
+                f.write(entrada + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self.operacoes_pendentes += 1
+
+    def _reaplicar_diario(self):
+        operacoes = _ler_diario_planilha(self.caminho_diario)
+        if not operacoes:
+            return
+        print(f"{_get_timestamp()} [PLANILHA] Reaplicando {len(operacoes)} operação(ões) não gravada(s) em '{os.path.basename(self.caminho)}'...")
+        self._reaplicando = True
+        try:
+            for entrada in operacoes:
+                aplicar = OPERACOES_PLANILHA.get(entrada.get("op"))
+                if aplicar is None:
+                    print(f"{_get_timestamp()} [PLANILHA] Operação desconhecida no diário ignorada: {entrada.get('op')}")
+                    continue
+                aplicar(self, entrada)
+        finally:
+            self._reaplicando = False
+        self.operacoes_pendentes = len(operacoes)
+        self.marcar_alterada()
+
+    # Índice "Número do pedido" normalizado -> linhas, montado uma vez por leitura do arquivo.
+    # Quem escreve na coluna do pedido avisa por `reindexar_linhas`; quem recebe o workbook
+    # para editar livremente (ensure_sheet_and_headers) invalida o índice.
+    def invalidar_indice(self):
+        with self.lock:
+            self._indice_pedidos = None
+            self._pedido_por_linha = {}
+
+    def _coluna_pedido(self):
+        headers = get_headers_from_sheet(self.ws)
+        return headers.index("Número do pedido") + 1 if "Número do pedido" in headers else None
+
+    def indice_pedidos(self):
+        with self.lock:
+            self.abrir()
+            if self._indice_pedidos is None:
+                self._indice_pedidos, self._pedido_por_linha = {}, {}
+                coluna = self._coluna_pedido()
+                if coluna:
+                    for linha, (valor,) in enumerate(self.ws.iter_rows(min_row=2, min_col=coluna, max_col=coluna, values_only=True), start=2):
+                        self._registrar_pedido(linha, valor)
+            return self._indice_pedidos
+
+    def _registrar_pedido(self, linha, valor):
+        anterior = self._pedido_por_linha.pop(linha, None)
+        if anterior is not None:
+            linhas = self._indice_pedidos[anterior]
+            linhas.discard(linha)
+            if not linhas:
+                del self._indice_pedidos[anterior]
+        chave = normalizar_numero_pedido(valor)
+        if chave is not None:
+            self._indice_pedidos.setdefault(chave, set()).add(linha)
+            self._pedido_por_linha[linha] = chave
+
+    def reindexar_linhas(self, linhas):
+        with self.lock:
+            if self._indice_pedidos is None:
+                return  # Ainda não montado; será montado do zero quando for pedido.
+            coluna = self._coluna_pedido()
+            if not coluna:
+                return
+            for linha in linhas:
+                if linha <= self.ws.max_row:
+                    self._registrar_pedido(linha, self.ws.cell(row=linha, column=coluna).value)
+
+    def marcar_alterada(self):
+        with self.lock:
+            self.suja = True
+            if self._timer:
+                self._timer.cancel()
+            if self.atraso_gravacao is not None:
+                self._timer = threading.Timer(self.atraso_gravacao, self._gravar_em_segundo_plano)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _gravar_em_segundo_plano(self):
+        try:
+            self.gravar()
+        except Exception as e:
+            # Continua suja: a próxima alteração, um gravar() explícito ou o encerramento tentam de novo.
+            print(f"ERRO ao gravar a planilha '{self.caminho}': {e}")
+
+    def gravar(self):
+        """Grava no disco se houver alterações pendentes. Retorna True se gravou."""
+        with self.lock:
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
+            if not self.suja or self.wb is None:
+                return False
+            inicio = time.perf_counter()
+            caminho_tmp = f"{self.caminho}.tmp"
+            try:
+                # fsync no mesmo handle de escrita: no Windows o FlushFileBuffers exige acesso de gravação.
+                with open(caminho_tmp, "wb") as f:
+                    self.wb.save(f)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(caminho_tmp, self.caminho)
+            except Exception:
+                # O original continua intacto e o diário preservado; nada se perde.
+                with contextlib.suppress(OSError):
+                    os.remove(caminho_tmp)
+                raise
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self.caminho_diario)
+            self._assinatura = self._assinatura_disco()
+            self.suja = False
+            self.gravacoes += 1
+            print(f"{_get_timestamp()} [PLANILHA] '{os.path.basename(self.caminho)}' gravada em {(time.perf_counter() - inicio) * 1000:.0f} ms ({self.operacoes_pendentes} operação(ões) numa gravação).")
+            self.operacoes_pendentes = 0
+            return True
+
+    def fechar(self):
+        with self.lock:
+            self.gravar()
+            self.wb = self.ws = None
+
+_SESSOES_PLANILHA = {}
+_LOCK_SESSOES_PLANILHA = threading.Lock()
+
+def obter_sessao_planilha(caminho):
+    chave = os.path.abspath(caminho)
+    with _LOCK_SESSOES_PLANILHA:
+        if chave not in _SESSOES_PLANILHA:
+            _SESSOES_PLANILHA[chave] = SessaoPlanilha(chave)
+        return _SESSOES_PLANILHA[chave]
+
+def encerrar_sessao_planilha(caminho):
+    with _LOCK_SESSOES_PLANILHA:
+        sessao = _SESSOES_PLANILHA.pop(os.path.abspath(caminho), None)
+    if sessao:
+        sessao.fechar()
+
+def gravar_sessoes_planilha():
+    for sessao in list(_SESSOES_PLANILHA.values()):
+        try:
+            sessao.gravar()
+        except Exception as e:
+            print(f"ERRO ao gravar a planilha '{sessao.caminho}': {e}")
+
+atexit.register(gravar_sessoes_planilha)
+
+def recuperar_diarios_planilha():
+    """Na inicialização: grava as planilhas que ficaram com operações no diário por causa de uma queda."""
+    pasta = _caminho_cache(PASTA_DIARIO_PLANILHAS)
+    if not os.path.isdir(pasta):
+        return
+    for nome in os.listdir(pasta):
+        if not nome.endswith(".jsonl"):
+            continue
+        operacoes = _ler_diario_planilha(os.path.join(pasta, nome))
+        planilha = next((op.get("planilha") for op in operacoes if op.get("planilha")), None)
+        if not planilha:
+            with contextlib.suppress(OSError):
+                os.remove(os.path.join(pasta, nome))
+            continue
+        try:
+            sessao = obter_sessao_planilha(planilha)
+            with sessao.lock:
+                sessao.abrir()
+                sessao.gravar()
+        except Exception as e:
+            print(f"ERRO ao recuperar o diário da planilha '{planilha}': {e}")
+
+# ==============================================================================
+# Banco de Carregamentos (SQLite)
+# ==============================================================================
+# Registro oficial de pedidos, motoristas, placas e datas de carregamento. A planilha geral
+# e as planilhas por motorista são exportações deste banco: cada "lote" é um conjunto de
+# produtos enviado para uma planilha numa data, exportado a partir da linha 3. Um lote novo
+# para a mesma planilha e data substitui o anterior (a planilha geral também só guarda o
+# último): o antigo fica no banco com `substituido_por`, fora das consultas.
+VERSAO_BANCO_CARREGAMENTOS = 2
+LINHA_INICIAL_PLANILHA_GERAL = 3
+LINHA_FINAL_MODELO_PLANILHA_GERAL = 14  # Última linha formatada no modelo; as seguintes copiam o estilo dela.
+LINHA_FINAL_LIMPEZA_PLANILHA_GERAL = 20
+
+_ESQUEMA_BANCO_CARREGAMENTOS = """
+CREATE TABLE IF NOT EXISTS lotes (
+    id INTEGER PRIMARY KEY,
+    planilha TEXT NOT NULL,
+    data_carregamento TEXT NOT NULL,
+    data_iso TEXT,
+    criado_em TEXT NOT NULL,
+    substituido_por INTEGER REFERENCES lotes(id)
+);
+CREATE TABLE IF NOT EXISTS motoristas (
+    id INTEGER PRIMARY KEY,
+    nome TEXT NOT NULL UNIQUE,
+    cpf TEXT,
+    cnh TEXT,
+    fone TEXT
+);
+CREATE TABLE IF NOT EXISTS itens (
+    id INTEGER PRIMARY KEY,
+    lote_id INTEGER NOT NULL REFERENCES lotes(id),
+    posicao INTEGER NOT NULL,
+    pedido TEXT,
+    cliente TEXT,
+    produto TEXT,
+    embalagem TEXT,
+    toneladas,
+    cidade TEXT,
+    motorista_id INTEGER REFERENCES motoristas(id),
+    placa TEXT,
+    placa_normalizada TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_lotes_planilha ON lotes(planilha, id);
+CREATE INDEX IF NOT EXISTS idx_lotes_data ON lotes(data_iso);
+CREATE INDEX IF NOT EXISTS idx_itens_lote ON itens(lote_id, posicao);
+CREATE INDEX IF NOT EXISTS idx_itens_pedido ON itens(pedido);
+CREATE INDEX IF NOT EXISTS idx_itens_placa ON itens(placa_normalizada);
+"""
+
+_CONSULTA_ITENS = """
+SELECT i.id, i.lote_id, i.posicao, i.pedido, i.cliente, i.produto, i.embalagem, i.toneladas, i.cidade,
+       m.nome AS motorista, i.placa, l.data_carregamento, l.planilha
+FROM itens i JOIN lotes l ON l.id = i.lote_id LEFT JOIN motoristas m ON m.id = i.motorista_id
+"""
+
+def _data_iso(data_carregamento):
+    try:
+        return datetime.strptime(data_carregamento, "%d/%m/%Y").strftime("%Y-%m-%d")
+    except (TypeError, ValueError):
+        return None
+
+def _normalizar_placa(placa):
+    return re.sub(r'[^A-Z0-9]', '', str(placa or "").upper()) or None
+
+class BancoCarregamentos:
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self._lock = threading.RLock()
+        self._conexao = None
+
+    def _conectar(self):
+        if self._conexao is None:
+            self._conexao = sqlite3.connect(self.caminho, check_same_thread=False)
+            self._conexao.row_factory = sqlite3.Row
+            self._conexao.execute("PRAGMA journal_mode=WAL")
+            self._conexao.execute("PRAGMA foreign_keys=ON")
+            self._conexao.executescript(_ESQUEMA_BANCO_CARREGAMENTOS)
+            colunas = {r["name"] for r in self._conexao.execute("PRAGMA table_info(lotes)")}
+            if "substituido_por" not in colunas:  # banco da versão 1
+                self._conexao.execute("ALTER TABLE lotes ADD COLUMN substituido_por INTEGER REFERENCES lotes(id)")
+            self._conexao.execute(f"PRAGMA user_version={VERSAO_BANCO_CARREGAMENTOS}")
+        return self._conexao
+
+    def registrar_lote(self, planilha, produtos, data_carregamento):
+        with self._lock, self._conectar() as con:
+            lote_id = con.execute("INSERT INTO lotes (planilha, data_carregamento, data_iso, criado_em) VALUES (?, ?, ?, ?)",
+                                  (os.path.abspath(planilha), data_carregamento, _data_iso(data_carregamento), _get_timestamp())).lastrowid
+            con.execute("UPDATE lotes SET substituido_por = ? WHERE planilha = ? AND data_iso IS ? AND id < ? AND substituido_por IS NULL",
+                        (lote_id, os.path.abspath(planilha), _data_iso(data_carregamento), lote_id))
+            con.executemany("INSERT INTO itens (lote_id, posicao, pedido, cliente, produto, embalagem, toneladas, cidade) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                            [(lote_id, pos, normalizar_numero_pedido(p.get("contrato")), p.get("cliente"), p.get("produto"), p.get("embalagem"), p.get("toneladas"), p.get("cidade"))
+                             for pos, p in enumerate(produtos)])
+            return lote_id
+
+    def _id_motorista(self, con, nome, cpf=None, cnh=None, fone=None):
+        con.execute("INSERT INTO motoristas (nome, cpf, cnh, fone) VALUES (?, ?, ?, ?) ON CONFLICT(nome) DO UPDATE SET "
+                    "cpf = COALESCE(excluded.cpf, cpf), cnh = COALESCE(excluded.cnh, cnh), fone = COALESCE(excluded.fone, fone)",
+                    (nome, cpf or None, cnh or None, fone or None))
+        return con.execute("SELECT id FROM motoristas WHERE nome = ?", (nome,)).fetchone()["id"]
+
+    def atribuir_motorista(self, planilha, pedidos, nome, placa, cpf=None, cnh=None, fone=None):
+        """Vincula motorista e placa aos pedidos do lote atual da planilha. Retorna o nº de itens alterados."""
+        with self._lock, self._conectar() as con:
+            lote_id = self.lote_atual(planilha)
+            if lote_id is None:
+                return 0
+            motorista_id = self._id_motorista(con, nome, cpf, cnh, fone)
+            chaves = sorted({normalizar_numero_pedido(p) for p in pedidos} - {None})
+            marcadores = ",".join("?" * len(chaves))
+            return con.execute(f"UPDATE itens SET motorista_id = ?, placa = ?, placa_normalizada = ? WHERE lote_id = ? AND pedido IN ({marcadores})",
+                               (motorista_id, placa, _normalizar_placa(placa), lote_id, *chaves)).rowcount
+
+    def lote_atual(self, planilha):
+        with self._lock:
+            linha = self._conectar().execute("SELECT MAX(id) AS id FROM lotes WHERE planilha = ?", (os.path.abspath(planilha),)).fetchone()
+            return linha["id"]
+
+    def tamanho_lote_anterior(self, lote_id):
+        # Quantos itens o lote exportado antes deste (na mesma planilha) ocupou.
+        with self._lock:
+            linha = self._conectar().execute(
+                "SELECT COUNT(i.id) AS n FROM itens i WHERE i.lote_id = (SELECT MAX(a.id) FROM lotes a JOIN lotes l ON l.id = ? WHERE a.planilha = l.planilha AND a.id < l.id)",
+                (lote_id,)).fetchone()
+            return linha["n"]
+
+    def _consultar(self, filtro, parametros, vigentes=True):
+        # `vigentes`: ignora os lotes substituídos por outro da mesma planilha e data.
+        if vigentes:
+            filtro = f"l.substituido_por IS NULL AND {filtro}"
+        with self._lock:
+            return [dict(r) for r in self._conectar().execute(f"{_CONSULTA_ITENS} WHERE {filtro}", parametros)]
+
+    def itens_do_lote(self, lote_id):
+        return self._consultar("i.lote_id = ? ORDER BY i.posicao", (lote_id,), vigentes=False)
+
+    def historico_pedido(self, pedido):
+        return self._consultar("i.pedido = ? ORDER BY i.lote_id, i.posicao", (normalizar_numero_pedido(pedido),))
+
+    def historico_placa(self, placa):
+        # A placa é exibida como digitada; a busca ignora hífen, espaço e caixa.
+        return self._consultar("i.placa_normalizada = ? ORDER BY i.lote_id, i.posicao", (_normalizar_placa(placa),))
+
+    def historico_data(self, data_carregamento):
+        return self._consultar("l.data_iso = ? ORDER BY i.lote_id, i.posicao", (_data_iso(data_carregamento),))
+
+    def dados_motorista(self, nome):
+        with self._lock:
+            linha = self._conectar().execute("SELECT nome, cpf, cnh, fone FROM motoristas WHERE nome = ?", (nome,)).fetchone()
+            return dict(linha) if linha else None
+
+    def itens_do_motorista(self, nome, data_carregamento):
+        return self._consultar("m.nome = ? AND l.data_iso = ? ORDER BY i.lote_id, i.posicao", (nome, _data_iso(data_carregamento)))
+
+    def fechar(self):
+        with self._lock:
+            if self._conexao is not None:
+                self._conexao.close()
+                self._conexao = None
+
+BANCO_CARREGAMENTOS = BancoCarregamentos(BANCO_CARREGAMENTOS_PATH)
+
+def _item_para_produto(item):
+    return {"cliente": item["cliente"], "contrato": item["pedido"], "produto": item["produto"], "embalagem": item["embalagem"], "toneladas": item["toneladas"], "cidade": item["cidade"]}
+
+def _valor_pedido_planilha(pedido):
+    # A planilha da fábrica sempre recebeu o pedido como número.
+    return int(pedido) if pedido and pedido.isdigit() else pedido
+
+def _copiar_estilo_linha(ws, linha_origem, linha_destino, num_colunas):
+    for col in range(1, num_colunas + 1):
+        origem = ws.cell(row=linha_origem, column=col)
+        if origem.has_style:
+            ws.cell(row=linha_destino, column=col)._style = copy.copy(origem._style)
+    altura = ws.row_dimensions[linha_origem].height
+    if altura is not None:
+        ws.row_dimensions[linha_destino].height = altura
+
+def _limpar_estilo_linha(ws, linha, num_colunas):
+    for col in range(1, num_colunas + 1):
+        ws.cell(row=linha, column=col)._style = StyleArray()
+    ws.row_dimensions[linha].height = None
+
+def exportar_planilha_motorista(caminho, nome_condutor, data_carregamento, placa_cavalo=None):
+    """Gera a planilha do motorista com todos os itens dele na data, direto do banco."""
+    itens = BANCO_CARREGAMENTOS.itens_do_motorista(nome_condutor, data_carregamento)
+    if not itens:
+        _notificar("warning", "Aviso", f"Nenhum item registrado para {nome_condutor} em {data_carregamento}.")
+        return False
+    placa = placa_cavalo or next((i["placa"] for i in itens if i["placa"]), "")
+    return criar_planilha_especifica_motorista(caminho, [_item_para_produto(i) for i in itens], data_carregamento, nome_condutor, placa)
+
+def ensure_sheet_and_headers(excel_path):
+    # Mantida para compatibilidade: devolve o workbook da sessão e garante que o arquivo exista.
+    sessao = obter_sessao_planilha(excel_path)
+    with sessao.lock:
+        wb, ws = sessao.abrir()
+        sessao.invalidar_indice()
+        if not os.path.exists(excel_path):
+            sessao.gravar()
     return wb, ws
 
 def get_headers_from_sheet(ws):
     return [str(h.value) if h.value is not None else "" for h in ws[1]]
 
 def append_rows_to_excel(excel_path, produtos, data_carregamento):
-    wb, ws = ensure_sheet_and_headers(excel_path)
+    # O lote vai primeiro para o banco (registro oficial); a planilha é a exportação dele.
+    lote_id = BANCO_CARREGAMENTOS.registrar_lote(excel_path, produtos, data_carregamento)
+    sessao = obter_sessao_planilha(excel_path)
+    with sessao.lock:
+        sessao.abrir()
+        sessao.registrar_operacao("exportar_lote", lote=lote_id)
+        _exportar_lote_na_sessao(sessao, lote_id)
+
+def _exportar_lote_na_sessao(sessao, lote_id):
+    itens = BANCO_CARREGAMENTOS.itens_do_lote(lote_id)
+    _, ws = sessao.abrir()
     headers = get_headers_from_sheet(ws)
-    for row_num in range(3, 21):
-        if row_num > ws.max_row: break
+    # Limpa a área do lote anterior, que pode ter passado da linha 20.
+    fim_lote_anterior = LINHA_INICIAL_PLANILHA_GERAL + BANCO_CARREGAMENTOS.tamanho_lote_anterior(lote_id) - 1
+    fim_limpeza = min(max(LINHA_FINAL_LIMPEZA_PLANILHA_GERAL, fim_lote_anterior), ws.max_row)
+    for row_num in range(LINHA_INICIAL_PLANILHA_GERAL, fim_limpeza + 1):
         for col_num in range(1, len(headers) + 1):
             ws.cell(row=row_num, column=col_num).value = None
-    start_row = 3
-    for idx, p in enumerate(produtos):
-        if start_row + idx > 14: break
-        row_map = {"Cliente": p.get("cliente"), "Data de Carregamento": data_carregamento, "Placa cavalo mecânico": None, "Nome do condutor": None, "Número do pedido": int(p.get("contrato")) if p.get("contrato") else None, "Produto": p.get("produto"), "Embalagem": p.get("embalagem"), "Quantidade": str(p.get("toneladas")).replace(".", ","), "Cidade/UF": p.get("cidade")}
+    for idx, item in enumerate(itens):
+        linha = LINHA_INICIAL_PLANILHA_GERAL + idx
+        if linha > LINHA_FINAL_MODELO_PLANILHA_GERAL:
+            _copiar_estilo_linha(ws, LINHA_FINAL_MODELO_PLANILHA_GERAL, linha, len(headers))
+        row_map = {"Cliente": item["cliente"], "Data de Carregamento": item["data_carregamento"], "Placa cavalo mecânico": item["placa"], "Nome do condutor": item["motorista"], "Número do pedido": _valor_pedido_planilha(item["pedido"]), "Produto": item["produto"], "Embalagem": item["embalagem"], "Quantidade": str(item["toneladas"]).replace(".", ","), "Cidade/UF": item["cidade"]}
         for col_idx, header in enumerate(headers, start=1):
-            ws.cell(row=start_row + idx, column=col_idx).value = row_map.get(header)
-    wb.save(excel_path)
+            ws.cell(row=linha, column=col_idx).value = row_map.get(header)
+    # Linhas além do modelo que só o lote anterior (maior) usava perdem o estilo copiado.
+    ultima_linha = max(LINHA_FINAL_MODELO_PLANILHA_GERAL, LINHA_INICIAL_PLANILHA_GERAL + len(itens) - 1)
+    for linha in range(ultima_linha + 1, fim_limpeza + 1):
+        _limpar_estilo_linha(ws, linha, len(headers))
+    sessao.reindexar_linhas(range(LINHA_INICIAL_PLANILHA_GERAL, max(fim_limpeza, LINHA_INICIAL_PLANILHA_GERAL + len(itens) - 1) + 1))
+    sessao.marcar_alterada()
 
-def update_excel_with_driver_data(excel_path, driver_name, plate1, products_to_update):
+def update_excel_with_driver_data(excel_path, driver_name, plate1, products_to_update, cpf=None, cnh=None, fone=None):
     if not products_to_update: return
-    contract_numbers = {str(p['contrato']).strip() for p in products_to_update}
-    wb = load_workbook(excel_path)
-    ws = wb[SHEET_NAME]
+    BANCO_CARREGAMENTOS.atribuir_motorista(excel_path, [p['contrato'] for p in products_to_update], driver_name, plate1, cpf, cnh, fone)
+    sessao = obter_sessao_planilha(excel_path)
+    with sessao.lock:
+        sessao.abrir()
+        sessao.registrar_operacao("motorista", driver_name=driver_name, plate1=plate1, contratos=[p['contrato'] for p in products_to_update])
+        return _update_driver_na_sessao(sessao, driver_name, plate1, products_to_update)
+
+def _update_driver_na_sessao(sessao, driver_name, plate1, products_to_update):
+    contract_numbers = {normalizar_numero_pedido(p['contrato']) for p in products_to_update}
+    _, ws = sessao.abrir()
     headers = get_headers_from_sheet(ws)
     try:
-        contract_col_idx = headers.index("Número do pedido") + 1
+        headers.index("Número do pedido")
         driver_col_idx = headers.index("Nome do condutor") + 1
         plate_col_idx = headers.index("Placa cavalo mecânico") + 1
     except ValueError as e:
-        messagebox.showerror("Erro de Coluna", f"Não foi possível encontrar a coluna '{e}' na planilha."); return
-    for row in ws.iter_rows(min_row=2):
-        cell_contract = ws.cell(row=row[0].row, column=contract_col_idx)
-        if cell_contract.value is None: continue
-        cell_value_str = str(cell_contract.value).strip()
-        if cell_value_str in contract_numbers:
-            ws.cell(row=row[0].row, column=driver_col_idx).value = driver_name
-            ws.cell(row=row[0].row, column=plate_col_idx).value = plate1
-    wb.save(excel_path)
+        _notificar("error", "Erro de Coluna", f"Não foi possível encontrar a coluna '{e}' na planilha."); return False
+    # Só as linhas dos pedidos do motorista são tocadas, não importa o tamanho da planilha.
+    indice = sessao.indice_pedidos()
+    for linha in sorted({linha for numero in contract_numbers for linha in indice.get(numero, ())}):
+        ws.cell(row=linha, column=driver_col_idx).value = driver_name
+        ws.cell(row=linha, column=plate_col_idx).value = plate1
+    sessao.marcar_alterada()
+    return True
+
+OPERACOES_PLANILHA = {
+    "exportar_lote": lambda sessao, op: _exportar_lote_na_sessao(sessao, op["lote"]),
+    "motorista": lambda sessao, op: _update_driver_na_sessao(sessao, op["driver_name"], op["plate1"], [{"contrato": c} for c in op["contratos"]]),
+}
 
 def fill_products_in_existing_table(doc, produtos):
-    table = _find_prod_table(doc)
+    _preencher_tabela_produtos(_find_prod_table(doc), produtos)
+
+def _preencher_tabela_produtos(table, produtos):
     if not table: return
     start_row = 1
     num_data_rows_in_template = len(table.rows) - start_row
@@ -544,28 +1547,451 @@ def copy_run_style(src_run, dest_run):
 LABEL_PATTERN = re.compile(r'((?:Motorista|CNH|Fone|Telefone)|(?:(?:1\w?|2\w?|3\w?)\s*Placa))', re.IGNORECASE)
 STANDARDIZED_LABELS = {'motorista': 'Motorista', 'cnh': 'CNH', 'fone': 'Fone', '1': '1ª Placa', '2': '2ª Placa', '3': '3ª Placa'}
 
+# ==============================================================================
+# Planilhas por Motorista (modelo em cache + geração em lote)
+# ==============================================================================
+# O modelo é lido e limpo (linhas 3 a 99) uma única vez e carregado uma vez por processo
+# (CopiaModeloPlanilhaMotorista): cada planilha é preenchida nessa cópia, gravada e desfeita,
+# sem novo parse do arquivo. Se o arquivo do modelo mudar no disco, o cache é refeito.
+MIN_PLANILHAS_POR_PROCESSO = 10  # Abaixo disso, subir processos custa mais que gerar em série.
+
+def _hash_conteudo_xlsx(dados):
+    # O openpyxl grava o horário em docProps/core.xml a cada save; o resto do pacote só muda com o conteúdo.
+    sha = hashlib.sha256()
+    with zipfile.ZipFile(io.BytesIO(dados)) as pacote:
+        for nome in sorted(pacote.namelist()):
+            if nome != "docProps/core.xml":
+                sha.update(nome.encode("utf-8"))
+                sha.update(pacote.read(nome))
+    return sha.hexdigest()
+
+class CopiaModeloPlanilhaMotorista:
+    """Modelo limpo já carregado. `gerar` preenche as linhas do motorista, grava e devolve as
+    células ao estado do modelo (valores, estilos copiados e alturas), pronto para o próximo."""
+    def __init__(self, dados_modelo):
+        self._lock = threading.Lock()
+        self.wb = load_workbook(io.BytesIO(dados_modelo))
+        self.ws = self.wb[SHEET_NAME]
+        self.headers = get_headers_from_sheet(self.ws)
+
+    def gerar(self, novo_caminho_excel, produtos, data_carregamento, nome_condutor, placa_cavalo):
+        ws, num_colunas = self.ws, len(self.headers)
+        with self._lock:
+            originais = {}
+            try:
+                for idx, p in enumerate(produtos):
+                    linha = LINHA_INICIAL_PLANILHA_GERAL + idx
+                    if linha > LINHA_FINAL_MODELO_PLANILHA_GERAL:
+                        originais[linha] = ([copy.copy(ws.cell(row=linha, column=col)._style) for col in range(1, num_colunas + 1)], ws.row_dimensions[linha].height)
+                        _copiar_estilo_linha(ws, LINHA_FINAL_MODELO_PLANILHA_GERAL, linha, num_colunas)
+                    row_map = {"Cliente": p.get("cliente"), "Data de Carregamento": data_carregamento, "Placa cavalo mecânico": placa_cavalo, "Nome do condutor": nome_condutor, "Número do pedido": p.get("contrato"), "Produto": p.get("produto"), "Embalagem": p.get("embalagem"), "Quantidade": p.get("toneladas"), "Cidade/UF": p.get("cidade")}
+                    for col_idx, header in enumerate(self.headers, start=1):
+                        ws.cell(row=linha, column=col_idx).value = row_map.get(header)
+                self.wb.save(novo_caminho_excel)
+            finally:
+                for idx in range(len(produtos)):
+                    for col in range(1, num_colunas + 1):
+                        ws.cell(row=LINHA_INICIAL_PLANILHA_GERAL + idx, column=col).value = None
+                for linha, (estilos, altura) in originais.items():
+                    for col, estilo in enumerate(estilos, start=1):
+                        ws.cell(row=linha, column=col)._style = estilo
+                    ws.row_dimensions[linha].height = altura
+
+class ModeloPlanilhaMotorista:
+    """O arquivo do modelo é a própria planilha geral, regravada a cada lote ou motorista. Por
+    isso o cache de saídas usa o hash do modelo já limpo (ver `preparado`) e não o do arquivo."""
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self._lock = threading.Lock()
+        self._assinatura = None
+        self._bytes = None
+        self._hash = None
+        self._copia = None
+
+    def preparado(self):
+        """(bytes do modelo limpo, hash do conteúdo deles)."""
+        with self._lock:
+            st = os.stat(self.caminho)
+            assinatura = (st.st_mtime_ns, st.st_size)
+            if self._bytes is None or assinatura != self._assinatura:
+                inicio = time.perf_counter()
+                wb = load_workbook(self.caminho)
+                ws = wb[SHEET_NAME]
+                headers = get_headers_from_sheet(ws)
+                for row_num in range(3, 100):
+                    if row_num > ws.max_row: break
+                    for col_num in range(1, len(headers) + 1):
+                        ws.cell(row=row_num, column=col_num).value = None
+                buffer = io.BytesIO()
+                wb.save(buffer)
+                self._bytes, self._assinatura = buffer.getvalue(), assinatura
+                self._hash = _hash_conteudo_xlsx(self._bytes)
+                self._copia = None
+                print(f"{_get_timestamp()} [MODELO] Modelo da planilha do motorista preparado em {(time.perf_counter() - inicio) * 1000:.0f} ms.")
+            return self._bytes, self._hash
+
+    def copia(self):
+        """(CopiaModeloPlanilhaMotorista do modelo limpo, hash do conteúdo), carregada uma vez."""
+        dados, hash_modelo = self.preparado()
+        with self._lock:
+            if self._copia is None or self._copia[1] != hash_modelo:
+                self._copia = (CopiaModeloPlanilhaMotorista(dados), hash_modelo)
+            return self._copia
+
+MODELO_PLANILHA_MOTORISTA = ModeloPlanilhaMotorista(EXCEL_FILE)
+
+def _gerar_planilha_motorista_com_cache(copia_modelo, hash_modelo, novo_caminho_excel, produtos, data_carregamento, nome_condutor, placa_cavalo):
+    entradas = {"modelo": hash_modelo, "produtos": produtos, "data_carregamento": data_carregamento, "nome_condutor": nome_condutor, "placa_cavalo": placa_cavalo}
+    return CACHE_SAIDAS.produzir("planilha_motorista", [], entradas, novo_caminho_excel,
+                                 lambda destino: copia_modelo.gerar(destino, produtos, data_carregamento, nome_condutor, placa_cavalo))
+
 def criar_planilha_especifica_motorista(novo_caminho_excel, produtos, data_carregamento, nome_condutor, placa_cavalo):
     try:
-        wb = load_workbook(EXCEL_FILE)
-        ws = wb[SHEET_NAME]
+        copia_modelo, hash_modelo = MODELO_PLANILHA_MOTORISTA.copia()
     except FileNotFoundError:
-        messagebox.showerror("Erro", f"Arquivo modelo de planilha '{EXCEL_FILE}' não encontrado."); return
+        _notificar("error", "Erro", f"Arquivo modelo de planilha '{EXCEL_FILE}' não encontrado."); return False
     except Exception as e:
-        messagebox.showerror("Erro", f"Não foi possível abrir a planilha modelo '{EXCEL_FILE}'.\n\nDetalhe: {e}"); return
-    headers = get_headers_from_sheet(ws)
-    for row_num in range(3, 100):
-        if row_num > ws.max_row: break
-        for col_num in range(1, len(headers) + 1):
-            ws.cell(row=row_num, column=col_num).value = None
-    start_row = 3
-    for idx, p in enumerate(produtos):
-        row_map = {"Cliente": p.get("cliente"), "Data de Carregamento": data_carregamento, "Placa cavalo mecânico": placa_cavalo, "Nome do condutor": nome_condutor, "Número do pedido": p.get("contrato"), "Produto": p.get("produto"), "Embalagem": p.get("embalagem"), "Quantidade": p.get("toneladas"), "Cidade/UF": p.get("cidade")}
-        for col_idx, header in enumerate(headers, start=1):
-            ws.cell(row=start_row + idx, column=col_idx).value = row_map.get(header)
+        _notificar("error", "Erro", f"Não foi possível abrir a planilha modelo '{EXCEL_FILE}'.\n\nDetalhe: {e}"); return False
+    try:
+        _gerar_planilha_motorista_com_cache(copia_modelo, hash_modelo, novo_caminho_excel, produtos, data_carregamento, nome_condutor, placa_cavalo)
+        return True
+    except Exception as e:
+        _notificar("error", "Erro ao Salvar", f"Não foi possível salvar a planilha '{os.path.basename(novo_caminho_excel)}'.\n\nDetalhe: {e}")
+        return False
+
+_MODELO_PLANILHA_WORKER = None
+
+def _inicializar_worker_planilhas(modelo):
+    # Cada processo carrega o modelo limpo uma vez e o reaproveita em todas as planilhas dele.
+    global _MODELO_PLANILHA_WORKER
+    dados_modelo, hash_modelo = modelo
+    _MODELO_PLANILHA_WORKER = (CopiaModeloPlanilhaMotorista(dados_modelo), hash_modelo)
+
+def _gerar_planilha_motorista_lote(modelo, trabalho, data_carregamento):
+    # Nos processos do pool não há interface: o erro volta no resultado em vez de um diálogo.
+    inicio = time.perf_counter()
+    resultado = {"caminho": trabalho["caminho"], "ok": False, "erro": None, "duracao": 0.0, "do_cache": False}
     try:
-        wb.save(novo_caminho_excel)
+        resultado["do_cache"] = _gerar_planilha_motorista_com_cache(*modelo, trabalho["caminho"], trabalho["produtos"], data_carregamento, trabalho["nome_condutor"], trabalho.get("placa_cavalo", ""))
+        resultado["ok"] = True
     except Exception as e:
-        messagebox.showerror("Erro ao Salvar", f"Não foi possível salvar a planilha '{os.path.basename(novo_caminho_excel)}'.\n\nDetalhe: {e}")
+        resultado["erro"] = f"{type(e).__name__}: {e}"
+    resultado["duracao"] = time.perf_counter() - inicio
+    return resultado
+
+def _gerar_planilha_motorista_worker(trabalho, data_carregamento):
+    return _gerar_planilha_motorista_lote(_MODELO_PLANILHA_WORKER, trabalho, data_carregamento)
+
+def criar_planilhas_motoristas_em_lote(trabalhos, data_carregamento, max_workers=None):
+    """Gera as planilhas de todos os motoristas de uma data. `trabalhos` é uma lista de dicts com
+    caminho, produtos, nome_condutor e placa_cavalo; o retorno segue a mesma ordem."""
+    if not trabalhos:
+        return []
+    workers = max_workers or min(os.cpu_count() or 1, len(trabalhos) // MIN_PLANILHAS_POR_PROCESSO)
+    try:
+        modelo = MODELO_PLANILHA_MOTORISTA.copia() if workers <= 1 else MODELO_PLANILHA_MOTORISTA.preparado()
+    except Exception as e:
+        erro = f"Modelo '{EXCEL_FILE}' indisponível: {type(e).__name__}: {e}"
+        return [{"caminho": t["caminho"], "ok": False, "erro": erro, "duracao": 0.0, "do_cache": False} for t in trabalhos]
+    inicio = time.perf_counter()
+    print(f"{_get_timestamp()} [PLANILHAS] Gerando {len(trabalhos)} planilha(s) de motorista com {max(workers, 1)} processo(s)...")
+    if workers <= 1:
+        resultados = [_gerar_planilha_motorista_lote(modelo, t, data_carregamento) for t in trabalhos]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_inicializar_worker_planilhas, initargs=(modelo,)) as executor:
+            futuros = [executor.submit(_com_contagem_cache_saidas, _gerar_planilha_motorista_worker, t, data_carregamento) for t in trabalhos]
+            resultados = []
+            for trabalho, futuro in zip(trabalhos, futuros):
+                try:
+                    resultado = futuro.result()
+                    CACHE_SAIDAS.somar_contagem(resultado.pop("contagem_cache"))
+                    resultados.append(resultado)
+                except Exception as e:
+                    resultados.append({"caminho": trabalho["caminho"], "ok": False, "erro": f"{type(e).__name__}: {e}", "duracao": 0.0, "do_cache": False})
+    falhas = [r for r in resultados if not r["ok"]]
+    for r in falhas:
+        print(f"{_get_timestamp()} [PLANILHAS] ERRO em '{os.path.basename(r['caminho'])}': {r['erro']}")
+    print(f"{_get_timestamp()} [PLANILHAS] Concluído em {time.perf_counter() - inicio:.2f}s ({len(trabalhos) - len(falhas)} ok, {len(falhas)} com erro, "
+          f"{sum(1 for r in resultados if r['do_cache'])} reaproveitada(s) do cache).")
+    return resultados
+
+# ==============================================================================
+# OCR (Azure) com Cache em Disco
+# ==============================================================================
+# CNH, CRLV, RNTRC e fotos da Heringer passam pelo Azure Image Analysis (READ). O resultado de
+# cada página fica guardado pelo SHA-256 do arquivo + número da página: o mesmo documento de um
+# motorista recorrente é lido do disco na hora, sem latência nem custo de chamada. As entradas
+# expiram depois de OCR_CACHE_TTL_DIAS e o diretório é podado por tamanho (LRU).
+# Os polígonos das linhas ficam no referencial do documento (pontos da página no PDF, pixels
+# da foto já girada), não no da imagem recortada/reduzida que foi enviada; a "geometria" da
+# entrada guarda o recorte e a escala usados. Páginas em branco também entram no cache.
+VERSAO_OCR = 2
+OCR_CACHE_TTL_DIAS = 90
+LIMITE_CACHE_OCR_BYTES = 100 * 1024 * 1024
+# Pré-processamento antes do upload: o READ não ganha nada acima de ~2200 px no lado maior
+# para documentos; fotos de 12 MP e scans a 300+ dpi só custam upload e timeouts.
+OCR_LADO_MAXIMO = 2200
+OCR_DPI_PDF_MAXIMO = 300
+OCR_QUALIDADE_JPEG = 85
+OCR_LIMIAR_FUNDO = 235  # Tons de cinza acima disso contam como papel em branco no recorte.
+OCR_MARGEM_RECORTE = 20
+OCR_LADO_MINIMO = 50  # Menor imagem aceita pelo Image Analysis.
+
+class CacheOCR(CacheDisco):
+    def __init__(self, diretorio, limite_bytes, ttl_segundos):
+        super().__init__(diretorio, limite_bytes)
+        self.ttl_segundos = ttl_segundos
+
+    def obter(self, chave):
+        entrada = super().obter(chave)
+        if entrada is not None and time.time() - entrada.get("criado_em", 0) > self.ttl_segundos:
+            try:
+                self._remover(self._caminho(chave))
+            except OSError:
+                pass
+            return None
+        return entrada
+
+CACHE_OCR = CacheOCR(_caminho_cache("ocr"), LIMITE_CACHE_OCR_BYTES, OCR_CACHE_TTL_DIAS * 24 * 3600)
+AZURE_CHAMADAS_POR_SEGUNDO = 10  # Limite do plano S1 do Image Analysis.
+
+class LimitadorTaxa:
+    """Espaça as chamadas para no máximo `por_segundo`, somando todas as threads."""
+    def __init__(self, por_segundo):
+        self.intervalo = 1.0 / por_segundo
+        self._lock = threading.Lock()
+        self._proxima = 0.0
+
+    def aguardar(self):
+        with self._lock:
+            agora = time.monotonic()
+            espera = max(0.0, self._proxima - agora)
+            self._proxima = max(agora, self._proxima) + self.intervalo
+        if espera:
+            time.sleep(espera)
+
+LIMITADOR_AZURE = LimitadorTaxa(AZURE_CHAMADAS_POR_SEGUNDO)
+_CLIENTE_AZURE = None
+_LOCK_CLIENTE_AZURE = threading.Lock()
+
+def _cliente_azure():
+    global _CLIENTE_AZURE
+    with _LOCK_CLIENTE_AZURE:
+        if _CLIENTE_AZURE is None:
+            _CLIENTE_AZURE = ImageAnalysisClient(endpoint=AZURE_ENDPOINT, credential=AzureKeyCredential(AZURE_KEY))
+        return _CLIENTE_AZURE
+
+def _chave_cache_ocr(sha256, pagina):
+    return f"{sha256}-p{pagina}-v{VERSAO_OCR}"
+
+def _ocr_azure_imagem(dados_imagem):
+    """Uma chamada READ. Devolve {"texto": ..., "linhas": [{"texto": ..., "poligono": [[x, y], ...]}]}."""
+    LIMITADOR_AZURE.aguardar()
+    resultado = _cliente_azure().analyze(image_data=dados_imagem, visual_features=[VisualFeatures.READ])
+    linhas = []
+    if resultado.read is not None:
+        for bloco in resultado.read.blocks:
+            for linha in bloco.lines:
+                linhas.append({"texto": linha.text, "poligono": [[p.x, p.y] for p in (linha.bounding_polygon or [])]})
+    return {"texto": "\n".join(l["texto"] for l in linhas), "linhas": linhas}
+
+def _dpi_pagina_ocr(area):
+    # DPI que já entrega a área rasterizada com OCR_LADO_MAXIMO px no lado maior, sem reduzir depois.
+    lado_polegadas = max(area.width, area.height) / 72
+    return max(72, min(OCR_DPI_PDF_MAXIMO, int(OCR_LADO_MAXIMO / lado_polegadas))) if lado_polegadas else OCR_DPI_PDF_MAXIMO
+
+GEOMETRIA_IDENTIDADE = {"deslocamento": [0.0, 0.0], "escala": 1.0}
+
+def _geometria_em_pontos(geometria, dpi, origem=(0.0, 0.0)):
+    # Pixels da área rasterizada (que começa em `origem`) -> pontos da página do PDF.
+    fator = 72 / dpi
+    return {"deslocamento": [o + v * fator for o, v in zip(origem, geometria["deslocamento"])], "escala": geometria["escala"] / fator}
+
+def _area_conteudo_pagina(pagina):
+    """Retângulo, em pontos, que cobre tudo o que a página desenha (texto, imagens, vetores), lido
+    da lista de exibição sem rasterizar; None se a página não desenha nada. Com margem de
+    OCR_MARGEM_RECORTE pontos e limitado à página; páginas giradas são rasterizadas inteiras."""
+    area = fitz.Rect()
+    for _, caixa in pagina.get_bboxlog():
+        area |= caixa
+    area &= pagina.rect
+    if area.is_empty:
+        return None
+    if pagina.rotation:
+        return pagina.rect
+    margem = OCR_MARGEM_RECORTE
+    return (area + (-margem, -margem, margem, margem)) & pagina.rect
+
+def _poligono_na_origem(poligono, geometria):
+    """Ponto da imagem enviada -> referencial do documento: origem = enviado / escala + deslocamento."""
+    (dx, dy), escala = geometria["deslocamento"], geometria["escala"]
+    return [[x / escala + dx, y / escala + dy] for x, y in poligono]
+
+def preparar_imagem_ocr(imagem, bytes_originais, nome):
+    """Gira pela orientação EXIF, recorta as margens em branco, reduz para OCR_LADO_MAXIMO e
+    recodifica em JPEG tons de cinza. Devolve (bytes para o upload, geometria do recorte/escala)
+    ou None se a página está em branco."""
+    etapas = {}
+    inicio = time.perf_counter()
+    imagem = ImageOps.exif_transpose(imagem)
+    etapas["girar"] = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    cinza = imagem.convert("L")
+    caixa = cinza.point(lambda v: 255 if v < OCR_LIMIAR_FUNDO else 0).getbbox()
+    if caixa is None:
+        print(f"{_get_timestamp()} [OCR] {nome}: página em branco, ignorada.")
+        return None
+    caixa = (max(caixa[0] - OCR_MARGEM_RECORTE, 0), max(caixa[1] - OCR_MARGEM_RECORTE, 0),
+             min(caixa[2] + OCR_MARGEM_RECORTE, cinza.width), min(caixa[3] + OCR_MARGEM_RECORTE, cinza.height))
+    deslocamento = [0.0, 0.0]
+    if caixa != (0, 0, cinza.width, cinza.height) and min(caixa[2] - caixa[0], caixa[3] - caixa[1]) >= OCR_LADO_MINIMO:
+        cinza = cinza.crop(caixa)
+        deslocamento = [float(caixa[0]), float(caixa[1])]
+    etapas["recortar"] = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    escala = max(OCR_LADO_MAXIMO / max(cinza.size), OCR_LADO_MINIMO / min(cinza.size))
+    largura_recorte = cinza.width
+    if escala < 1:
+        cinza = cinza.resize((max(1, round(cinza.width * escala)), max(1, round(cinza.height * escala))), Image.LANCZOS)
+    etapas["reduzir"] = time.perf_counter() - inicio
+    geometria = {"deslocamento": deslocamento, "escala": cinza.width / largura_recorte}
+
+    inicio = time.perf_counter()
+    buffer = io.BytesIO()
+    cinza.save(buffer, format="JPEG", quality=OCR_QUALIDADE_JPEG, optimize=True)
+    dados = buffer.getvalue()
+    etapas["codificar"] = time.perf_counter() - inicio
+
+    # Imagem já pequena e sem mudança de geometria: o original vai como está.
+    if bytes_originais is not None and len(dados) >= len(bytes_originais) and cinza.size == imagem.size:
+        dados = bytes_originais
+        geometria = dict(GEOMETRIA_IDENTIDADE)
+    antes = len(bytes_originais) if bytes_originais is not None else imagem.width * imagem.height * len(imagem.getbands())
+    tempos = ", ".join(f"{etapa} {segundos * 1000:.0f} ms" for etapa, segundos in etapas.items())
+    print(f"{_get_timestamp()} [OCR] {nome}: {antes / 1024:.0f} KB -> {len(dados) / 1024:.0f} KB, "
+          f"{imagem.width}x{imagem.height} -> {cinza.width}x{cinza.height} ({tempos}).")
+    return dados, geometria
+
+def _paginas_para_ocr(caminho_arquivo):
+    """Gera (número da página, função que devolve (bytes prontos para o upload, geometria) ou None
+    se a página está em branco); só rasteriza/prepara o que não estiver no cache. Do PDF só é
+    rasterizada a área com conteúdo de cada página; páginas que não desenham nada nem chegam a ser."""
+    nome_arquivo = os.path.basename(caminho_arquivo)
+    if caminho_arquivo.lower().endswith(".pdf"):
+        with fitz.open(caminho_arquivo) as doc:
+            for numero, pagina in enumerate(doc, start=1):
+                def preparar_pagina(pagina=pagina, numero=numero):
+                    inicio = time.perf_counter()
+                    area = _area_conteudo_pagina(pagina)
+                    if area is None:
+                        print(f"{_get_timestamp()} [OCR] {nome_arquivo} p{numero}: página sem conteúdo, ignorada sem rasterizar.")
+                        return None
+                    dpi = _dpi_pagina_ocr(area)
+                    pixmap = pagina.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY, clip=area)
+                    imagem = Image.frombytes("L", (pixmap.width, pixmap.height), pixmap.samples)
+                    print(f"{_get_timestamp()} [OCR] {nome_arquivo} p{numero}: {area.width:.0f}x{area.height:.0f} pt de "
+                          f"{pagina.rect.width:.0f}x{pagina.rect.height:.0f} rasterizados a {dpi} dpi em {(time.perf_counter() - inicio) * 1000:.0f} ms.")
+                    preparada = preparar_imagem_ocr(imagem, None, f"{nome_arquivo} p{numero}")
+                    return (preparada[0], _geometria_em_pontos(preparada[1], dpi, (area.x0, area.y0))) if preparada else None
+                yield numero, preparar_pagina
+    else:
+        def preparar_foto():
+            with open(caminho_arquivo, "rb") as f:
+                dados = f.read()
+            try:
+                imagem = Image.open(io.BytesIO(dados))
+                imagem.load()
+            except Exception as e:
+                # Formato que o PIL não abre: deixa o Azure tentar com o arquivo original.
+                print(f"{_get_timestamp()} [OCR] {nome_arquivo}: sem pré-processamento ({type(e).__name__}: {e}).")
+                return dados, dict(GEOMETRIA_IDENTIDADE)
+            return preparar_imagem_ocr(imagem, dados, nome_arquivo)
+        yield 1, preparar_foto
+
+def _ocr_e_guardar(chave, preparada):
+    """OCR da página preparada por _paginas_para_ocr e gravação no cache. Página em branco
+    (`preparada` None) é gravada como tal, para não ser rasterizada de novo na próxima leitura."""
+    if preparada is None:
+        entrada = {"texto": "", "linhas": [], "em_branco": True}
+    else:
+        dados, geometria = preparada
+        entrada = _ocr_azure_imagem(dados)
+        for linha in entrada["linhas"]:
+            linha["poligono"] = _poligono_na_origem(linha["poligono"], geometria)
+        entrada["geometria"] = geometria
+    entrada["criado_em"] = time.time()
+    CACHE_OCR.guardar(chave, entrada)
+    return entrada
+
+def ler_paginas_com_azure(caminho_arquivo):
+    """OCR de cada página do arquivo (PDF ou imagem), usando o cache quando possível.
+    Devolve a lista de entradas {"pagina", "texto", "linhas", "do_cache"}."""
+    inicio = time.perf_counter()
+    sha256 = _hash_arquivo(caminho_arquivo)
+    paginas = []
+    for numero, obter_imagem in _paginas_para_ocr(caminho_arquivo):
+        chave = _chave_cache_ocr(sha256, numero)
+        entrada = CACHE_OCR.obter(chave)
+        do_cache = entrada is not None
+        if not do_cache:
+            entrada = _ocr_e_guardar(chave, obter_imagem())
+        if entrada.get("em_branco"):
+            continue
+        paginas.append({"pagina": numero, "texto": entrada["texto"], "linhas": entrada["linhas"], "do_cache": do_cache})
+    do_cache = sum(1 for p in paginas if p["do_cache"])
+    print(f"{_get_timestamp()} [OCR] '{os.path.basename(caminho_arquivo)}': {len(paginas)} página(s), {do_cache} do cache, "
+          f"em {(time.perf_counter() - inicio) * 1000:.0f} ms.")
+    return paginas
+
+def obter_texto_do_arquivo_com_azure(caminho_arquivo):
+    return "\n".join(p["texto"] for p in ler_paginas_com_azure(caminho_arquivo))
+
+# O PyMuPDF não é thread-safe. Leituras que rodam em várias threads separam a parte local
+# (abrir, extrair texto, rasterizar), feita sob LOCK_FITZ, da parte remota (upload e espera
+# do Azure), que roda solta.
+LOCK_FITZ = threading.Lock()
+
+def preparar_paginas_ocr(caminho_arquivo):
+    """Parte local do OCR: [(chave, entrada do cache ou None, página preparada ou None)]."""
+    sha256 = _hash_arquivo(caminho_arquivo)
+    paginas = []
+    with LOCK_FITZ:
+        for numero, obter_imagem in _paginas_para_ocr(caminho_arquivo):
+            chave = _chave_cache_ocr(sha256, numero)
+            entrada = CACHE_OCR.obter(chave)
+            paginas.append((chave, entrada, obter_imagem() if entrada is None else None))
+    return paginas
+
+def texto_paginas_ocr(paginas):
+    """Parte remota do OCR: envia ao Azure as páginas de preparar_paginas_ocr que não estavam no
+    cache e devolve o texto do arquivo, como obter_texto_do_arquivo_com_azure."""
+    textos = []
+    for chave, entrada, preparada in paginas:
+        if entrada is None:
+            entrada = _ocr_e_guardar(chave, preparada)
+        if not entrada.get("em_branco"):
+            textos.append(entrada["texto"])
+    return "\n".join(textos)
+
+def _nome_cnh_valido(nome):
+    return ' ' in nome and len(nome) > 5
+
+_CATEGORIAS_CNH_FALLBACK = ['AE', 'AD', 'AC', 'AB', 'E', 'D', 'C']
+REGRAS_CNH = ConjuntoRegras("CNH", {
+    "nome": [
+        Regra("rotulo_nome", r'-?\s*NOME\s*\n([A-Z\sÇÃÕÁÉÍÓÚÀÂÊÔ,.]+)', visao="upper", aceitar=_nome_cnh_valido, converter=lambda v: ' '.join(v.split())),
+        Regra("apos_1a_habilitacao", r'1ª HABILITAÇÃO\s*\n([A-Z\sÇÃÕÁÉÍÓÚÀÂÊÔ,.]+)', visao="upper", aceitar=_nome_cnh_valido, converter=lambda v: ' '.join(v.split())),
+        Regra("mrz", r'\b([A-Z]+(?: < [A-Z]+)+)\s*$', visao="upper", extrair=lambda m: m.group(1).strip().replace(' < ', ' ')),
+    ],
+    "categoria": [Regra("rotulo_cat_hab", r'CAT\.?\s*HAB\.?\s*\n?([A-Z]{1,2})', visao="upper", extrair=lambda m: re.sub(r'[^A-Z]', '', m.group(1)), aceitar=bool)]
+        + [Regra(f"categoria_{cat}", r'\b' + cat + r'\b', visao="upper", extrair=lambda m: m.group(0)) for cat in _CATEGORIAS_CNH_FALLBACK],
+    "cpf": [Regra("cpf", r"(\d{3}\.?\d{3}\.?\d{3}-?\d{2})", visao="upper", extrair=lambda m: m.group(1))],
+    "protocolo": [Regra("valida_em_todo", r'VÁLIDA EM TODO.*?\n?(\d{10})', visao="upper", extrair=lambda m: m.group(1))],
+})
+_PADRAO_DATA_CNH = re.compile(r'(\d{1,2}/\d{1,2}/\d{4})')
+_PADRAO_ONZE_DIGITOS = re.compile(r'\b(\d{11})\b')
 
 def extrair_dados_cnh_com_azure_api(texto_completo: str) -> dict:
     if not texto_completo:
@@ -574,45 +2000,15 @@ def extrair_dados_cnh_com_azure_api(texto_completo: str) -> dict:
     print(texto_completo)
     print("--- FIM DO DEBUG OCR ---\n")
     dados_cnh = {"nome": "Não encontrado", "cpf": "Não encontrado", "numero": "Não encontrado", "seguro": "Não encontrado", "categoria": "Não encontrada", "protocolo": "Não encontrado", "dtValidade": "Não encontrada", "dtExpedicao": "Não encontrada", "dtPrimeiraExpedicao": "Não encontrada", "dtNascimento": "Não encontrada"}
-    texto_upper = texto_completo.upper()
-    nome_encontrado = None
-    m_nome = re.search(r'-?\s*NOME\s*\n([A-Z\sÇÃÕÁÉÍÓÚÀÂÊÔ,.]+)', texto_upper)
-    if m_nome:
-        nome_bruto = m_nome.group(1).strip()
-        if ' ' in nome_bruto and len(nome_bruto) > 5:
-            nome_encontrado = ' '.join(nome_bruto.split())
-    if not nome_encontrado:
-        m_nome_hab = re.search(r'1ª HABILITAÇÃO\s*\n([A-Z\sÇÃÕÁÉÍÓÚÀÂÊÔ,.]+)', texto_upper)
-        if m_nome_hab:
-            nome_bruto = m_nome_hab.group(1).strip()
-            if ' ' in nome_bruto and len(nome_bruto) > 5:
-                nome_encontrado = ' '.join(nome_bruto.split())
-    if not nome_encontrado:
-        m_nome_final = re.search(r'\b([A-Z]+(?: < [A-Z]+)+)\s*$', texto_upper)
-        if m_nome_final:
-            nome_com_tags = m_nome_final.group(1).strip()
-            nome_encontrado = nome_com_tags.replace(' < ', ' ')
-    if nome_encontrado:
-        dados_cnh["nome"] = nome_encontrado
-    categoria_encontrada = None
-    m_cat = re.search(r'CAT\.?\s*HAB\.?\s*\n?([A-Z]{1,2})', texto_upper)
-    if m_cat:
-        cat_bruta = re.sub(r'[^A-Z]', '', m_cat.group(1))
-        if cat_bruta:
-            categoria_encontrada = cat_bruta
-    if not categoria_encontrada:
-        categorias_validas = ['AE', 'AD', 'AC', 'AB', 'E', 'D', 'C']
-        for cat in categorias_validas:
-            if re.search(r'\b' + cat + r'\b', texto_upper):
-                categoria_encontrada = cat
-                break
-    if categoria_encontrada:
-        dados_cnh["categoria"] = categoria_encontrada
-    m_cpf = re.search(r"(\d{3}\.?\d{3}\.?\d{3}-?\d{2})", texto_upper)
-    if m_cpf:
-        dados_cnh["cpf"] = m_cpf.group(1)
+    doc = TextoDocumento(texto_completo)
+    texto_upper = doc.visao("upper")
+    campos, diagnostico = REGRAS_CNH.aplicar(doc)
+    print(_resumo_diagnostico(REGRAS_CNH.nome, diagnostico))
+    for campo in ("nome", "categoria", "cpf", "protocolo"):
+        if campos[campo]:
+            dados_cnh[campo] = campos[campo]
     todas_datas = []
-    for d in re.findall(r'(\d{1,2}/\d{1,2}/\d{4})', texto_upper):
+    for d in _PADRAO_DATA_CNH.findall(texto_upper):
         try:
             todas_datas.append(datetime.strptime(d, "%d/%m/%Y"))
         except ValueError:
@@ -625,45 +2021,48 @@ def extrair_dados_cnh_com_azure_api(texto_completo: str) -> dict:
         dados_cnh["dtPrimeiraExpedicao"] = fmt(1)
         dados_cnh["dtExpedicao"] = fmt(2)
         dados_cnh["dtValidade"] = fmt(-1)
-    numeros_11 = set(re.findall(r'\b(\d{11})\b', texto_upper))
+    numeros_11 = set(_PADRAO_ONZE_DIGITOS.findall(texto_upper))
     cpf_limpo = re.sub(r'\D', '', dados_cnh["cpf"])
     numeros_11.discard(cpf_limpo)
     if numeros_11:
         dados_cnh["numero"] = numeros_11.pop()
         dados_cnh["seguro"] = numeros_11.pop() if numeros_11 else "Não encontrado"
-    m_proto = re.search(r'VÁLIDA EM TODO.*?\n?(\d{10})', texto_upper)
-    if m_proto:
-        dados_cnh["protocolo"] = m_proto.group(1)
     return dados_cnh
 
+def _formatar_placa(placa_crua):
+    return f"{placa_crua[:3]}-{placa_crua[3:]}" if len(placa_crua) == 7 else placa_crua
+
+REGRAS_CRLV = ConjuntoRegras("CRLV", {
+    "placa": [Regra("placa_mercosul_ou_antiga", r'([A-Z]{3}\d[A-Z0-9]\d{2})', visao="upper", extrair=lambda m: m.group(1), converter=_formatar_placa)],
+    "renavam": [
+        Regra("renavam_linha_seguinte", r'C[OÓ]DIGO RENAVAM\s*\n\s*(\d{9,11})', visao="upper"),
+        Regra("renavam_linha_unica", r'C[OÓ]DIGO RENAVAM\s.*?(\d{11})', visao="upper_linha_unica"),
+    ],
+    "eixos": [
+        Regra("eixos_linha_seguinte", r'EIXOS\s*\n\s*(\d+)', visao="upper"),
+        Regra("eixos_linha_unica", r'EIXOS\s+.*?\s(\d)\s', visao="upper_linha_unica"),
+    ],
+})
+_PADRAO_LOCAL_CRLV = re.compile(r'([A-Z\s]+)\s+([A-Z]{2})$')
+_PALAVRAS_CARROCERIA = [(nome, [p for p in re.split(r'[/ ]', nome.replace('Ú', 'U')) if len(p) > 2]) for nome in BSOFT_TIPOS_CARROCERIA_NOMES.values()]
+
 def extrair_dados_crlv_com_azure_api(texto_completo: str) -> dict:
     if not texto_completo:
         return {}
     dados_crlv = {}
-    texto_upper_com_linhas = texto_completo.upper()
-    texto_upper_linha_unica = texto_upper_com_linhas.replace('\n', ' ')
-    linhas = texto_upper_com_linhas.split('\n')
+    doc = TextoDocumento(texto_completo)
+    texto_upper_com_linhas = doc.visao("upper")
+    texto_upper_linha_unica = doc.visao("upper_linha_unica")
+    linhas = doc.visao("linhas_upper")
     print("\n--- DEBUG OCR (VERSÃO FINAL COM FORMATAÇÃO) ---")
     print(texto_upper_com_linhas)
     print("-----------------------------------------------\n")
     try:
-        placas_possiveis = re.findall(r'([A-Z]{3}\d[A-Z0-9]\d{2})', texto_upper_com_linhas)
-        if placas_possiveis:
-            placa_crua = placas_possiveis[0]
-            if len(placa_crua) == 7:
-                dados_crlv['placa'] = f"{placa_crua[:3]}-{placa_crua[3:]}"
-            else:
-                dados_crlv['placa'] = placa_crua
-        match = re.search(r'C[OÓ]DIGO RENAVAM\s*\n\s*(\d{9,11})', texto_upper_com_linhas)
-        if not match:
-            match = re.search(r'C[OÓ]DIGO RENAVAM\s.*?(\d{11})', texto_upper_linha_unica)
-        if match:
-            dados_crlv['renavam'] = match.group(1).strip()
-        match = re.search(r'EIXOS\s*\n\s*(\d+)', texto_upper_com_linhas)
-        if not match:
-            match = re.search(r'EIXOS\s+.*?\s(\d)\s', texto_upper_linha_unica)
-        if match:
-            dados_crlv['eixos'] = match.group(1).strip()
+        campos, diagnostico = REGRAS_CRLV.aplicar(doc)
+        print(_resumo_diagnostico(REGRAS_CRLV.nome, diagnostico))
+        for campo, valor in campos.items():
+            if valor is not None:
+                dados_crlv[campo] = valor
         try:
             idx = next(i for i, l in enumerate(linhas) if "MARCA / MODELO" in l)
             for linha_busca in linhas[idx+1 : idx+8]:
@@ -677,7 +2076,7 @@ def extrair_dados_crlv_com_azure_api(texto_completo: str) -> dict:
         try:
             idx = next(i for i, l in enumerate(linhas) if "LOCAL" in l)
             for linha_busca in linhas[idx+1 : idx+8]:
-                match_local = re.search(r'([A-Z\s]+)\s+([A-Z]{2})$', linha_busca.strip())
+                match_local = _PADRAO_LOCAL_CRLV.search(linha_busca.strip())
                 if match_local and len(match_local.group(1).strip()) > 3:
                     dados_crlv['cidade'] = ' '.join(w.capitalize() for w in match_local.group(1).strip().split())
                     dados_crlv['estado'] = match_local.group(2).strip()
@@ -685,8 +2084,7 @@ def extrair_dados_crlv_com_azure_api(texto_completo: str) -> dict:
         except (StopIteration, IndexError): pass
         try:
             idx = next(i for i, l in enumerate(linhas) if "ESPÉCIE / TIPO" in l)
-            for linha_busca in linhas[idx+1 : idx+11]:
-                linha_upper = linha_busca.upper()
+            for linha_upper in linhas[idx+1 : idx+11]:
                 if "TRACAO CAMINHAO TRATOR" in linha_upper or "CAMINHAO TRATOR" in linha_upper:
                     dados_crlv['categoria_veiculo'] = 'CAVALO'
                     break
@@ -698,22 +2096,19 @@ def extrair_dados_crlv_com_azure_api(texto_completo: str) -> dict:
                     break
         except (StopIteration, IndexError):
             pass
-        carroceria_encontrada = False
-        for codigo, nome in BSOFT_TIPOS_CARROCERIA_NOMES.items():
-            palavras_chave = re.split(r'[/ ]', nome.replace('Ú', 'U'))
-            for palavra in palavras_chave:
-                if len(palavra) > 2 and palavra in texto_upper_linha_unica:
-                    dados_crlv['tipo_carroceria'] = nome
-                    carroceria_encontrada = True
-                    break
-            if carroceria_encontrada:
+        for nome, palavras_chave in _PALAVRAS_CARROCERIA:
+            if any(palavra in texto_upper_linha_unica for palavra in palavras_chave):
+                dados_crlv['tipo_carroceria'] = nome
                 break
     except Exception as e:
-        import traceback
         print(f"ERRO AO EXTRAIR DADOS DO CRLV: {e}")
         traceback.print_exc()
     return dados_crlv
 
+REGRAS_RNTRC = ConjuntoRegras("RNTRC", {
+    "rntrc": [Regra("oito_ou_mais_digitos", r'(\d{8,})')],
+})
+
 def extrair_dados_rntrc_com_azure_api(texto_completo: str) -> dict:
     if not texto_completo:
         return {}
@@ -722,56 +2117,435 @@ def extrair_dados_rntrc_com_azure_api(texto_completo: str) -> dict:
     print("\n--- DEBUG OCR (RNTRC) ---")
     print(texto_upper)
     print("------------------------\n")
-    match_rntrc = re.search(r'(\d{8,})', texto_upper.replace("RNTRC", ""))
-    if match_rntrc:
-        dados_rntrc['rntrc'] = match_rntrc.group(1).strip()
+    campos, diagnostico = REGRAS_RNTRC.aplicar(TextoDocumento(texto_upper.replace("RNTRC", "")))
+    print(_resumo_diagnostico(REGRAS_RNTRC.nome, diagnostico))
+    if campos["rntrc"]:
+        dados_rntrc['rntrc'] = campos["rntrc"]
     return dados_rntrc
 
-def parse_pdf_fields(pdf_path, lista_cidades, root_window):
+# ==============================================================================
+# Leitura de Documentos (camada de texto antes do Azure)
+# ==============================================================================
+# CRLV-e e RNTRC baixados dos portais do governo já trazem texto. O extrator do tipo roda
+# primeiro sobre a camada de texto do PDF (PyMuPDF, milissegundos); o Azure só é chamado se
+# algum campo-chave ficar vazio. O caminho usado em cada documento vai para o console e para
+# debug_logs/leitura_documentos.jsonl.
+EXTRATORES_DOCUMENTO = {
+    "cnh": (extrair_dados_cnh_com_azure_api, ("nome", "cpf")),
+    "crlv": (extrair_dados_crlv_com_azure_api, ("placa", "renavam")),
+    "rntrc": (extrair_dados_rntrc_com_azure_api, ("rntrc",)),
+}
+
+def campo_documento_preenchido(valor):
+    """O extrator da CNH preenche o que não achou com "Não encontrado"/"Não encontrada"."""
+    return bool(valor) and not str(valor).startswith("Não encontrad")
+
+def _texto_camada_pdf(caminho_arquivo):
+    with LOCK_FITZ, fitz.open(caminho_arquivo) as doc:
+        return "\n".join(pagina.get_text("text", sort=True) for pagina in doc)
+
+def _registrar_leitura_documento(registro):
+    try:
+        os.makedirs("debug_logs", exist_ok=True)
+        with open(os.path.join("debug_logs", "leitura_documentos.jsonl"), "a", encoding="utf-8") as f:
+            f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+    except OSError as e:
+        print(f"Aviso: não foi possível registrar a leitura do documento: {e}")
+
+def ler_documento(caminho_arquivo, tipo, texto_azure=None):
+    """Lê um documento do motorista (`tipo` em EXTRATORES_DOCUMENTO) e devolve
+    {"tipo", "arquivo", "caminho": "camada_texto" | "azure", "motivo", "texto", "dados", "duracao"}.
+    `texto_azure()` substitui obter_texto_do_arquivo_com_azure (ver ler_kit_motorista)."""
+    extrator, campos_chave = EXTRATORES_DOCUMENTO[tipo]
+    inicio = time.perf_counter()
+    resultado = {"tipo": tipo, "arquivo": caminho_arquivo, "caminho": "azure", "motivo": "", "texto": "", "dados": {}, "duracao": 0.0}
+    if caminho_arquivo.lower().endswith(".pdf"):
+        try:
+            texto = _texto_camada_pdf(caminho_arquivo)
+        except Exception as e:
+            texto = ""
+            resultado["motivo"] = f"camada de texto ilegível ({type(e).__name__})"
+        if texto.strip():
+            dados = extrator(texto)
+            faltando = [c for c in campos_chave if not campo_documento_preenchido(dados.get(c))]
+            if not faltando:
+                resultado.update(caminho="camada_texto", texto=texto, dados=dados)
+            else:
+                resultado["motivo"] = f"camada de texto sem {', '.join(faltando)}"
+        elif not resultado["motivo"]:
+            resultado["motivo"] = "PDF sem camada de texto"
+    else:
+        resultado["motivo"] = "imagem"
+    if resultado["caminho"] == "azure":
+        texto = texto_azure() if texto_azure else obter_texto_do_arquivo_com_azure(caminho_arquivo)
+        resultado.update(texto=texto, dados=extrator(texto) if texto else {})
+    resultado["duracao"] = time.perf_counter() - inicio
+    descricao = "camada de texto" if resultado["caminho"] == "camada_texto" else f"Azure ({resultado['motivo']})"
+    print(f"{_get_timestamp()} [DOCUMENTO] '{os.path.basename(caminho_arquivo)}' ({tipo.upper()}): {descricao} em {resultado['duracao'] * 1000:.0f} ms.")
+    _registrar_leitura_documento({"data": _get_timestamp(), "arquivo": caminho_arquivo, "tipo": tipo, "caminho": resultado["caminho"], "motivo": resultado["motivo"],
+                                  "campos": sorted(c for c, v in resultado["dados"].items() if campo_documento_preenchido(v)), "duracao_ms": round(resultado["duracao"] * 1000, 1)})
+    return resultado
+
+# ==============================================================================
+# Kit do Motorista (CNH, CRLVs e RNTRC de uma vez)
+# ==============================================================================
+# Todos os arquivos do motorista são lidos em paralelo (threads: o tempo é de rede) e cada um
+# é classificado pelo conteúdo. O PyMuPDF (camada de texto e rasterização) roda um arquivo
+# por vez, sob LOCK_FITZ; só o upload e a espera do Azure se sobrepõem. O cadastro completo leva o tempo do documento mais lento, não
+# a soma de todos; o LIMITADOR_AZURE segura o ritmo das chamadas.
+KIT_MAX_WORKERS = 4
+PALAVRAS_TIPO_DOCUMENTO = {
+    "cnh": ("CARTEIRA NACIONAL DE HABILITA", "HABILITAÇÃO", "HABILITACAO", "CAT. HAB", "CAT HAB", "PERMISSÃO PARA DIRIGIR"),
+    "crlv": ("RENAVAM", "LICENCIAMENTO", "CRLV", "CHASSI", "PLACA ANTERIOR"),
+    "rntrc": ("RNTRC", "ANTT", "TRANSPORTADORES RODOVIÁRIOS", "TRANSPORTADORES RODOVIARIOS"),
+}
+
+def classificar_documento(texto, caminho_arquivo=""):
+    """Tipo do documento pelas palavras-chave do texto (o nome do arquivo desempata). None se não der para dizer."""
+    texto_upper = (texto or "").upper()
+    nome_upper = os.path.basename(caminho_arquivo).upper()
+    pontos = {tipo: sum(1 for p in palavras if p in texto_upper) + (2 if tipo.upper() in nome_upper else 0)
+              for tipo, palavras in PALAVRAS_TIPO_DOCUMENTO.items()}
+    melhor = max(pontos.values())
+    vencedores = [tipo for tipo, p in pontos.items() if p == melhor]
+    return vencedores[0] if melhor and len(vencedores) == 1 else None
+
+def ler_documento_classificando(caminho_arquivo, texto_azure=None):
+    """Descobre o tipo do documento e o lê com ler_documento. O texto do Azure usado para
+    classificar fica no cache de OCR, então a leitura em seguida não paga outra chamada."""
+    texto_azure = texto_azure or (lambda: obter_texto_do_arquivo_com_azure(caminho_arquivo))
+    tipo = None
+    if caminho_arquivo.lower().endswith(".pdf"):
+        try:
+            tipo = classificar_documento(_texto_camada_pdf(caminho_arquivo), caminho_arquivo)
+        except Exception:
+            tipo = None
+    if tipo is None:
+        tipo = classificar_documento(texto_azure(), caminho_arquivo)
+    if tipo is None:
+        raise ValueError("não foi possível identificar se é CNH, CRLV ou RNTRC")
+    return ler_documento(caminho_arquivo, tipo, texto_azure)
+
+def _texto_azure_kit(caminho_arquivo):
+    # Rasteriza sob LOCK_FITZ e só o upload corre em paralelo; o texto fica guardado para a
+    # classificação e a leitura não prepararem as páginas duas vezes.
+    texto = []
+    def obter():
+        if not texto:
+            texto.append(texto_paginas_ocr(preparar_paginas_ocr(caminho_arquivo)))
+        return texto[0]
+    return obter
+
+def _ler_documento_kit(caminho_arquivo):
+    inicio = time.perf_counter()
+    try:
+        leitura = ler_documento_classificando(caminho_arquivo, _texto_azure_kit(caminho_arquivo))
+        return {"arquivo": caminho_arquivo, "tipo": leitura["tipo"], "dados": leitura["dados"], "caminho": leitura["caminho"], "erro": None, "duracao": time.perf_counter() - inicio}
+    except Exception as e:
+        return {"arquivo": caminho_arquivo, "tipo": None, "dados": {}, "caminho": None, "erro": f"{type(e).__name__}: {e}", "duracao": time.perf_counter() - inicio}
+
+def ler_kit_motorista(caminhos, max_workers=KIT_MAX_WORKERS, ao_concluir=None):
+    """Lê todos os documentos do motorista em paralelo. `ao_concluir(resultado)` é chamado a cada
+    documento pronto (na thread do pool); o retorno segue a ordem de `caminhos`."""
+    if not caminhos:
+        return []
+    inicio = time.perf_counter()
+    print(f"{_get_timestamp()} [KIT] Lendo {len(caminhos)} documento(s) com até {min(max_workers, len(caminhos))} thread(s)...")
+    resultados = {}
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(caminhos))) as executor:
+        futuros = {executor.submit(_ler_documento_kit, c): c for c in caminhos}
+        for futuro in as_completed(futuros):
+            resultado = futuro.result()
+            resultados[futuros[futuro]] = resultado
+            if ao_concluir:
+                ao_concluir(resultado)
+    ordenados = [resultados[c] for c in caminhos]
+    soma = sum(r["duracao"] for r in ordenados)
+    print(f"{_get_timestamp()} [KIT] Concluído em {time.perf_counter() - inicio:.2f}s (soma das leituras: {soma:.2f}s, "
+          f"{sum(1 for r in ordenados if r['erro'])} com erro).")
+    return ordenados
+
+def montar_kit_motorista(resultados):
+    """Junta as leituras: dados da CNH, placas na ordem cavalo -> carretas (até 3), RNTRC e avisos."""
+    kit = {"motorista": {}, "placas": [], "veiculos": [], "rntrc": "", "avisos": []}
+    for r in resultados:
+        if r["erro"]:
+            kit["avisos"].append(f"{os.path.basename(r['arquivo'])}: {r['erro']}")
+    _, campos_cnh = EXTRATORES_DOCUMENTO["cnh"]
+    cnhs = [r for r in resultados if r["tipo"] == "cnh" and all(campo_documento_preenchido(r["dados"].get(c)) for c in campos_cnh)]
+    for r in resultados:
+        if r["tipo"] == "cnh" and r not in cnhs:
+            kit["avisos"].append(f"{os.path.basename(r['arquivo'])}: CNH sem {' / '.join(campos_cnh)} legíveis.")
+    if cnhs:
+        # Só os campos lidos: o formulário não deve receber "Não encontrado".
+        kit["motorista"] = {c: v for c, v in cnhs[0]["dados"].items() if campo_documento_preenchido(v)}
+        if len(cnhs) > 1:
+            kit["avisos"].append(f"{len(cnhs)} CNHs no kit; usada '{os.path.basename(cnhs[0]['arquivo'])}'.")
+    crlvs = [r["dados"] for r in resultados if r["tipo"] == "crlv" and r["dados"].get("placa")]
+    # sorted é estável: entre carretas vale a ordem em que os arquivos foram escolhidos.
+    kit["veiculos"] = sorted(crlvs, key=lambda d: 0 if d.get("categoria_veiculo") in ("CAVALO", "TRUCK") else 1)
+    kit["placas"] = [d["placa"] for d in kit["veiculos"][:3]]
+    if len(kit["veiculos"]) > 3:
+        kit["avisos"].append(f"{len(kit['veiculos'])} CRLVs no kit; só as 3 primeiras placas cabem na O.C.")
+    rntrcs = [r["dados"]["rntrc"] for r in resultados if r["tipo"] == "rntrc" and r["dados"].get("rntrc")]
+    if rntrcs:
+        kit["rntrc"] = rntrcs[0]
+    return kit
+
+# ==============================================================================
+# Importação de Pedidos Heringer em Lote
+# ==============================================================================
+# A Heringer manda PDFs de várias páginas ou várias fotos de uma vez. Cada página vira uma
+# chamada de OCR independente: as páginas são rasterizadas em sequência (o fitz não é
+# thread-safe) e só o upload vai para o pool de threads. Cada página passa pelos dois leitores
+# (antigo e Eurochem) e os produtos são unificados pelo contrato.
+HERINGER_LOTE_MAX_WORKERS = 4
+
+def _paginas_pedidos_heringer(caminhos, executor):
+    """Gera uma entrada por página: {"arquivo", "pagina", "entrada" (do cache ou página em
+    branco), "futuro" (OCR em andamento), "erro"}."""
+    for caminho in caminhos:
+        try:
+            sha256 = _hash_arquivo(caminho)
+            for numero, obter_imagem in _paginas_para_ocr(caminho):
+                chave = _chave_cache_ocr(sha256, numero)
+                entrada = CACHE_OCR.obter(chave)
+                if entrada is not None:
+                    yield {"arquivo": caminho, "pagina": numero, "entrada": entrada, "futuro": None, "erro": None}
+                    continue
+                preparada = obter_imagem()
+                if preparada is None:
+                    yield {"arquivo": caminho, "pagina": numero, "entrada": _ocr_e_guardar(chave, None), "futuro": None, "erro": None}
+                    continue
+                yield {"arquivo": caminho, "pagina": numero, "entrada": None, "futuro": executor.submit(_ocr_e_guardar, chave, preparada), "erro": None}
+        except Exception as e:
+            yield {"arquivo": caminho, "pagina": None, "entrada": None, "futuro": None, "erro": f"{type(e).__name__}: {e}"}
+
+def importar_pedidos_heringer_em_lote(caminhos, contratos_existentes=(), max_workers=HERINGER_LOTE_MAX_WORKERS):
+    """OCR de todas as páginas de `caminhos`, os dois leitores em cada página e a lista única
+    de produtos (primeira ocorrência de cada contrato; os já em `contratos_existentes` ficam fora).
+    Produtos sem contrato legível entram todos: não há como saber se são repetidos.
+    Devolve {"produtos": [...], "paginas": [relatório por página], "duracao"}."""
+    inicio = time.perf_counter()
+    vistos = {str(c) for c in contratos_existentes if c}
+    produtos, relatorio = [], []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        paginas = list(_paginas_pedidos_heringer(caminhos, executor))
+        print(f"{_get_timestamp()} [HERINGER] {len(paginas)} página(s) de {len(caminhos)} arquivo(s); "
+              f"{sum(1 for p in paginas if p['futuro'])} enviada(s) ao Azure.")
+        for p in paginas:
+            linha = {"arquivo": p["arquivo"], "pagina": p["pagina"], "status": "erro", "novos": 0, "duplicados": 0, "formatos": [], "do_cache": p["entrada"] is not None, "erro": p["erro"]}
+            relatorio.append(linha)
+            if p["erro"]:
+                continue
+            try:
+                entrada = p["entrada"] or p["futuro"].result()
+            except Exception as e:
+                linha["erro"] = f"{type(e).__name__}: {e}"
+                continue
+            if entrada.get("em_branco"):
+                linha["status"] = "em branco"
+                continue
+            texto = entrada["texto"]
+            for formato, extrator in (("antigo", _extrair_pedido_heringer_antigo), ("eurochem", _extrair_pedido_heringer_eurochem)):
+                encontrados = extrator(texto)
+                if encontrados:
+                    linha["formatos"].append(formato)
+                for produto in encontrados:
+                    contrato = str(produto.get("contrato") or "").strip()
+                    if contrato and contrato in vistos:
+                        linha["duplicados"] += 1
+                        continue
+                    if contrato:
+                        vistos.add(contrato)
+                    produtos.append(produto)
+                    linha["novos"] += 1
+            linha["status"] = "ok" if linha["formatos"] else "sem produtos"
+    duracao = time.perf_counter() - inicio
+    print(f"{_get_timestamp()} [HERINGER] {len(produtos)} produto(s) novo(s) em {duracao:.2f}s; "
+          f"{sum(l['duplicados'] for l in relatorio)} duplicado(s), {sum(1 for l in relatorio if l['status'] == 'erro')} página(s) com erro.")
+    return {"produtos": produtos, "paginas": relatorio, "duracao": duracao}
+
+# Motor de extração de texto dos contratos: "pdfplumber" (padrão), "pymupdf" (rápido, com
+# fallback para o pdfplumber) ou "paridade" (usa o texto do pdfplumber, mas também roda o
+# PyMuPDF e registra em debug_logs/ qualquer diferença nos campos extraídos). As funções de
+# contrato recebem `motor`; sem ele vale MOTOR_EXTRACAO_PDF. No modo sem interface: --motor.
+MOTORES_EXTRACAO_PDF = ("pdfplumber", "pymupdf", "paridade")
+MOTOR_EXTRACAO_PDF = "pdfplumber"
+CAMPOS_PARIDADE = ("cliente", "contrato", "produto", "toneladas", "embalagem")
+
+def _extrair_texto_pdfplumber(pdf_path):
+    with pdfplumber.open(pdf_path) as pdf:
+        return "\n".join((p.extract_text(x_tolerance=2, y_tolerance=3) or "") for p in pdf.pages)
+
+def _extrair_texto_pymupdf(pdf_path):
+    with fitz.open(pdf_path) as doc:
+        return "\n".join(page.get_text("text", sort=True) for page in doc)
+
+def _motor_texto_efetivo(motor=None):
+    motor = motor or MOTOR_EXTRACAO_PDF
+    return "pymupdf" if motor == "pymupdf" else "pdfplumber"
+
+def extrair_texto_contrato_pdf(pdf_path, motor=None):
+    if _motor_texto_efetivo(motor) == "pymupdf":
+        try:
+            texto = _extrair_texto_pymupdf(pdf_path)
+            if texto.strip():
+                return texto
+            print(f"{_get_timestamp()} [PDF] PyMuPDF não encontrou texto em '{os.path.basename(pdf_path)}'; usando pdfplumber.")
+        except Exception as e:
+            print(f"{_get_timestamp()} [PDF] Falha no PyMuPDF ({e}); usando pdfplumber.")
+    return _extrair_texto_pdfplumber(pdf_path)
+
+def comparar_paridade_extracao(pdf_path, cidades_por_uf, texto_referencia=None):
+    """Roda pdfplumber e PyMuPDF no mesmo contrato e compara os campos que os regexes extraem.
+    Retorna a lista de divergências (vazia quando os dois motores são equivalentes)."""
+    textos = {"pdfplumber": texto_referencia if texto_referencia is not None else _extrair_texto_pdfplumber(pdf_path)}
+    try:
+        textos["pymupdf"] = _extrair_texto_pymupdf(pdf_path)
+    except Exception as e:
+        textos["pymupdf"] = ""
+        print(f"{_get_timestamp()} [PARIDADE] Falha no PyMuPDF: {e}")
+    analises = {}
+    for motor, texto in textos.items():
+        with contextlib.redirect_stdout(io.StringIO()):
+            analises[motor] = {"produtos": extrair_produtos_do_texto(texto, ""), "cidades": encontrar_cidades_candidatas(texto, cidades_por_uf)}
+    ref, rapido = analises["pdfplumber"], analises["pymupdf"]
+    divergencias = []
+    if ref["cidades"] != rapido["cidades"]:
+        divergencias.append({"campo": "cidade", "pdfplumber": ref["cidades"], "pymupdf": rapido["cidades"]})
+    if len(ref["produtos"]) != len(rapido["produtos"]):
+        divergencias.append({"campo": "quantidade de produtos", "pdfplumber": len(ref["produtos"]), "pymupdf": len(rapido["produtos"])})
+    for i, (p_ref, p_rapido) in enumerate(zip(ref["produtos"], rapido["produtos"])):
+        for campo in CAMPOS_PARIDADE:
+            if p_ref.get(campo) != p_rapido.get(campo):
+                divergencias.append({"campo": f"produtos[{i}].{campo}", "pdfplumber": p_ref.get(campo), "pymupdf": p_rapido.get(campo)})
+    if divergencias:
+        print(f"{_get_timestamp()} [PARIDADE] {len(divergencias)} divergência(s) em '{os.path.basename(pdf_path)}'.")
+        try:
+            os.makedirs("debug_logs", exist_ok=True)
+            with open(os.path.join("debug_logs", "paridade_extracao.jsonl"), "a", encoding="utf-8") as f:
+                f.write(json.dumps({"data": _get_timestamp(), "arquivo": pdf_path, "divergencias": divergencias}, ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"Aviso: não foi possível registrar a divergência de paridade: {e}")
+    else:
+        print(f"{_get_timestamp()} [PARIDADE] '{os.path.basename(pdf_path)}': motores equivalentes.")
+    return divergencias
+
+# Cache de contratos endereçado pelo conteúdo do PDF e pelo motor de extração. Incrementar
+# VERSAO_PARSER_CONTRATOS sempre que a extração de texto ou `extrair_produtos_do_texto` mudarem.
+VERSAO_PARSER_CONTRATOS = 1
+LIMITE_CACHE_CONTRATOS_BYTES = 50 * 1024 * 1024
+CACHE_CONTRATOS = CacheDisco(_caminho_cache("contratos"), LIMITE_CACHE_CONTRATOS_BYTES)
+
+def _chave_cache_contrato(sha256, motor=None):
+    return f"{sha256}-v{VERSAO_PARSER_CONTRATOS}-{_motor_texto_efetivo(motor)}"
+
+def lembrar_cidade_contrato(sha256, cidade, uf, motor=None):
+    chave = _chave_cache_contrato(sha256, motor)
+    entrada = CACHE_CONTRATOS.obter(chave)
+    if entrada is not None:
+        entrada["cidade_escolhida"] = [cidade, uf]
+        CACHE_CONTRATOS.guardar(chave, entrada)
+
+def analisar_contrato(pdf_path, cidades_por_uf, motor=None):
+    # Texto e produtos vêm do cache quando o mesmo PDF já foi lido; as candidatas são sempre
+    # recalculadas (custo desprezível) para refletir a tabela de cidades atual.
+    motor = motor or MOTOR_EXTRACAO_PDF
+    if motor not in MOTORES_EXTRACAO_PDF:
+        raise ValueError(f"Motor de extração desconhecido: '{motor}' (use {', '.join(MOTORES_EXTRACAO_PDF)}).")
+    sha256 = _hash_arquivo(pdf_path)
+    chave = _chave_cache_contrato(sha256, motor)
+    # No modo de paridade o cache é ignorado na leitura para que a comparação rode sempre, mas a
+    # chave é a mesma do motor normal: a cidade já confirmada pelo operador é mantida.
+    anterior = CACHE_CONTRATOS.obter(chave)
+    entrada = anterior if motor != "paridade" else None
+    do_cache = entrada is not None
+    if not do_cache:
+        text = extrair_texto_contrato_pdf(pdf_path, motor)
+        if motor == "paridade":
+            comparar_paridade_extracao(pdf_path, cidades_por_uf, text)
+        cidade_escolhida = anterior.get("cidade_escolhida") if anterior else None
+        entrada = {"texto": text, "produtos": extrair_produtos_do_texto(text, ""), "cidade_escolhida": cidade_escolhida}
+        CACHE_CONTRATOS.guardar(chave, entrada)
+    candidatas = encontrar_cidades_candidatas(entrada["texto"], cidades_por_uf)
+    escolhida = tuple(entrada["cidade_escolhida"]) if entrada.get("cidade_escolhida") else None
+    if len(candidatas) == 1:
+        cidade = formatar_cidade_uf(*candidatas[0])
+    elif escolhida in candidatas:
+        cidade = formatar_cidade_uf(*escolhida)
+    else:
+        cidade = ""
+    produtos = [dict(p, cidade=cidade) for p in entrada["produtos"]]
+    if not cidade and len(candidatas) > 1:
+        # Cidade pendente: o produto leva as candidatas e a escolha é feita depois, sem travar o lote.
+        for p in produtos:
+            p["cidades_candidatas"] = candidatas
+    return {"sha256": sha256, "produtos": produtos, "candidatas": candidatas, "cidade": cidade, "do_cache": do_cache, "motor": motor}
+
+def resolver_cidade_pendente(produtos, sha256, cidade, uf, motor=None):
+    for p in produtos:
+        p["cidade"] = formatar_cidade_uf(cidade, uf)
+        p.pop("cidades_candidatas", None)
+    if sha256:
+        lembrar_cidade_contrato(sha256, cidade, uf, motor)
+
+def parse_pdf_fields(pdf_path, lista_cidades, root_window, motor=None):
+    # Sem janela (root_window=None) a escolha da cidade não bloqueia: os produtos voltam com
+    # "cidades_candidatas" e cidade vazia para serem resolvidos depois.
     if not os.path.exists("debug_logs"):
         os.makedirs("debug_logs")
-    with pdfplumber.open(pdf_path) as pdf:
-        raw_text = "\n".join((p.extract_text(x_tolerance=2, y_tolerance=3) or "") for p in pdf.pages)
-        text = raw_text
-    cidade = wrapper_extracao_cidade(text, lista_cidades, root_window)
-    search_block = text.upper().split("PRODUTOS:")[0]
-    m_cliente = re.search(r"CLIENTE:\s*(.+)", text, re.MULTILINE)
-    cliente = m_cliente.group(1).strip() if m_cliente else None
-    m_pedido = re.search(r"Nr\. Pedido\s+(\d+)", text, re.IGNORECASE)
-    if not m_pedido: m_pedido = re.search(r"N°\s+(\d+)", text, re.IGNORECASE)
-    if not m_pedido: m_pedido = re.search(r"PIX\s+(\d+)", text, re.IGNORECASE)
-    pedido = m_pedido.group(1).strip() if m_pedido else None
+    analise = analisar_contrato(pdf_path, lista_cidades, motor)
+    if root_window is not None and not analise["cidade"] and len(analise["candidatas"]) > 1:
+        cidade_final, uf_final = ask_user_to_choose_nova_logica(analise["candidatas"], root_window)
+        resolver_cidade_pendente(analise["produtos"], analise["sha256"], cidade_final, uf_final, analise["motor"])
+    return analise["produtos"]
+
+REGRAS_CONTRATO = ConjuntoRegras("Contrato", {
+    "cliente": [Regra("rotulo_cliente", r"CLIENTE:\s*(.+)", flags=re.MULTILINE)],
+    "pedido": [
+        Regra("nr_pedido", r"Nr\. Pedido\s+(\d+)", flags=re.IGNORECASE),
+        Regra("numero", r"N°\s+(\d+)", flags=re.IGNORECASE),
+        Regra("pix", r"PIX\s+(\d+)", flags=re.IGNORECASE),
+    ],
+})
+_PADRAO_LINHA_PRODUTO = re.compile(r"^\d{3,}\s*:?")
+_PADRAO_NOME_PRODUTO = re.compile(r"^\d{3,}\s*:\s*(.+)", re.MULTILINE)
+_PADRAO_NOME_PRODUTO_NA_LINHA = re.compile(r":\s*(.+?)\s+(SACO|BIG BAG|GRANEL)", re.IGNORECASE)
+_PADRAO_TEM_DECIMAL = re.compile(r"\d+,\d{1,4}")
+_PADRAO_QUANTIDADE = re.compile(r"\d{1,3}(?:\.\d{3})*,\d{1,4}|\d+,\d{1,4}")
+
+def _embalagem_da_linha(line_up):
+    if "BIG BAG" in line_up: return "BIG BAG"
+    if "GRANEL" in line_up: return "GRANEL"
+    if "SACO" in line_up: return "SACARIA"
+    return "DESCONHECIDA"
+
+def _quantidade_da_linha(line):
+    match_qtd = _PADRAO_QUANTIDADE.search(line)
+    return float(match_qtd.group().replace(".", "").replace(",", ".")) if match_qtd else 0
+
+def extrair_produtos_do_texto(text, cidade):
+    doc = TextoDocumento(text)
+    campos, diagnostico = REGRAS_CONTRATO.aplicar(doc)
+    print(_resumo_diagnostico(REGRAS_CONTRATO.nome, diagnostico))
+    cliente, pedido = campos["cliente"], campos["pedido"]
+    linhas = doc.visao("linhas")
     produtos = []
-    old_format_lines = [line for line in text.splitlines() if re.match(r"^\d{3,}\s*:?", line.strip()) and re.search(r"\d+,\d{1,4}", line)]
+    old_format_lines = [line for line in linhas if _PADRAO_LINHA_PRODUTO.match(line.strip()) and _PADRAO_TEM_DECIMAL.search(line)]
     if old_format_lines:
         for line in old_format_lines:
-            m_prod = re.search(r":\s*(.+?)\s+(SACO|BIG BAG|GRANEL)", line, re.IGNORECASE)
+            m_prod = _PADRAO_NOME_PRODUTO_NA_LINHA.search(line)
             produto_nome = m_prod.group(1).strip() if m_prod else line.strip()
-            raw_qtd = re.search(r"\d{1,3}(?:\.\d{3})*,\d{1,4}|\d+,\d{1,4}", line).group()
-            qtd = float(raw_qtd.replace(".", "").replace(",", "."))
-            line_up = line.upper()
-            if "BIG BAG" in line_up: embalagem = "BIG BAG"
-            elif "GRANEL" in line_up: embalagem = "GRANEL"
-            elif "SACO" in line_up: embalagem = "SACARIA"
-            else: embalagem = "DESCONHECIDA"
-            produtos.append({"cliente": cliente, "contrato": pedido, "produto": produto_nome, "toneladas": qtd, "embalagem": embalagem, "cidade": cidade})
+            qtd = _quantidade_da_linha(line)
+            produtos.append({"cliente": cliente, "contrato": pedido, "produto": produto_nome, "toneladas": qtd, "embalagem": _embalagem_da_linha(line.upper()), "cidade": cidade})
     else:
-        product_names = [m.group(1).strip() for m in re.finditer(r"^\d{3,}\s*:\s*(.+)", text, re.MULTILINE)]
-        detail_lines_text = [line for line in text.splitlines() if ("SACO" in line.upper() or "BIG BAG" in line.upper() or "GRANEL" in line.upper()) and re.search(r"\d+,\d{1,4}", line)]
+        product_names = [m.group(1).strip() for m in _PADRAO_NOME_PRODUTO.finditer(text)]
         details = []
-        for line in detail_lines_text:
-            match_qtd = re.search(r"\d{1,3}(?:\.\d{3})*,\d{1,4}|\d+,\d{1,4}", line)
-            if match_qtd:
-                qtd_str = match_qtd.group()
-                qtd = float(qtd_str.replace(".", "").replace(",", "."))
-            else:
-                qtd = 0
+        for line in linhas:
             line_up = line.upper()
-            embalagem = "DESCONHECIDA"
-            if "BIG BAG" in line_up: embalagem = "BIG BAG"
-            elif "GRANEL" in line_up: embalagem = "GRANEL"
-            elif "SACO" in line_up: embalagem = "SACARIA"
-            details.append({"toneladas": qtd, "embalagem": embalagem})
+            if ("SACO" in line_up or "BIG BAG" in line_up or "GRANEL" in line_up) and _PADRAO_TEM_DECIMAL.search(line):
+                details.append({"toneladas": _quantidade_da_linha(line), "embalagem": _embalagem_da_linha(line_up)})
         num_products = min(len(product_names), len(details))
         for i in range(num_products):
             produtos.append({"cliente": cliente, "contrato": pedido, "produto": product_names[i], "toneladas": details[i]["toneladas"], "embalagem": details[i]["embalagem"], "cidade": cidade})
@@ -802,40 +2576,187 @@ def normalizar_texto_sem_acento(texto):
     texto_sem_acento = u"".join([c for c in nfkd_form if not unicodedata.combining(c)])
     return texto_sem_acento.upper().strip()
 
-def carregar_cidades_nova_logica(caminho_excel):
+# Cache da tabela de cidades do IBGE. O pickle guarda também os nomes já normalizados e é
+# revalidado pelo mtime/tamanho da planilha; se eles mudarem, o SHA-256 decide se precisa reconstruir.
+VERSAO_CACHE_CIDADES = 1
+_CIDADES_CARREGADAS = {}
+_NOMES_NORMALIZADOS = {}
+
+def _ler_planilha_cidades(caminho_excel):
     cidades_por_uf = {}
+    df = pd.read_excel(caminho_excel, header=None)
+    for index, row in enumerate(df.itertuples(index=False)):
+        try:
+            cidade = str(row[0]).strip()
+            uf = str(row[1]).strip().upper()
+            ibge_code = str(row[2]).strip()
+            if cidade and uf and ibge_code:
+                if uf not in cidades_por_uf:
+                    cidades_por_uf[uf] = []
+                cidades_por_uf[uf].append((cidade, ibge_code))
+        except (IndexError, KeyError):
+            print(f"Aviso: Linha {index+1} da planilha de cidades está incompleta e foi ignorada.")
+            continue
+    for uf in cidades_por_uf:
+        cidades_por_uf[uf].sort()
+    return cidades_por_uf
+
+def _carregar_cidades_com_cache(caminho_excel):
+    stat = os.stat(caminho_excel)
+    caminho_cache = _caminho_cache("cidades_ibge.pickle")
+    cache = None
     try:
-        df = pd.read_excel(caminho_excel, header=None)
-        for index, row in df.iterrows():
-            try:
-                cidade = str(row[0]).strip()
-                uf = str(row[1]).strip().upper()
-                ibge_code = str(row[2]).strip()
-                if cidade and uf and ibge_code:
-                    if uf not in cidades_por_uf:
-                        cidades_por_uf[uf] = []
-                    cidades_por_uf[uf].append((cidade, ibge_code))
-            except (IndexError, KeyError):
-                print(f"Aviso: Linha {index+1} da planilha de cidades está incompleta e foi ignorada.")
-                continue
-        for uf in cidades_por_uf:
-            cidades_por_uf[uf].sort()
+        with open(caminho_cache, "rb") as f:
+            cache = pickle.load(f)
+        if cache.get("versao") != VERSAO_CACHE_CIDADES:
+            cache = None
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+        cache = None
+    if cache and cache["mtime_ns"] == stat.st_mtime_ns and cache["tamanho"] == stat.st_size:
+        return cache
+    sha = _hash_arquivo(caminho_excel)
+    if cache and cache["sha256"] == sha:
+        print(f"{_get_timestamp()} [CIDADES] Planilha com novo mtime mas mesmo conteúdo; reaproveitando o cache.")
+    else:
+        print(f"{_get_timestamp()} [CIDADES] Cache ausente ou desatualizado; lendo '{os.path.basename(caminho_excel)}'...")
+        cidades_por_uf = _ler_planilha_cidades(caminho_excel)
+        normalizadas = {c: normalizar_texto_sem_acento(c) for tuplas in cidades_por_uf.values() for c, _ in tuplas}
+        cache = {"versao": VERSAO_CACHE_CIDADES, "sha256": sha, "cidades_por_uf": cidades_por_uf, "normalizadas": normalizadas}
+    cache["mtime_ns"], cache["tamanho"] = stat.st_mtime_ns, stat.st_size
+    try:
+        _gravar_pickle_atomico(caminho_cache, cache)
+    except OSError as e:
+        print(f"Aviso: não foi possível gravar o cache de cidades ({e}).")
+    return cache
+
+def carregar_cidades_nova_logica(caminho_excel):
+    # Carregada uma única vez por processo: main() e PDFInserterApp recebem a mesma instância.
+    chave = os.path.abspath(caminho_excel)
+    if chave in _CIDADES_CARREGADAS:
+        return _CIDADES_CARREGADAS[chave]
+    try:
+        inicio = time.perf_counter()
+        cache = _carregar_cidades_com_cache(caminho_excel)
+        cidades_por_uf = cache["cidades_por_uf"]
+        _NOMES_NORMALIZADOS.update(cache["normalizadas"])
+        _CIDADES_CARREGADAS[chave] = cidades_por_uf
+        print(f"{_get_timestamp()} [CIDADES] Tabela de cidades carregada em {(time.perf_counter() - inicio) * 1000:.0f} ms.")
         return cidades_por_uf
     except FileNotFoundError:
-        messagebox.showerror("Erro Crítico", f"A planilha de cidades não foi encontrada: {caminho_excel}")
+        _notificar("error", "Erro Crítico", f"A planilha de cidades não foi encontrada: {caminho_excel}")
         return {}
     except Exception as e:
-        messagebox.showerror("Erro Crítico", f"Ocorreu um erro ao ler a planilha de cidades: {e}")
+        _notificar("error", "Erro Crítico", f"Ocorreu um erro ao ler a planilha de cidades: {e}")
         return {}
 
+def _eh_caractere_palavra(c):
+    return c.isalnum() or c == '_'
+
+def _fronteira_palavra(texto, pos):
+    # Equivalente ao \b do módulo re para strings.
+    antes = pos > 0 and _eh_caractere_palavra(texto[pos - 1])
+    depois = pos < len(texto) and _eh_caractere_palavra(texto[pos])
+    return antes != depois
+
+class IndiceCidades:
+    """Trie de caracteres com os nomes normalizados das cidades, montada uma única vez a partir
+    de `cidades_por_uf`. Reproduz os Planos A, B e C de `encontrar_cidades_candidatas` sem
+    compilar um regex por cidade."""
+
+    _FIM = object()
+
+    def __init__(self, cidades_por_uf):
+        lista_plana_cidades = []
+        for uf, cidades_tuplas in cidades_por_uf.items():
+            for cidade_tupla in cidades_tuplas:
+                cidade_original = cidade_tupla[0]
+                cidade_normalizada = _NOMES_NORMALIZADOS.get(cidade_original) or normalizar_texto_sem_acento(cidade_original)
+                lista_plana_cidades.append((cidade_normalizada, uf, cidade_original))
+        # A ordem (comprimento decrescente, estável) desempata candidatas na mesma posição,
+        # exatamente como a varredura original da lista ordenada.
+        lista_plana_cidades.sort(key=lambda x: len(x[0]), reverse=True)
+        self.raiz = {}
+        for ordem, (cidade_norm, uf, cidade_orig) in enumerate(lista_plana_cidades):
+            if not cidade_norm:
+                continue
+            no = self.raiz
+            for c in cidade_norm:
+                no = no.setdefault(c, {})
+            no.setdefault(self._FIM, []).append((ordem, cidade_norm, uf, cidade_orig))
+        self.total = len(lista_plana_cidades)
+
+    def _ocorrencias(self, texto, inicio):
+        # Percorre a trie a partir de `inicio` e devolve (fim, entradas) de cada nome completo.
+        no = self.raiz
+        pos = inicio
+        tamanho = len(texto)
+        while pos < tamanho:
+            no = no.get(texto[pos])
+            if no is None:
+                return
+            pos += 1
+            entradas = no.get(self._FIM)
+            if entradas:
+                yield pos, entradas
+
+    def localizar(self, texto_normalizado):
+        """Varredura única do texto. Retorna (plano_a, plano_c) com a primeira posição de cada
+        cidade: Plano A = 'CIDADE<sep>UF', Plano C = 'CIDADE <nome>'."""
+        plano_a, plano_c = {}, {}
+        tamanho = len(texto_normalizado)
+        for m_palavra in _PADRAO_INICIO_PALAVRA.finditer(texto_normalizado):
+            inicio = m_palavra.start()
+            for fim, entradas in self._ocorrencias(texto_normalizado, inicio):
+                sep = fim
+                while sep < tamanho and (texto_normalizado[sep].isspace() or texto_normalizado[sep] in "/-"):
+                    sep += 1
+                if sep == fim:
+                    continue
+                for ordem, cidade_norm, uf, cidade_orig in entradas:
+                    if ordem in plano_a:
+                        continue
+                    if texto_normalizado.startswith(uf, sep) and _fronteira_palavra(texto_normalizado, sep + len(uf)):
+                        plano_a[ordem] = (inicio, cidade_orig, uf)
+        for m in _PADRAO_ROTULO_CIDADE.finditer(texto_normalizado):
+            for fim, entradas in self._ocorrencias(texto_normalizado, m.end()):
+                if not _fronteira_palavra(texto_normalizado, fim):
+                    continue
+                for ordem, cidade_norm, uf, cidade_orig in entradas:
+                    if ordem not in plano_c:
+                        plano_c[ordem] = (m.start(), cidade_orig, uf)
+        return plano_a, plano_c
+
+    def primeira_contida(self, nome_reconstruido):
+        # Plano B: primeira cidade (na ordem da lista) contida no nome cuja UF também aparece nele.
+        melhor = None
+        for inicio in range(len(nome_reconstruido)):
+            for fim, entradas in self._ocorrencias(nome_reconstruido, inicio):
+                for ordem, cidade_norm, uf, cidade_orig in entradas:
+                    if (melhor is None or ordem < melhor[0]) and uf in nome_reconstruido:
+                        melhor = (ordem, cidade_orig, uf)
+        return melhor
+
+_PADRAO_ROTULO_CIDADE = re.compile(r'CIDADE\s+')
+_PADRAO_INICIO_PALAVRA = re.compile(r'\b\w')
+_INDICE_CIDADES_CACHE = (None, None)
+
+def obter_indice_cidades(cidades_por_uf):
+    global _INDICE_CIDADES_CACHE
+    origem, indice = _INDICE_CIDADES_CACHE
+    if origem is not cidades_por_uf:
+        inicio = time.perf_counter()
+        indice = IndiceCidades(cidades_por_uf)
+        _INDICE_CIDADES_CACHE = (cidades_por_uf, indice)
+        print(f"{_get_timestamp()} [CIDADES] Índice de {indice.total} cidades montado em {(time.perf_counter() - inicio) * 1000:.0f} ms.")
+    return indice
+
+def _ordenar_e_filtrar_jacuipe(encontradas):
+    ordenadas = sorted(encontradas.items(), key=lambda item: (item[1][0], item[0]))
+    return [(c, u) for ordem, (p, c, u) in ordenadas if "JACUIPE" not in normalizar_texto_sem_acento(c)]
+
 def encontrar_cidades_candidatas(texto_pdf, cidades_por_uf):
     print("\n\n--- INICIANDO DEBUG DE BUSCA DE CIDADE (LÓGICA AVANÇADA) ---")
-    lista_plana_cidades = []
-    for uf, cidades_tuplas in cidades_por_uf.items():
-        for cidade_tupla in cidades_tuplas:
-            cidade_original = cidade_tupla[0]
-            cidade_normalizada = normalizar_texto_sem_acento(cidade_original)
-            lista_plana_cidades.append((cidade_normalizada, uf, cidade_original))
+    indice = obter_indice_cidades(cidades_por_uf)
     texto_a_procurar = texto_pdf
     idx_cliente = texto_a_procurar.upper().find("CLIENTE:")
     if idx_cliente != -1:
@@ -843,56 +2764,39 @@ def encontrar_cidades_candidatas(texto_pdf, cidades_por_uf):
     texto_a_procurar = texto_a_procurar.replace('\n', ' ')
     texto_normalizado = normalizar_texto_sem_acento(texto_a_procurar)
     print(f"\n[DEBUG] O TEXTO A SER PESQUISADO É:\n{texto_normalizado}\n{'-'*50}")
-    cidades_encontradas = []
-    lista_cidades_ordenada = sorted(lista_plana_cidades, key=lambda x: len(x[0]), reverse=True)
+    encontradas_a, encontradas_c = indice.localizar(texto_normalizado)
     print("[DEBUG] Executando Plano A...")
-    for cidade_norm, uf, cidade_orig in lista_cidades_ordenada:
-        padrao_flexivel = r'\b' + re.escape(cidade_norm) + r'[\s/-]+' + re.escape(uf) + r'\b'
-        match = re.search(padrao_flexivel, texto_normalizado)
-        if match:
-            posicao = match.start()
-            print(f"[DEBUG] SUCESSO (Plano A)! Padrão '{padrao_flexivel}' encontrado.")
-            cidades_encontradas.append((posicao, (cidade_orig, uf)))
-    cidades_ordenadas_a = sorted(cidades_encontradas, key=lambda x: x[0])
-    cidades_filtradas_a = [(c, u) for p, (c, u) in cidades_ordenadas_a if "CONCEICAO DO JACUIPE" not in normalizar_texto_sem_acento(c) and "JACUIPE" not in normalizar_texto_sem_acento(c)]
+    cidades_filtradas_a = _ordenar_e_filtrar_jacuipe(encontradas_a)
     if cidades_filtradas_a:
         print(f"[DEBUG] Resultado do Plano A: {cidades_filtradas_a}")
         print("--- FIM DO DEBUG DE BUSCA DE CIDADE ---\n\n")
         return cidades_filtradas_a
     print("DEBUG - Plano A falhou. Ativando Plano B...")
-    bloco_separador = "CONCEICAO DO JACUIPE - BA. E-MAIL COMERCIAL@FERTIMAXI.COM.BR,"
-    padrao_quebrado = fr"CIDADE\s+(.*?)\s*{re.escape(bloco_separador)}\s*(.*?)(?:,|$|\sTELEFONES)"
-    match = re.search(padrao_quebrado, texto_normalizado)
+    match = _PADRAO_PLANO_B.search(texto_normalizado)
     if match:
         inicio_cidade = match.group(1).strip()
         fim_cidade_uf = match.group(2).strip()
         nome_reconstruido = f"{inicio_cidade} {fim_cidade_uf}".strip()
         print(f"DEBUG - Plano B encontrou padrão quebrado. Nome reconstruído: '{nome_reconstruido}'")
-        for cidade_norm, uf, cidade_orig in lista_cidades_ordenada:
-            if cidade_norm in nome_reconstruido and uf in nome_reconstruido:
-                print(f"[DEBUG] SUCESSO (Plano B)! Cidade encontrada: {cidade_orig}, {uf}")
-                print("--- FIM DO DEBUG DE BUSCA DE CIDADE ---\n\n")
-                return [(cidade_orig, uf)]
-    print("DEBUG - Plano B falhou. Ativando Plano C...")
-    cidades_encontradas_c = []
-    for cidade_norm, uf, cidade_orig in lista_cidades_ordenada:
-        padrao_contexto = r'CIDADE\s+' + re.escape(cidade_norm) + r'\b'
-        match = re.search(padrao_contexto, texto_normalizado)
-        if match:
-            posicao = match.start()
-            print(f"[DEBUG] SUCESSO (Plano C)! Padrão '{padrao_contexto}' encontrado.")
-            cidades_encontradas_c.append((posicao, (cidade_orig, uf)))
-    if cidades_encontradas_c:
-        cidades_ordenadas_c = sorted(cidades_encontradas_c, key=lambda x: x[0])
-        cidades_filtradas_c = [(c, u) for p, (c, u) in cidades_ordenadas_c if "CONCEICAO DO JACUIPE" not in normalizar_texto_sem_acento(c) and "JACUIPE" not in normalizar_texto_sem_acento(c)]
-        if cidades_filtradas_c:
-            print(f"[DEBUG] Resultado do Plano C: {cidades_filtradas_c}")
+        encontrada_b = indice.primeira_contida(nome_reconstruido)
+        if encontrada_b:
+            ordem, cidade_orig, uf = encontrada_b
+            print(f"[DEBUG] SUCESSO (Plano B)! Cidade encontrada: {cidade_orig}, {uf}")
             print("--- FIM DO DEBUG DE BUSCA DE CIDADE ---\n\n")
-            return cidades_filtradas_c
+            return [(cidade_orig, uf)]
+    print("DEBUG - Plano B falhou. Ativando Plano C...")
+    cidades_filtradas_c = _ordenar_e_filtrar_jacuipe(encontradas_c)
+    if cidades_filtradas_c:
+        print(f"[DEBUG] Resultado do Plano C: {cidades_filtradas_c}")
+        print("--- FIM DO DEBUG DE BUSCA DE CIDADE ---\n\n")
+        return cidades_filtradas_c
     print("DEBUG - Nenhum dos planos encontrou uma cidade de cliente válida.")
     print("--- FIM DO DEBUG DE BUSCA DE CIDADE ---\n\n")
     return []
 
+_BLOCO_SEPARADOR_PLANO_B = "CONCEICAO DO JACUIPE - BA. E-MAIL COMERCIAL@FERTIMAXI.COM.BR,"
+_PADRAO_PLANO_B = re.compile(fr"CIDADE\s+(.*?)\s*{re.escape(_BLOCO_SEPARADOR_PLANO_B)}\s*(.*?)(?:,|$|\sTELEFONES)")
+
 def ask_user_to_choose_nova_logica(options, parent):
     dialog = Toplevel(parent)
     dialog.title("Escolha a Cidade Correta")
@@ -919,9 +2823,12 @@ def wrapper_extracao_cidade(texto_pdf, lista_cidades, root_window):
         cidade_final, uf_final = candidatas[0]
     elif len(candidatas) > 1:
         cidade_final, uf_final = ask_user_to_choose_nova_logica(candidatas, root_window)
-    if cidade_final and uf_final:
-        cidade_bonita = ' '.join(word.capitalize() for word in cidade_final.split())
-        return f"{cidade_bonita}-{uf_final}"
+    return formatar_cidade_uf(cidade_final, uf_final)
+
+def formatar_cidade_uf(cidade, uf):
+    if cidade and uf:
+        cidade_bonita = ' '.join(word.capitalize() for word in cidade.split())
+        return f"{cidade_bonita}-{uf}"
     return ""
 
 def _clean(s): return re.sub(r"\s+", " ", str(s)).strip() if s is not None else ""
@@ -955,7 +2862,7 @@ def formatar_moeda_brasileira(valor_str: str) -> str:
 
 def _enviar_email(destinatarios, assunto, corpo, anexos=[]):
     try:
-        messagebox.showinfo("Enviando...", "Preparando para enviar o e-mail. Por favor, aguarde.")
+        _notificar("info", "Enviando...", "Preparando para enviar o e-mail. Por favor, aguarde.")
         msg = MIMEMultipart()
         msg['From'] = EMAIL_REMETENTE
         msg['To'] = ", ".join(destinatarios)
@@ -980,80 +2887,517 @@ def _enviar_email(destinatarios, assunto, corpo, anexos=[]):
         server.login(EMAIL_REMETENTE, SENHA_APP_EMAIL)
         server.sendmail(EMAIL_REMETENTE, destinatarios, msg.as_string())
         server.quit()
-        messagebox.showinfo("Sucesso!", f"E-mail enviado com sucesso para {destinatarios}!")
+        _notificar("info", "Sucesso!", f"E-mail enviado com sucesso para {destinatarios}!")
         return True
     except smtplib.SMTPAuthenticationError:
-        messagebox.showerror("Erro de Autenticação", "Não foi possível fazer login. Verifique se o e-mail e a 'Senha de App' estão corretos.")
+        _notificar("error", "Erro de Autenticação", "Não foi possível fazer login. Verifique se o e-mail e a 'Senha de App' estão corretos.")
         return False
     except Exception as e:
-        messagebox.showerror("Erro de Envio", f"Ocorreu um erro inesperado ao enviar o e-mail:\n\n{e}")
+        _notificar("error", "Erro de Envio", f"Ocorreu um erro inesperado ao enviar o e-mail:\n\n{e}")
         return False
 
+def _mapa_motorista(cpf, nome, cnh, fone, placa1, placa2, placa3):
+    return {"motorista": f"{cpf} – {nome}".strip(" – "), "cnh": cnh, "fone": fone, "1": placa1, "2": placa2, "3": placa3}
+
+def _chaves_rotulos(texto):
+    # Uma entrada por ocorrência de LABEL_PATTERN; None quando o rótulo não é reconhecido.
+    return [_label_key_from_text(m.group(0)) for m in LABEL_PATTERN.finditer(texto)]
+
+def _preencher_paragrafo_rotulos(para, chaves, mapping):
+    updated_parts = []
+    for key in chaves:
+        if key:
+            val = mapping.get(key, ""); label = STANDARDIZED_LABELS.get(key)
+            updated_parts.append(f"{label}: {val}" if val else f"{label}:")
+    src_run = para.runs[0] if para.runs else None
+    for run in para.runs: run.text = ""
+    new_run = para.add_run("\t\t".join(updated_parts))
+    if src_run: copy_run_style(src_run, new_run)
+
 def fill_motorista_and_placas(doc, cpf, nome, cnh, fone, placa1, placa2, placa3):
-    mapping = {"motorista": f"{cpf} – {nome}".strip(" – "), "cnh": cnh, "fone": fone, "1": placa1, "2": placa2, "3": placa3}
+    mapping = _mapa_motorista(cpf, nome, cnh, fone, placa1, placa2, placa3)
     for para in doc.paragraphs:
-        matches = list(LABEL_PATTERN.finditer(para.text))
-        if matches:
-            updated_parts = []
-            for m in matches:
-                key = _label_key_from_text(m.group(0))
-                if key:
-                    val = mapping.get(key, ""); label = STANDARDIZED_LABELS.get(key)
-                    updated_parts.append(f"{label}: {val}" if val else f"{label}:")
-            src_run = para.runs[0] if para.runs else None
-            for run in para.runs: run.text = ""
-            new_run = para.add_run("\t\t".join(updated_parts))
-            if src_run: copy_run_style(src_run, new_run)
+        chaves = _chaves_rotulos(para.text)
+        if chaves:
+            _preencher_paragrafo_rotulos(para, chaves, mapping)
+
+# ==============================================================================
+# Modelos de O.C. Pré-compilados
+# ==============================================================================
+# Cada modelo é lido uma vez e as âncoras (tabela de produtos, parágrafos com rótulos e o
+# parágrafo da data) ficam anotadas por posição. Cada O.C. nasce de uma cópia profunda do
+# documento já carregado, que sai mais barata que reabrir o .docx, e é preenchida direto
+# nas âncoras. Se o arquivo do modelo mudar no disco, ele é recompilado.
+_PADRAO_DATA_OC = re.compile(r"\d{1,2}/\d{1,2}/\d{2,4}", re.I)
+
+class ModeloOC:
+    def __init__(self, caminho):
+        inicio = time.perf_counter()
+        self.caminho = caminho
+        self.assinatura = ModeloOC.assinatura_arquivo(caminho)
+        with open(caminho, "rb") as f:
+            dados = f.read()
+        # Dois documentos: um para localizar as âncoras e outro intocado, que é o que se copia.
+        # O python-docx guarda o corpo em cache no primeiro acesso a `paragraphs`/`tables`, e a
+        # cópia profunda desse cache fica desligada da árvore copiada (o texto iria para o lugar errado).
+        self._documento_base = Document(io.BytesIO(dados))
+        self._lock = threading.Lock()
+        analise = Document(io.BytesIO(dados))
+        tabela = _find_prod_table(analise)
+        self.indice_tabela = next(i for i, t in enumerate(analise.tables) if t._tbl is tabela._tbl) if tabela else None
+        self.rotulos = []
+        self.indice_data = None
+        for i, para in enumerate(analise.paragraphs):
+            texto = para.text
+            chaves = _chaves_rotulos(texto)
+            if chaves:
+                self.rotulos.append((i, chaves))
+            elif self.indice_data is None and _PADRAO_DATA_OC.search(texto):
+                self.indice_data = i
+        self.layout = self._extrair_layout(analise)
+        print(f"{_get_timestamp()} [MODELO O.C.] '{os.path.basename(caminho)}' compilado em {(time.perf_counter() - inicio) * 1000:.0f} ms "
+              f"(tabela={self.indice_tabela}, rótulos={len(self.rotulos)}, data={self.indice_data}).")
+
+    def _extrair_layout(self, analise):
+        """Blocos do corpo do modelo na ordem do documento, para o PDF nativo: ("texto", texto, negrito),
+        ("rotulos", chaves), ("data", texto), ("produtos", cabeçalho, larguras) e ("tabela", linhas)."""
+        rotulos = dict(self.rotulos)
+        blocos, i_par, i_tab = [], 0, 0
+        for filho in analise.element.body.iterchildren():
+            if filho.tag == qn('w:p'):
+                i, i_par = i_par, i_par + 1
+                para = ParagrafoDocx(filho, analise._body)
+                texto = para.text.strip()
+                if i in rotulos:
+                    blocos.append(("rotulos", rotulos[i]))
+                elif i == self.indice_data:
+                    blocos.append(("data", texto))
+                elif texto:
+                    blocos.append(("texto", texto, any(r.bold for r in para.runs if r.text.strip())))
+            elif filho.tag == qn('w:tbl'):
+                i, i_tab = i_tab, i_tab + 1
+                tabela = analise.tables[i]
+                if i == self.indice_tabela:
+                    cabecalho = [c.text.strip() for c in tabela.rows[0].cells]
+                    larguras = [int(g.w or 0) for g in tabela._tbl.tblGrid.gridCol_lst]
+                    blocos.append(("produtos", cabecalho, larguras if len(larguras) == len(cabecalho) and all(larguras) else None))
+                else:
+                    blocos.append(("tabela", [[c.text.strip() for c in row.cells] for row in tabela.rows]))
+        return blocos
+
+    @staticmethod
+    def assinatura_arquivo(caminho):
+        st = os.stat(caminho)
+        return (st.st_mtime_ns, st.st_size)
+
+    def preencher(self, produtos, mapping, data_carregamento):
+        with self._lock:
+            doc = copy.deepcopy(self._documento_base)
+        _preencher_tabela_produtos(doc.tables[self.indice_tabela] if self.indice_tabela is not None else None, produtos)
+        paragrafos = doc.paragraphs
+        for i, chaves in self.rotulos:
+            _preencher_paragrafo_rotulos(paragrafos[i], chaves, mapping)
+        # A data vai no primeiro parágrafo com uma data, como antes. Um parágrafo de rótulo anterior
+        # à âncora só concorre se o valor preenchido nele tiver o formato de data.
+        alvo = None
+        for i, _ in self.rotulos:
+            if self.indice_data is not None and i > self.indice_data:
+                break
+            if _PADRAO_DATA_OC.search(paragrafos[i].text):
+                alvo = paragrafos[i]
+                break
+        if alvo is None and self.indice_data is not None:
+            alvo = paragrafos[self.indice_data]
+        if alvo is not None:
+            alvo.text = _PADRAO_DATA_OC.sub(data_carregamento, alvo.text, 1)
+        return doc
+
+_MODELOS_OC = {}
+_LOCK_MODELOS_OC = threading.Lock()
+
+def obter_modelo_oc(caminho):
+    chave = os.path.abspath(caminho)
+    with _LOCK_MODELOS_OC:
+        modelo = _MODELOS_OC.get(chave)
+        if modelo is None or modelo.assinatura != ModeloOC.assinatura_arquivo(chave):
+            modelo = _MODELOS_OC[chave] = ModeloOC(chave)
+        return modelo
 
 def gerar_oc_docx(modelo_path, save_path, produtos, cpf, nome, cnh, fone, placa1, placa2, placa3, data_carregamento):
     if not os.path.exists(modelo_path): raise FileNotFoundError(f"Modelo DOCX não encontrado: {modelo_path}")
-    doc = Document(modelo_path)
-    fill_products_in_existing_table(doc, produtos)
-    fill_motorista_and_placas(doc, cpf, nome, cnh, fone, placa1, placa2, placa3)
-    for p in doc.paragraphs:
-        if re.search(r"\d{1,2}/\d{1,2}/\d{2,4}", p.text, re.I):
-            p.text = re.sub(r"\d{1,2}/\d{1,2}/\d{2,4}", data_carregamento, p.text, 1); break
-    doc.save(save_path)
+    mapping = _mapa_motorista(cpf, nome, cnh, fone, placa1, placa2, placa3)
+    entradas = {"produtos": produtos, "mapping": mapping, "data_carregamento": data_carregamento}
+    return CACHE_SAIDAS.produzir("oc_docx", [modelo_path], entradas, save_path,
+                                 lambda destino: obter_modelo_oc(modelo_path).preencher(produtos, mapping, data_carregamento).save(destino))
 
-def fill_carta_frete_docx(doc, dados):
-    valor_frete_str = str(dados.get("VALOR_FRETE", ""))
-    if valor_frete_str:
-        valor_formatado = formatar_moeda_brasileira(valor_frete_str)
-        encontrado = False
-        for table in doc.tables:
-            for row in table.rows:
-                for cell in row.cells:
-                    for p in cell.paragraphs:
-                        if "R$" in p.text and valor_formatado not in p.text:
-                            run = p.add_run(" " + valor_formatado)
-                            font = run.font
-                            font.name = 'Calibri (Corpo)'
-                            font.size = Pt(14)
-                            font.bold = True
-                            encontrado = True
-                            break
-                    if encontrado: break
-                if encontrado: break
-            if encontrado: break
-    mapa_campos_normais = {"DATA": "DATA:", "CONDUTOR": "CONDUTOR:", "CPF": "CPF:", "PLACA_CAVALO": "PLACA CAVALO:", "PLACA_CARRETA": "PLACA CARRETA:", "CTE": "CTE Nº:"}
-    def preencher_tabela(table):
+# ==============================================================================
+# Modelo da Carta Frete Indexado
+# ==============================================================================
+# Uma única passada pelo modelo (tabelas, subtabelas aninhadas e parágrafos) anota, na ordem
+# em que o preenchimento antigo os visitava, os parágrafos com "R$" e cada rótulo com a célula
+# vizinha que recebe o valor. As posições ficam como caminhos de índices a partir do corpo do
+# documento, então valem para qualquer cópia do mesmo modelo e o preenchimento vira consulta direta.
+MAPA_CAMPOS_CARTA_FRETE = {"DATA": "DATA:", "CONDUTOR": "CONDUTOR:", "CPF": "CPF:", "PLACA_CAVALO": "PLACA CAVALO:", "PLACA_CARRETA": "PLACA CARRETA:", "CTE": "CTE Nº:"}
+
+def _caminho_elemento(elemento, raiz):
+    caminho = []
+    while elemento is not raiz:
+        pai = elemento.getparent()
+        caminho.append(pai.index(elemento))
+        elemento = pai
+    return tuple(reversed(caminho))
+
+def _resolver_caminho(raiz, caminho, tag):
+    # None quando a estrutura mudou (ex.: a célula foi limpa por um campo anterior).
+    elemento = raiz
+    try:
+        for i in caminho:
+            elemento = elemento[i]
+    except IndexError:
+        return None
+    return elemento if elemento.tag == tag else None
+
+def indexar_carta_frete(doc):
+    """Percorre o documento uma vez. Devolve {"valor": [caminhos dos parágrafos com R$],
+    "campos": [(caminho do parágrafo, [(chave, rótulo, caminho da célula alvo ou None), ...])]}."""
+    corpo = doc.element.body
+    indice = {"valor": [], "campos": []}
+    for table in doc.tables:
         for row in table.rows:
-            for ci, cell in enumerate(row.cells):
+            for cell in row.cells:
+                for p in cell.paragraphs:
+                    if "R$" in p.text:
+                        indice["valor"].append(_caminho_elemento(p._p, corpo))
+    def indexar_tabela(table):
+        for row in table.rows:
+            celulas = row.cells
+            for ci, cell in enumerate(celulas):
                 for subtable in cell.tables:
-                    preencher_tabela(subtable)
+                    indexar_tabela(subtable)
+                alvo = _caminho_elemento(celulas[ci + 1]._tc, corpo) if ci + 1 < len(celulas) else None
                 for p in cell.paragraphs:
-                    for chave, rotulo in mapa_campos_normais.items():
-                        valor = str(dados.get(chave, ""))
-                        if rotulo in p.text and valor not in p.text:
-                            if ci + 1 < len(row.cells):
-                                target_cell = row.cells[ci + 1]
-                                target_cell.text = ""
-                                run = target_cell.add_paragraph(valor).runs[0]
-                                run.bold = True
-                            else:
-                                p.add_run(" " + valor).bold = True
+                    texto = p.text
+                    rotulos = [(chave, rotulo, alvo) for chave, rotulo in MAPA_CAMPOS_CARTA_FRETE.items() if rotulo in texto]
+                    if rotulos:
+                        indice["campos"].append((_caminho_elemento(p._p, corpo), rotulos))
     for table in doc.tables:
-        preencher_tabela(table)
+        indexar_tabela(table)
+    return indice
+
+def aplicar_indice_carta_frete(doc, indice, dados):
+    corpo, pai = doc.element.body, doc._body
+    valor_frete_str = str(dados.get("VALOR_FRETE", ""))
+    if valor_frete_str:
+        valor_formatado = formatar_moeda_brasileira(valor_frete_str)
+        for caminho in indice["valor"]:
+            elemento = _resolver_caminho(corpo, caminho, qn('w:p'))
+            if elemento is None:
+                continue
+            p = ParagrafoDocx(elemento, pai)
+            if valor_formatado not in p.text:
+                run = p.add_run(" " + valor_formatado)
+                font = run.font
+                font.name = 'Calibri (Corpo)'
+                font.size = Pt(14)
+                font.bold = True
+                break
+    for caminho, rotulos in indice["campos"]:
+        elemento = _resolver_caminho(corpo, caminho, qn('w:p'))
+        if elemento is None:
+            continue
+        # O mesmo parágrafo vale para todos os rótulos dele, mesmo que a célula alvo seja a própria
+        # (células mescladas) e ele saia da árvore no primeiro preenchimento.
+        p = ParagrafoDocx(elemento, pai)
+        for chave, rotulo, caminho_alvo in rotulos:
+            valor = str(dados.get(chave, ""))
+            texto = p.text
+            if rotulo not in texto or valor in texto:
+                continue
+            if caminho_alvo is None:
+                p.add_run(" " + valor).bold = True
+                continue
+            tc = _resolver_caminho(corpo, caminho_alvo, qn('w:tc'))
+            if tc is not None:
+                target_cell = _Cell(tc, pai)
+                target_cell.text = ""
+                run = target_cell.add_paragraph(valor).runs[0]
+                run.bold = True
+
+def fill_carta_frete_docx(doc, dados):
+    aplicar_indice_carta_frete(doc, indexar_carta_frete(doc), dados)
+
+class ModeloCartaFrete:
+    def __init__(self, caminho):
+        inicio = time.perf_counter()
+        self.caminho = caminho
+        self.assinatura = ModeloOC.assinatura_arquivo(caminho)
+        with open(caminho, "rb") as f:
+            dados = f.read()
+        # Mesmo cuidado do ModeloOC: o documento copiado nunca é percorrido.
+        self._documento_base = Document(io.BytesIO(dados))
+        self._lock = threading.Lock()
+        analise = Document(io.BytesIO(dados))
+        self.indice = indexar_carta_frete(analise)
+        self.layout = self._extrair_layout(analise)
+        print(f"{_get_timestamp()} [MODELO CARTA FRETE] '{os.path.basename(caminho)}' indexado em {(time.perf_counter() - inicio) * 1000:.0f} ms "
+              f"(parágrafos={len(self.indice['campos'])}, valor={len(self.indice['valor'])}).")
+
+    def preencher(self, dados):
+        with self._lock:
+            doc = copy.deepcopy(self._documento_base)
+        aplicar_indice_carta_frete(doc, self.indice, dados)
+        return doc
+
+    def _extrair_layout(self, analise):
+        """Para o PDF nativo: {"campos": [(rótulo, chave)] na ordem do índice, "rotulo_valor": texto
+        do primeiro parágrafo com R$ (sem o R$)}."""
+        campos, vistos = [], set()
+        for _, rotulos in self.indice["campos"]:
+            for chave, rotulo, _ in rotulos:
+                if chave not in vistos:
+                    vistos.add(chave)
+                    campos.append((rotulo, chave))
+        rotulo_valor = ""
+        if self.indice["valor"]:
+            elemento = _resolver_caminho(analise.element.body, self.indice["valor"][0], qn('w:p'))
+            if elemento is not None:
+                rotulo_valor = ParagrafoDocx(elemento, analise._body).text.replace("R$", "").strip(" :")
+        return {"campos": campos, "rotulo_valor": rotulo_valor}
+
+_MODELOS_CARTA_FRETE = {}
+
+def obter_modelo_carta_frete(caminho):
+    chave = os.path.abspath(caminho)
+    with _LOCK_MODELOS_OC:
+        modelo = _MODELOS_CARTA_FRETE.get(chave)
+        if modelo is None or modelo.assinatura != ModeloOC.assinatura_arquivo(chave):
+            modelo = _MODELOS_CARTA_FRETE[chave] = ModeloCartaFrete(chave)
+        return modelo
+
+# ==============================================================================
+# PDFs Nativos (O.C. e Carta Frete)
+# ==============================================================================
+# Os PDFs saem direto do reportlab com os mesmos dados que preenchem os modelos .docx, sem
+# depender do Word (docx2pdf). O .docx continua disponível como saída opcional.
+MIN_PDFS_POR_PROCESSO = 10
+
+_ESTILOS_PDF = {}
+
+def _estilos_pdf():
+    if not _ESTILOS_PDF:
+        base = getSampleStyleSheet()
+        _ESTILOS_PDF["titulo"] = ParagraphStyle("TituloDoc", parent=base["Heading1"], fontName=_fonte_pdf(True), fontSize=15, alignment=1, spaceAfter=2)
+        _ESTILOS_PDF["subtitulo"] = ParagraphStyle("SubtituloDoc", parent=base["Normal"], fontName=_fonte_pdf(), fontSize=9, alignment=1, textColor=colors.HexColor('#444444'))
+        _ESTILOS_PDF["campo"] = ParagraphStyle("CampoDoc", parent=base["Normal"], fontName=_fonte_pdf(), fontSize=10, leading=14)
+        _ESTILOS_PDF["celula"] = ParagraphStyle("CelulaDoc", parent=base["Normal"], fontName=_fonte_pdf(), fontSize=8, leading=10, alignment=1)
+        _ESTILOS_PDF["rodape"] = ParagraphStyle("RodapeDoc", parent=base["Normal"], fontName=_fonte_pdf(), fontSize=8, alignment=1, textColor=colors.HexColor('#666666'))
+    return _ESTILOS_PDF
+
+def _cabecalho_pdf(titulo, subtitulo, largura):
+    estilos = _estilos_pdf()
+    logo = None
+    if os.path.exists(LOGO_RELATORIO_PATH):
+        try:
+            logo = ReportLabImage(LOGO_RELATORIO_PATH, width=1.6 * inch, height=0.8 * inch, kind='proportional')
+        except Exception as e:
+            print(f"Erro ao carregar logo: {e}. Prosseguindo sem a imagem.")
+    textos = [Paragraph(titulo, estilos["titulo"]), Paragraph(subtitulo, estilos["subtitulo"])]
+    cabecalho = Table([[logo or "", textos, ""]], colWidths=[1.7 * inch, largura - 3.4 * inch, 1.7 * inch])
+    cabecalho.setStyle(TableStyle([('VALIGN', (0, 0), (-1, -1), 'MIDDLE'), ('LINEBELOW', (0, 0), (-1, 0), 1, colors.black)]))
+    return cabecalho
+
+def _texto_pdf(valor):
+    # Texto de modelo ou de dados dentro de um Paragraph: "&" e "<" são marcação para o reportlab.
+    return xml_escape(_clean(valor))
+
+def _tabela_campos_pdf(campos, largura, tamanho_valor=10):
+    # Pares rótulo/valor em grade de duas colunas de campos, como nos modelos .docx.
+    linhas = []
+    for i in range(0, len(campos), 2):
+        linha = []
+        for rotulo, valor in campos[i:i + 2]:
+            linha += [rotulo, _clean(valor)]
+        linhas.append(linha + ["", ""] * (2 - len(campos[i:i + 2])))
+    tabela = Table(linhas, colWidths=[largura * 0.2, largura * 0.3] * 2)
+    tabela.setStyle(TableStyle([
+        ('FONTNAME', (0, 0), (-1, -1), _fonte_pdf(True)),
+        ('FONTNAME', (0, 0), (0, -1), _fonte_pdf()), ('FONTNAME', (2, 0), (2, -1), _fonte_pdf()),
+        ('FONTSIZE', (0, 0), (-1, -1), tamanho_valor),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+        ('BACKGROUND', (0, 0), (0, -1), colors.whitesmoke), ('BACKGROUND', (2, 0), (2, -1), colors.whitesmoke),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ]))
+    return tabela
+
+# Layouts usados quando o modelo .docx não está disponível (ex.: servidor sem a pasta dados/).
+LAYOUT_OC_PADRAO = [("data", "Data de carregamento: 00/00/0000"), ("rotulos", ["motorista", "cnh"]), ("rotulos", ["fone"]), ("rotulos", ["1", "2", "3"]),
+                    ("produtos", ["PEDIDO", "PRODUTO", "PESO (TON)", "CIDADE/UF", "CLIENTE"], [12, 33, 11, 20, 24])]
+LAYOUT_CARTA_FRETE_PADRAO = {"campos": [(rotulo, chave) for chave, rotulo in MAPA_CAMPOS_CARTA_FRETE.items()], "rotulo_valor": "VALOR DO FRETE"}
+
+def _layout_modelo(obter_modelo, modelo_path, padrao):
+    if not modelo_path or not os.path.exists(modelo_path):
+        return padrao
+    try:
+        return obter_modelo(modelo_path).layout
+    except Exception as e:
+        print(f"{_get_timestamp()} [PDF] Modelo '{os.path.basename(modelo_path)}' ilegível ({type(e).__name__}: {e}); usando o layout padrão.")
+        return padrao
+
+def gerar_oc_pdf(save_path, produtos, cpf, nome, cnh, fone, placa1, placa2, placa3, data_carregamento, fornecedor="Fertimaxi", modelo_path=TEMPLATE_OC):
+    """Mesmos argumentos de gerar_oc_docx. A ordem dos blocos, os rótulos e as colunas da tabela
+    de produtos vêm das âncoras do ModeloOC de `modelo_path`."""
+    entradas = {"produtos": produtos, "cpf": cpf, "nome": nome, "cnh": cnh, "fone": fone, "placa1": placa1, "placa2": placa2, "placa3": placa3,
+                "data_carregamento": data_carregamento, "fornecedor": fornecedor}
+    return CACHE_SAIDAS.produzir("oc_pdf", [LOGO_RELATORIO_PATH, modelo_path], entradas, save_path,
+                                 lambda destino: _montar_oc_pdf(destino, _layout_modelo(obter_modelo_oc, modelo_path, LAYOUT_OC_PADRAO), **entradas))
+
+def _tabela_produtos_oc_pdf(cabecalho, larguras, produtos, largura):
+    estilos = _estilos_pdf()
+    # Mesma ordem de colunas que _preencher_tabela_produtos usa no .docx; o PDF não tem limite de linhas.
+    linhas = [[Paragraph(f"<b>{_texto_pdf(c)}</b>", estilos["celula"]) for c in cabecalho]]
+    for p in produtos:
+        valores = (p.get("contrato", ""), p.get("produto", ""), _format_peso(p.get("toneladas")), p.get("cidade", ""), p.get("cliente", ""))
+        linhas.append([Paragraph(_texto_pdf(v), estilos["celula"]) for v in valores[:len(cabecalho)]] + [""] * (len(cabecalho) - len(valores)))
+    larguras = larguras or [1] * len(cabecalho)
+    tabela = Table(linhas, colWidths=[largura * l / sum(larguras) for l in larguras], repeatRows=1)
+    tabela.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#04D9C4')),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+    ]))
+    return tabela
+
+def _montar_oc_pdf(save_path, layout, produtos, cpf, nome, cnh, fone, placa1, placa2, placa3, data_carregamento, fornecedor):
+    doc = SimpleDocTemplate(save_path, pagesize=A4, leftMargin=0.6 * inch, rightMargin=0.6 * inch, topMargin=0.5 * inch, bottomMargin=0.5 * inch,
+                            title=f"O.C. {nome} {data_carregamento}")
+    estilos = _estilos_pdf()
+    mapping = _mapa_motorista(cpf, nome, cnh, fone, placa1, placa2, placa3)
+    blocos = list(layout)
+    # O primeiro texto do modelo é o título dele; sem isso, o título padrão.
+    titulo = blocos.pop(0)[1] if blocos and blocos[0][0] == "texto" else "ORDEM DE COLETA"
+    Story = [_cabecalho_pdf(_texto_pdf(titulo), f"ATLANTICO FERTLOG SERVICOS &amp; TRANSPORTES — {fornecedor.upper()}", doc.width), Spacer(1, 0.2 * inch)]
+    for bloco in blocos:
+        tipo = bloco[0]
+        if tipo == "texto":
+            texto = _texto_pdf(bloco[1])
+            Story.append(Paragraph(f"<b>{texto}</b>" if bloco[2] else texto, estilos["campo"]))
+        elif tipo == "data":
+            Story.append(Paragraph(_texto_pdf(_PADRAO_DATA_OC.sub(data_carregamento, bloco[1], 1)), estilos["campo"]))
+        elif tipo == "rotulos":
+            partes = [f"<b>{STANDARDIZED_LABELS[chave]}:</b> {_texto_pdf(mapping.get(chave, ''))}" for chave in bloco[1] if chave]
+            Story.append(Paragraph("&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;".join(partes), estilos["campo"]))
+        elif tipo == "produtos":
+            Story += [Spacer(1, 0.1 * inch), _tabela_produtos_oc_pdf(bloco[1], bloco[2], produtos, doc.width), Spacer(1, 0.1 * inch)]
+        elif tipo == "tabela" and bloco[1]:
+            tabela = Table([[Paragraph(_texto_pdf(c), estilos["celula"]) for c in linha] for linha in bloco[1]], colWidths=doc.width / max(len(l) for l in bloco[1]))
+            tabela.setStyle(TableStyle([('GRID', (0, 0), (-1, -1), 0.5, colors.black), ('VALIGN', (0, 0), (-1, -1), 'MIDDLE')]))
+            Story += [Spacer(1, 0.1 * inch), tabela, Spacer(1, 0.1 * inch)]
+    Story.append(Spacer(1, 0.5 * inch))
+    Story.append(Paragraph("_______________________________________<br/>Assinatura do motorista", estilos["rodape"]))
+    doc.build(Story)
+
+def gerar_carta_frete_pdf(save_path, dados, modelo_path=TEMPLATE_CF):
+    """Mesmo dicionário de fill_carta_frete_docx: VALOR_FRETE, DATA, CONDUTOR, CPF, PLACA_CAVALO, PLACA_CARRETA e CTE.
+    Os rótulos e a ordem dos campos vêm do índice do ModeloCartaFrete de `modelo_path`."""
+    return CACHE_SAIDAS.produzir("carta_frete_pdf", [LOGO_RELATORIO_PATH, modelo_path], dict(dados), save_path,
+                                 lambda destino: _montar_carta_frete_pdf(destino, _layout_modelo(obter_modelo_carta_frete, modelo_path, LAYOUT_CARTA_FRETE_PADRAO), dados))
+
+def _montar_carta_frete_pdf(save_path, layout, dados):
+    doc = SimpleDocTemplate(save_path, pagesize=A4, leftMargin=0.6 * inch, rightMargin=0.6 * inch, topMargin=0.5 * inch, bottomMargin=0.5 * inch,
+                            title=f"Carta Frete {dados.get('CTE', '')}")
+    estilos = _estilos_pdf()
+    Story = [_cabecalho_pdf("CARTA FRETE", "ATLANTICO FERTLOG SERVICOS &amp; TRANSPORTES", doc.width), Spacer(1, 0.25 * inch)]
+    campos = [(rotulo, dados.get(chave, "")) for rotulo, chave in layout["campos"]]
+    if campos:
+        Story.append(_tabela_campos_pdf(campos, doc.width, tamanho_valor=11))
+        Story.append(Spacer(1, 0.25 * inch))
+    valor = formatar_moeda_brasileira(str(dados.get("VALOR_FRETE", "")))
+    quadro_valor = Table([[layout["rotulo_valor"] or "VALOR DO FRETE", f"R$ {valor}" if valor else "R$"]], colWidths=[doc.width * 0.5, doc.width * 0.5])
+    quadro_valor.setStyle(TableStyle([
+        ('FONTNAME', (0, 0), (0, 0), _fonte_pdf()), ('FONTNAME', (1, 0), (1, 0), _fonte_pdf(True)),
+        ('FONTSIZE', (0, 0), (0, 0), 11), ('FONTSIZE', (1, 0), (1, 0), 14),
+        ('BOX', (0, 0), (-1, -1), 1, colors.black), ('INNERGRID', (0, 0), (-1, -1), 0.5, colors.black),
+        ('BACKGROUND', (0, 0), (0, 0), colors.whitesmoke),
+        ('ALIGN', (1, 0), (1, 0), 'CENTER'), ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('TOPPADDING', (0, 0), (-1, -1), 8), ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+    ]))
+    Story.append(quadro_valor)
+    Story.append(Spacer(1, 0.6 * inch))
+    Story.append(Paragraph("_______________________________________<br/>ATLANTICO FERTLOG SERVICOS &amp; TRANSPORTES", estilos["rodape"]))
+    doc.build(Story)
+
+def gerar_carta_frete_docx(save_path, dados, modelo_path=TEMPLATE_CF):
+    if not os.path.exists(modelo_path): raise FileNotFoundError(f"Modelo DOCX não encontrado: {modelo_path}")
+    return CACHE_SAIDAS.produzir("carta_frete_docx", [modelo_path], dict(dados), save_path,
+                                 lambda destino: obter_modelo_carta_frete(modelo_path).preencher(dados).save(destino))
+
+def gerar_documento(tipo, caminho_pdf, dados, com_docx=False):
+    """Gera um documento ('oc' ou 'carta_frete') em PDF e, se pedido, também o .docx ao lado.
+    Para 'oc', `dados` tem os argumentos de gerar_oc_pdf (produtos, cpf, nome, ...)."""
+    inicio = time.perf_counter()
+    resultado = {"tipo": tipo, "pdf": caminho_pdf, "docx": None, "erro": None, "duracao": 0.0, "do_cache": False}
+    try:
+        caminho_docx = os.path.splitext(caminho_pdf)[0] + ".docx"
+        if tipo == "oc":
+            dados = dict(dados)
+            modelo = dados.pop("modelo_docx", TEMPLATE_OC)
+            resultado["do_cache"] = gerar_oc_pdf(caminho_pdf, modelo_path=modelo, **dados)
+            if com_docx:
+                dados.pop("fornecedor", None)
+                resultado["do_cache"] &= gerar_oc_docx(modelo, caminho_docx, **dados)
+                resultado["docx"] = caminho_docx
+        elif tipo == "carta_frete":
+            resultado["do_cache"] = gerar_carta_frete_pdf(caminho_pdf, dados)
+            if com_docx:
+                resultado["do_cache"] &= gerar_carta_frete_docx(caminho_docx, dados)
+                resultado["docx"] = caminho_docx
+        else:
+            raise ValueError(f"Tipo de documento desconhecido: {tipo}")
+    except Exception as e:
+        resultado["erro"] = f"{type(e).__name__}: {e}"
+    resultado["duracao"] = time.perf_counter() - inicio
+    return resultado
+
+def _com_contagem_cache_saidas(funcao, *args):
+    """Roda `funcao` num processo do pool e devolve, junto do resultado, os acertos e faltas do
+    CACHE_SAIDAS deste processo durante a chamada; quem chamou soma com somar_contagem."""
+    antes = CACHE_SAIDAS.copiar_contagem()
+    resultado = funcao(*args)
+    resultado["contagem_cache"] = {tipo: {campo: valor - antes.get(tipo, {}).get(campo, 0) for campo, valor in c.items()}
+                                   for tipo, c in CACHE_SAIDAS.copiar_contagem().items()}
+    return resultado
+
+def _gerar_documento_worker(trabalho):
+    return gerar_documento(trabalho["tipo"], trabalho["pdf"], trabalho["dados"], trabalho.get("com_docx", False))
+
+def gerar_documentos_em_lote(trabalhos, max_workers=None):
+    """`trabalhos`: dicts com tipo, pdf, dados e com_docx. Roda em paralelo entre os núcleos e
+    devolve os resultados na mesma ordem."""
+    if not trabalhos:
+        return []
+    workers = max_workers or min(os.cpu_count() or 1, len(trabalhos) // MIN_PDFS_POR_PROCESSO)
+    inicio = time.perf_counter()
+    print(f"{_get_timestamp()} [PDF] Gerando {len(trabalhos)} documento(s) com {max(workers, 1)} processo(s)...")
+    if workers <= 1:
+        resultados = [_gerar_documento_worker(t) for t in trabalhos]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futuros = [executor.submit(_com_contagem_cache_saidas, _gerar_documento_worker, t) for t in trabalhos]
+            resultados = []
+            for trabalho, futuro in zip(trabalhos, futuros):
+                try:
+                    resultado = futuro.result()
+                    CACHE_SAIDAS.somar_contagem(resultado.pop("contagem_cache"))
+                    resultados.append(resultado)
+                except Exception as e:
+                    resultados.append({"tipo": trabalho["tipo"], "pdf": trabalho["pdf"], "docx": None, "erro": f"{type(e).__name__}: {e}", "duracao": 0.0, "do_cache": False})
+    falhas = [r for r in resultados if r["erro"]]
+    for r in falhas:
+        print(f"{_get_timestamp()} [PDF] ERRO em '{os.path.basename(r['pdf'])}': {r['erro']}")
+    print(f"{_get_timestamp()} [PDF] Concluído em {time.perf_counter() - inicio:.2f}s ({len(resultados) - len(falhas)} ok, {len(falhas)} com erro, "
+          f"{sum(1 for r in resultados if r['do_cache'])} reaproveitado(s) do cache).")
+    return resultados
 
 def open_file(filepath):
     try:
@@ -1066,7 +3410,7 @@ def open_file(filepath):
         else:
             subprocess.call(["xdg-open", filepath])
     except Exception as e:
-        messagebox.showwarning("Aviso", f"Não foi possível abrir o arquivo automaticamente:\n{e}")
+        _notificar("warning", "Aviso", f"Não foi possível abrir o arquivo automaticamente:\n{e}")
 
 def rotina_de_inicializacao(app):
     aba_agendamentos = app._conectar_google_sheets("Agendamentos")
@@ -1077,6 +3421,698 @@ def rotina_de_inicializacao(app):
     if aba_pedidos_grandes:
         app._compactar_planilha(aba_pedidos_grandes)
 
+# ==============================================================================
+# Ingestão de Contratos em Lote (pool de processos)
+# ==============================================================================
+# Cada processo do pool recebe a tabela de cidades uma única vez (initializer)
+# para não serializá-la novamente a cada contrato enviado.
+_CIDADES_WORKER = None
+_MOTOR_WORKER = None
+
+def _inicializar_worker_contratos(cidades_por_uf, motor_extracao):
+    global _CIDADES_WORKER, _MOTOR_WORKER
+    _CIDADES_WORKER = cidades_por_uf
+    _MOTOR_WORKER = motor_extracao
+    obter_indice_cidades(cidades_por_uf)
+
+def processar_contrato(pdf_path, cidades_por_uf, motor=None):
+    """Extrai texto, produtos e cidades candidatas de um contrato sem abrir diálogos.
+    A escolha da cidade (quando houver mais de uma candidata) fica para a thread da interface."""
+    inicio = time.perf_counter()
+    resultado = {"arquivo": pdf_path, "sha256": None, "produtos": [], "candidatas": [], "cidade": "", "do_cache": False, "erro": None, "duracao": 0.0}
+    try:
+        resultado.update(analisar_contrato(pdf_path, cidades_por_uf, motor))
+    except Exception as e:
+        resultado["erro"] = f"{type(e).__name__}: {e}"
+    resultado["duracao"] = time.perf_counter() - inicio
+    return resultado
+
+def _processar_contrato_worker(pdf_path):
+    return processar_contrato(pdf_path, _CIDADES_WORKER, _MOTOR_WORKER)
+
+def processar_contratos_em_lote(pdf_paths, cidades_por_uf, ao_concluir, max_workers=None, motor=None):
+    """Distribui os contratos entre processos e chama `ao_concluir(resultado)` à medida que
+    cada arquivo termina (fora de ordem). Retorna a lista de resultados na ordem de conclusão.
+    `motor` é um de MOTORES_EXTRACAO_PDF (padrão: MOTOR_EXTRACAO_PDF)."""
+    motor = motor or MOTOR_EXTRACAO_PDF
+    resultados = []
+    if not pdf_paths:
+        return resultados
+    workers = max_workers or min(len(pdf_paths), os.cpu_count() or 1)
+    inicio = time.perf_counter()
+    print(f"{_get_timestamp()} [LOTE] Processando {len(pdf_paths)} contrato(s) com {workers} processo(s) (motor: {motor})...")
+    if workers <= 1:
+        # Um único arquivo (ou uma única CPU) não compensa o custo de subir processos.
+        for pdf_path in pdf_paths:
+            resultado = processar_contrato(pdf_path, cidades_por_uf, motor)
+            resultados.append(resultado)
+            ao_concluir(resultado)
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_inicializar_worker_contratos, initargs=(cidades_por_uf, motor)) as executor:
+            futuros = {executor.submit(_processar_contrato_worker, p): p for p in pdf_paths}
+            for futuro in as_completed(futuros):
+                try:
+                    resultado = futuro.result()
+                except Exception as e:
+                    # Falha do próprio processo (ex.: BrokenProcessPool), não do parsing.
+                    resultado = {"arquivo": futuros[futuro], "sha256": None, "produtos": [], "candidatas": [], "cidade": "", "do_cache": False, "erro": f"{type(e).__name__}: {e}", "duracao": 0.0}
+                resultados.append(resultado)
+                ao_concluir(resultado)
+    for r in resultados:
+        status = f"ERRO ({r['erro']})" if r["erro"] else f"{len(r['produtos'])} produto(s){' (cache)' if r['do_cache'] else ''}"
+        print(f"{_get_timestamp()} [LOTE] {os.path.basename(r['arquivo'])}: {r['duracao']:.2f}s - {status}")
+    print(f"{_get_timestamp()} [LOTE] Concluído em {time.perf_counter() - inicio:.2f}s.")
+    return resultados
+
+# ==============================================================================
+# Monitoramento da Pasta de Contratos
+# ==============================================================================
+# Pasta compartilhada onde o comercial deixa os contratos. Vazio = desativado até o
+# operador escolher uma pasta na aba CONTRATO.
+PASTA_CONTRATOS_MONITORADA = ""
+INTERVALO_VARREDURA_PASTA = 5.0
+TEMPO_ESTABILIZACAO_ARQUIVO = 3.0
+ESPERA_MAXIMA_NOVA_TENTATIVA = 300.0  # Teto do recuo entre tentativas de um PDF que falhou.
+
+class _InotifyPasta:
+    """Eventos de fechamento/movimentação de arquivos via inotify (somente Linux)."""
+
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+
+    def __init__(self, pasta):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 falhou")
+        if libc.inotify_add_watch(self.fd, os.fsencode(pasta), self.IN_CLOSE_WRITE | self.IN_MOVED_TO) < 0:
+            erro = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(erro, "inotify_add_watch falhou")
+
+    def aguardar(self, timeout):
+        nomes = set()
+        prontos, _, _ = select.select([self.fd], [], [], timeout)
+        if not prontos:
+            return nomes
+        try:
+            dados = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return nomes
+        pos = 0
+        while pos + 16 <= len(dados):
+            _, _, _, tamanho = struct.unpack_from("iIII", dados, pos)
+            nome = dados[pos + 16 : pos + 16 + tamanho].rstrip(b"\0")
+            if nome:
+                nomes.add(os.fsdecode(nome))
+            pos += 16 + tamanho
+        return nomes
+
+    def fechar(self):
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+
+class MonitorPastaContratos:
+    """Vigia uma pasta e chama `ao_detectar(caminho)` (na thread do monitor) para cada PDF novo,
+    depois que ele parar de crescer (ou assim que o inotify avisar que foi fechado/movido).
+    `ao_detectar` devolve o resultado de processar_contrato; se ele levantar exceção ou o
+    resultado vier com "erro", o arquivo é tentado de novo com recuo exponencial. Arquivos já
+    processados com sucesso são reconhecidos pelo SHA-256, mesmo que sejam renomeados ou copiados de novo."""
+
+    def __init__(self, pasta, ao_detectar, intervalo=INTERVALO_VARREDURA_PASTA, estabilizacao=TEMPO_ESTABILIZACAO_ARQUIVO):
+        self.pasta = pasta
+        self.ao_detectar = ao_detectar
+        self.intervalo = intervalo
+        self.estabilizacao = estabilizacao
+        self._parar = threading.Event()
+        self._thread = None
+        self._candidatos = {}
+        self._caminho_registro = _caminho_cache("pasta_monitorada_processados.json")
+        self._processados = self._carregar_registro()
+
+    def _carregar_registro(self):
+        try:
+            with open(self._caminho_registro, "r", encoding="utf-8") as f:
+                return set(json.load(f))
+        except (OSError, ValueError):
+            return set()
+
+    def _salvar_registro(self):
+        try:
+            os.makedirs(os.path.dirname(self._caminho_registro), exist_ok=True)
+            caminho_tmp = f"{self._caminho_registro}.tmp"
+            with open(caminho_tmp, "w", encoding="utf-8") as f:
+                json.dump(sorted(self._processados), f)
+            os.replace(caminho_tmp, self._caminho_registro)
+        except OSError as e:
+            print(f"Aviso: não foi possível salvar o registro da pasta monitorada: {e}")
+
+    @property
+    def ativo(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def iniciar(self):
+        if self.ativo: return
+        self._parar.clear()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def parar(self):
+        self._parar.set()
+
+    def _loop(self):
+        inotify = None
+        if sys.platform.startswith("linux"):
+            try:
+                inotify = _InotifyPasta(self.pasta)
+            except (OSError, AttributeError) as e:
+                print(f"{_get_timestamp()} [PASTA] inotify indisponível ({e}); usando varredura periódica.")
+        print(f"{_get_timestamp()} [PASTA] Monitorando '{self.pasta}' ({'inotify' if inotify else 'varredura'}).")
+        try:
+            periodo = min(self.intervalo, self.estabilizacao)
+            proxima_varredura = time.monotonic()
+            while not self._parar.is_set():
+                # IN_CLOSE_WRITE / IN_MOVED_TO dizem que o arquivo está completo: é tratado na hora.
+                # A varredura periódica fica como reserva para arquivos que já estavam na pasta,
+                # eventos perdidos (ex.: pastas de rede) e novas tentativas.
+                espera = max(0.0, proxima_varredura - time.monotonic())
+                if inotify:
+                    for nome in inotify.aguardar(espera):
+                        if self._parar.is_set():
+                            break
+                        self._tratar_evento(nome)
+                else:
+                    self._parar.wait(espera)
+                if self._parar.is_set():
+                    break
+                if time.monotonic() >= proxima_varredura:
+                    self._varrer()
+                    proxima_varredura = time.monotonic() + periodo
+        except Exception as e:
+            print(f"ERRO no monitoramento da pasta '{self.pasta}': {e}")
+            traceback.print_exc()
+        finally:
+            if inotify:
+                inotify.fechar()
+            print(f"{_get_timestamp()} [PASTA] Monitoramento de '{self.pasta}' encerrado.")
+
+    def _tratar_evento(self, nome):
+        if not nome.lower().endswith(".pdf"):
+            return
+        caminho = os.path.join(self.pasta, nome)
+        try:
+            st = os.stat(caminho)
+        except OSError:
+            return
+        if st.st_size == 0:
+            return
+        assinatura = (st.st_size, st.st_mtime_ns)
+        anterior = self._candidatos.get(caminho)
+        if anterior is not None and anterior[0] == assinatura and (anterior[2] or anterior[3]):
+            return  # Já tratado, ou falhou e está esperando o recuo.
+        self._candidatos[caminho] = (assinatura, time.monotonic(), False, 0)
+        self._tentar(caminho)
+
+    def _varrer(self):
+        agora = time.monotonic()
+        vistos = set()
+        try:
+            entradas = [e for e in os.scandir(self.pasta) if e.is_file() and e.name.lower().endswith(".pdf")]
+        except OSError as e:
+            print(f"{_get_timestamp()} [PASTA] Não foi possível listar '{self.pasta}': {e}")
+            return
+        for entrada in entradas:
+            try:
+                st = entrada.stat()
+            except OSError:
+                continue
+            vistos.add(entrada.path)
+            assinatura = (st.st_size, st.st_mtime_ns)
+            anterior = self._candidatos.get(entrada.path)
+            if anterior is None or anterior[0] != assinatura:
+                # Arquivo novo ou ainda sendo gravado: recomeça a contagem de estabilização.
+                self._candidatos[entrada.path] = (assinatura, agora + self.estabilizacao, False, 0)
+                continue
+            _, pronto_em, tratado, _ = anterior
+            if tratado or agora < pronto_em or st.st_size == 0:
+                continue
+            self._tentar(entrada.path)
+        for caminho in list(self._candidatos):
+            if caminho not in vistos:
+                del self._candidatos[caminho]
+
+    def _tentar(self, caminho):
+        """Candidatos são (assinatura, pronto_em, tratado, falhas); pronto_em é o instante
+        (monotonic) a partir do qual o arquivo pode ser tratado."""
+        assinatura, _, _, falhas = self._candidatos[caminho]
+        if self._tratar(caminho):
+            self._candidatos[caminho] = (assinatura, 0.0, True, 0)
+            return
+        falhas += 1
+        espera = min(self.estabilizacao * 2 ** falhas, ESPERA_MAXIMA_NOVA_TENTATIVA)
+        print(f"{_get_timestamp()} [PASTA] '{os.path.basename(caminho)}' será tentado de novo em {espera:.0f}s (falha nº {falhas}).")
+        self._candidatos[caminho] = (assinatura, time.monotonic() + espera, False, falhas)
+
+    def _tratar(self, caminho):
+        """Devolve True se o arquivo não precisa mais ser tentado (processado agora ou antes)."""
+        try:
+            sha256 = _hash_arquivo(caminho)
+        except OSError as e:
+            print(f"{_get_timestamp()} [PASTA] Não foi possível ler '{caminho}': {e}")
+            return False
+        if sha256 in self._processados:
+            return True
+        print(f"{_get_timestamp()} [PASTA] Novo contrato: {os.path.basename(caminho)}")
+        try:
+            resultado = self.ao_detectar(caminho)
+        except Exception as e:
+            print(f"ERRO ao processar '{caminho}' da pasta monitorada: {e}")
+            traceback.print_exc()
+            return False
+        if isinstance(resultado, dict) and resultado.get("erro"):
+            return False
+        self._processados.add(sha256)
+        self._salvar_registro()
+        return True
+
+# ==============================================================================
+# Modo Headless (linha de comando)
+# ==============================================================================
+# Exemplo (backlog da noite, sem motorista):
+#   python app.py batch --contracts contratos/ --date 15/10/2025
+# Com motorista, gera também a O.C. e a planilha específica dele:
+#   python app.py batch --contracts contratos/ --date 15/10/2025 --motorista "JOSE DA SILVA" \
+#       --cpf 123.456.789-00 --cnh 01234567890 --fone "(27) 99999-0000" --placa1 ABC1D23 --saida saida/
+
+def _nome_arquivo_seguro(texto):
+    return re.sub(r'[^\w\-]+', '_', normalizar_texto_sem_acento(texto)).strip('_') or "sem_nome"
+
+def _sufixo_motorista(nome, data_carregamento):
+    return f"{_nome_arquivo_seguro(nome)}_{data_carregamento.replace('/', '-')}"
+
+def _itens_da_data_por_motorista(data_carregamento):
+    por_motorista = {}
+    for item in BANCO_CARREGAMENTOS.historico_data(data_carregamento):
+        if item["motorista"]:
+            por_motorista.setdefault(item["motorista"], []).append(item)
+    return por_motorista
+
+def _trabalho_oc(pasta_saida, motorista, produtos, data_carregamento, com_docx):
+    dados_oc = {"produtos": produtos, "cpf": motorista.get("cpf") or "", "nome": motorista["nome"], "cnh": motorista.get("cnh") or "", "fone": motorista.get("fone") or "",
+                "placa1": motorista.get("placa1") or "", "placa2": motorista.get("placa2") or "", "placa3": motorista.get("placa3") or "", "data_carregamento": data_carregamento}
+    return {"tipo": "oc", "pdf": os.path.join(pasta_saida, f"O.C_{_sufixo_motorista(motorista['nome'], data_carregamento)}.pdf"), "dados": dados_oc, "com_docx": com_docx}
+
+def _trabalhos_oc_da_data(data_carregamento, pasta_saida, com_docx, motorista=None):
+    """Uma O.C. por motorista com itens na data, lida do banco. Para o `motorista` informado na
+    linha de comando valem os dados dele (as placas 2 e 3 não ficam no banco)."""
+    trabalhos = []
+    for nome, itens in _itens_da_data_por_motorista(data_carregamento).items():
+        if motorista and motorista["nome"] == nome:
+            dados = motorista
+        else:
+            dados = dict(BANCO_CARREGAMENTOS.dados_motorista(nome) or {"nome": nome})
+            dados["placa1"] = next((i["placa"] for i in itens if i["placa"]), "")
+        trabalhos.append(_trabalho_oc(pasta_saida, dados, [_item_para_produto(i) for i in itens], data_carregamento, com_docx))
+    return trabalhos
+
+def _registrar_documentos_no_relatorio(relatorio, resultados):
+    for r in resultados:
+        if r["erro"]:
+            relatorio["erros"].append(f"O.C. '{os.path.basename(r['pdf'])}': {r['erro']}")
+        else:
+            relatorio["arquivos_gerados"].extend(c for c in (r["pdf"], r["docx"]) if c)
+
+def _trabalhos_planilhas_da_data(data_carregamento, pasta_saida):
+    """Um trabalho de criar_planilhas_motoristas_em_lote por motorista com itens na data, lido do banco."""
+    por_motorista = _itens_da_data_por_motorista(data_carregamento)
+    return [{"caminho": os.path.join(pasta_saida, f"Autorizacao_{_sufixo_motorista(nome, data_carregamento)}.xlsx"),
+             "produtos": [_item_para_produto(i) for i in itens], "nome_condutor": nome,
+             "placa_cavalo": next((i["placa"] for i in itens if i["placa"]), "")}
+            for nome, itens in por_motorista.items()]
+
+def executar_lote_headless(pasta_contratos, data_carregamento, planilha=EXCEL_FILE, motorista=None, pasta_saida=None, max_workers=None, com_docx=False, todos_motoristas=False, motor=None):
+    """Processa todos os PDFs de `pasta_contratos` e grava a planilha geral; com `motorista`
+    (dict com nome, cpf, cnh, fone, placa1, placa2, placa3) gera também a O.C. em PDF (e em
+    .docx com `com_docx`) e a planilha do motorista. Com `todos_motoristas`, as O.C.s e as
+    planilhas de todos os motoristas registrados no banco na data são geradas em paralelo.
+    `motor` escolhe a extração de texto (ver MOTORES_EXTRACAO_PDF).
+    Nada é perguntado ao usuário: problemas voltam no relatório."""
+    relatorio = {"contratos": [], "produtos": 0, "cidades_pendentes": [], "arquivos_gerados": [], "erros": []}
+    pdf_paths = sorted(os.path.join(pasta_contratos, n) for n in os.listdir(pasta_contratos) if n.lower().endswith(".pdf"))
+    if not pdf_paths:
+        relatorio["erros"].append(f"Nenhum PDF encontrado em '{pasta_contratos}'.")
+        return relatorio
+    cidades_por_uf = carregar_cidades_nova_logica(PLANILHA_CIDADES)
+    if not cidades_por_uf:
+        relatorio["erros"].append("A tabela de cidades não foi carregada.")
+        return relatorio
+
+    # O pool devolve os contratos fora de ordem; a planilha segue a ordem dos arquivos.
+    ordem = {p: i for i, p in enumerate(pdf_paths)}
+    resultados = sorted(processar_contratos_em_lote(pdf_paths, cidades_por_uf, lambda r: None, max_workers, motor), key=lambda r: ordem[r["arquivo"]])
+    produtos = []
+    for r in resultados:
+        relatorio["contratos"].append({"arquivo": r["arquivo"], "produtos": len(r["produtos"]), "do_cache": r["do_cache"], "erro": r["erro"], "duracao": round(r["duracao"], 3)})
+        if r["erro"]:
+            relatorio["erros"].append(f"{os.path.basename(r['arquivo'])}: {r['erro']}")
+            continue
+        if not r["cidade"] and len(r["candidatas"]) > 1:
+            relatorio["cidades_pendentes"].append({"arquivo": r["arquivo"], "candidatas": [formatar_cidade_uf(c, uf) for c, uf in r["candidatas"]]})
+        produtos.extend(r["produtos"])
+    relatorio["produtos"] = len(produtos)
+    if not produtos:
+        relatorio["erros"].append("Nenhum produto foi extraído dos contratos.")
+        return relatorio
+
+    try:
+        append_rows_to_excel(planilha, produtos, data_carregamento)
+        relatorio["arquivos_gerados"].append(planilha)
+    except Exception as e:
+        relatorio["erros"].append(f"Planilha geral: {type(e).__name__}: {e}")
+        return relatorio
+
+    if motorista:
+        pasta_saida = pasta_saida or os.path.dirname(os.path.abspath(planilha))
+        os.makedirs(pasta_saida, exist_ok=True)
+        caminho_planilha_motorista = os.path.join(pasta_saida, f"Autorizacao_{_sufixo_motorista(motorista['nome'], data_carregamento)}.xlsx")
+        # O motorista é vinculado no banco antes: a planilha dele é uma exportação do banco.
+        if not update_excel_with_driver_data(planilha, motorista["nome"], motorista.get("placa1", ""), produtos, motorista.get("cpf"), motorista.get("cnh"), motorista.get("fone")):
+            relatorio["erros"].append("Motorista não foi registrado na planilha geral (ver console).")
+        # Com todos_motoristas a O.C. e a planilha dele saem junto com as dos outros motoristas da data, logo abaixo.
+        if not todos_motoristas:
+            _registrar_documentos_no_relatorio(relatorio, gerar_documentos_em_lote([_trabalho_oc(pasta_saida, motorista, produtos, data_carregamento, com_docx)]))
+            if exportar_planilha_motorista(caminho_planilha_motorista, motorista["nome"], data_carregamento, motorista.get("placa1", "")):
+                relatorio["arquivos_gerados"].append(caminho_planilha_motorista)
+            else:
+                relatorio["erros"].append("Planilha do motorista não foi gerada (ver console).")
+    if todos_motoristas:
+        pasta_saida = pasta_saida or os.path.dirname(os.path.abspath(planilha))
+        os.makedirs(pasta_saida, exist_ok=True)
+        trabalhos = _trabalhos_planilhas_da_data(data_carregamento, pasta_saida)
+        if not trabalhos:
+            relatorio["erros"].append(f"Nenhum motorista registrado no banco em {data_carregamento}.")
+        _registrar_documentos_no_relatorio(relatorio, gerar_documentos_em_lote(_trabalhos_oc_da_data(data_carregamento, pasta_saida, com_docx, motorista), max_workers))
+        for r in criar_planilhas_motoristas_em_lote(trabalhos, data_carregamento):
+            if r["ok"]:
+                relatorio["arquivos_gerados"].append(r["caminho"])
+            else:
+                relatorio["erros"].append(f"Planilha '{os.path.basename(r['caminho'])}': {r['erro']}")
+    try:
+        obter_sessao_planilha(planilha).gravar()
+    except Exception as e:
+        relatorio["erros"].append(f"Gravação da planilha geral: {type(e).__name__}: {e}")
+    relatorio["cache_saidas"] = CACHE_SAIDAS.estatisticas()
+    return relatorio
+
+def _data_carregamento_valida(texto):
+    try:
+        datetime.strptime(texto, "%d/%m/%Y")
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"data inválida '{texto}' (use DD/MM/AAAA)")
+    return texto
+
+def main_historico(args):
+    inicio = time.perf_counter()
+    if args.pedido:
+        itens = BANCO_CARREGAMENTOS.historico_pedido(args.pedido)
+    elif args.placa:
+        itens = BANCO_CARREGAMENTOS.historico_placa(args.placa)
+    else:
+        itens = BANCO_CARREGAMENTOS.historico_data(args.data)
+    duracao = (time.perf_counter() - inicio) * 1000
+    for i in itens:
+        print(f"{i['data_carregamento']}  pedido {i['pedido'] or '-':<10} {i['produto'] or '':<30} {i['toneladas']!s:>10}  {i['cidade'] or '':<25} {i['motorista'] or '-'} {i['placa'] or ''}")
+    print(f"{_get_timestamp()} [HISTÓRICO] {len(itens)} item(ns) em {duracao:.1f} ms.")
+    return 0
+
+def main_headless(argv):
+    parser = argparse.ArgumentParser(prog="app.py", description="Gerenciador de Cargas Atlântico Fertlog - modo sem interface.")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    p_batch = sub.add_parser("batch", help="Processa uma pasta de contratos: planilha geral e, opcionalmente, O.C. do motorista.")
+    p_batch.add_argument("--contracts", required=True, help="Pasta com os contratos em PDF.")
+    p_batch.add_argument("--date", required=True, type=_data_carregamento_valida, help="Data de carregamento (DD/MM/AAAA).")
+    p_batch.add_argument("--planilha", default=EXCEL_FILE, help="Planilha geral de destino (padrão: modelo em dados/).")
+    p_batch.add_argument("--workers", type=int, default=None, help="Número de processos (padrão: um por CPU).")
+    p_batch.add_argument("--motorista", help="Nome do condutor; ativa a geração da O.C. e da planilha do motorista.")
+    p_batch.add_argument("--cpf", default="")
+    p_batch.add_argument("--cnh", default="")
+    p_batch.add_argument("--fone", default="")
+    p_batch.add_argument("--placa1", default="")
+    p_batch.add_argument("--placa2", default="")
+    p_batch.add_argument("--placa3", default="")
+    p_batch.add_argument("--saida", help="Pasta para a O.C. e a planilha do motorista.")
+    p_batch.add_argument("--docx", action="store_true", help="Gera também a O.C. em .docx (o PDF é sempre gerado).")
+    p_batch.add_argument("--todos-motoristas", action="store_true", help="Gera as O.C.s e as planilhas de todos os motoristas registrados na data, em paralelo.")
+    p_batch.add_argument("--relatorio", help="Grava o relatório do lote em JSON neste caminho.")
+    p_batch.add_argument("--motor", choices=MOTORES_EXTRACAO_PDF, default=None, help=f"Extração de texto dos contratos (padrão: {MOTOR_EXTRACAO_PDF}).")
+    p_bench = sub.add_parser("bench", help="Mede extração, cidades, produtos e gravação da planilha com contratos sintéticos.")
+    p_bench.add_argument("--tamanhos", default="1,100,1000", help="Quantidades de documentos, separadas por vírgula.")
+    p_bench.add_argument("--saida", default="benchmarks", help="Pasta onde o resultado JSON é gravado.")
+    p_bench.add_argument("--comparar", help="JSON de uma execução anterior para comparar.")
+    p_bench.add_argument("--semente", type=int, default=42)
+    p_bench.add_argument("--motor", choices=MOTORES_EXTRACAO_PDF, default=None, help=f"Extração de texto medida (padrão: {MOTOR_EXTRACAO_PDF}); 'paridade' mede também a comparação.")
+    p_bench.add_argument("--relatorio", default="", help="Linhas do relatório de pedidos a medir, separadas por vírgula (ex.: 10000,100000). Use --tamanhos '' para medir só o relatório.")
+    p_hist = sub.add_parser("historico", help="Consulta o banco de carregamentos por pedido, placa ou data.")
+    grupo = p_hist.add_mutually_exclusive_group(required=True)
+    grupo.add_argument("--pedido")
+    grupo.add_argument("--placa")
+    grupo.add_argument("--data", type=_data_carregamento_valida)
+    args = parser.parse_args(argv)
+    if args.comando == "bench":
+        return main_benchmark(args)
+    if args.comando == "historico":
+        return main_historico(args)
+    recuperar_diarios_planilha()
+
+    if not os.path.isdir(args.contracts):
+        print(f"ERRO: a pasta de contratos '{args.contracts}' não existe.")
+        return 2
+    motorista = None
+    if args.motorista:
+        motorista = {"nome": args.motorista, "cpf": args.cpf, "cnh": args.cnh, "fone": args.fone, "placa1": args.placa1, "placa2": args.placa2, "placa3": args.placa3}
+    relatorio = executar_lote_headless(args.contracts, args.date, args.planilha, motorista, args.saida, args.workers, args.docx, args.todos_motoristas, args.motor)
+
+    print(f"{_get_timestamp()} [BATCH] {len(relatorio['contratos'])} contrato(s), {relatorio['produtos']} produto(s).")
+    for pendente in relatorio["cidades_pendentes"]:
+        print(f"{_get_timestamp()} [BATCH] Cidade a confirmar em '{os.path.basename(pendente['arquivo'])}': {', '.join(pendente['candidatas'])}")
+    if relatorio.get("cache_saidas", {}).get("acertos"):
+        print(f"{_get_timestamp()} [BATCH] {relatorio['cache_saidas']['acertos']} documento(s) reaproveitado(s) do cache de saídas.")
+    for caminho in relatorio["arquivos_gerados"]:
+        print(f"{_get_timestamp()} [BATCH] Gerado: {caminho}")
+    for erro in relatorio["erros"]:
+        print(f"{_get_timestamp()} [BATCH] ERRO: {erro}")
+    if args.relatorio:
+        with open(args.relatorio, "w", encoding="utf-8") as f:
+            json.dump(relatorio, f, ensure_ascii=False, indent=2)
+    return 1 if relatorio["erros"] else 0
+
+# ==============================================================================
+# Benchmark do caminho de parsing
+# ==============================================================================
+# `python app.py bench` gera contratos sintéticos nos dois layouts conhecidos e mede cada
+# etapa separadamente. O corpus é determinístico (semente fixa) e fica em cache/ para que
+# execuções diferentes meçam exatamente os mesmos arquivos.
+VERSAO_CORPUS_BENCHMARK = 1
+_PRODUTOS_SINTETICOS = ["NPK 20-05-20", "NPK 04-14-08", "UREIA", "SUPERFOSFATO SIMPLES", "CLORETO DE POTASSIO", "MAP 11-52-00", "SULFATO DE AMONIO", "NPK 10-10-10 + MICRO"]
+_EMBALAGENS_SINTETICAS = ["SACO 50KG", "BIG BAG", "GRANEL"]
+
+def _linhas_contrato_sintetico(rng, cidades, layout_antigo):
+    cidade, uf = rng.choice(cidades)
+    itens = [(rng.choice(_PRODUTOS_SINTETICOS), rng.choice(_EMBALAGENS_SINTETICAS), f"{rng.randint(1, 999)},{rng.randint(0, 999):03d}") for _ in range(rng.randint(1, 4))]
+    linhas = ["FERTIMAXI FERTILIZANTES", "CONCEICAO DO JACUIPE - BA. E-MAIL COMERCIAL@FERTIMAXI.COM.BR,", f"Nr. Pedido {rng.randint(100000, 999999)}",
+              f"CLIENTE: {rng.choice(['JOSE', 'MARIA', 'ANTONIO', 'FRANCISCA'])} {rng.choice(['DA SILVA', 'SOUZA', 'OLIVEIRA', 'SANTOS'])}",
+              f"ENDERECO FAZENDA {rng.choice(['BOA VISTA', 'SANTA RITA', 'SAO JOSE'])} CIDADE {cidade.upper()} - {uf}", "PRODUTOS:"]
+    if layout_antigo:
+        # "NNN: produto ... SACO 12,500" em uma linha só.
+        linhas += [f"{i + 1:03d}: {nome} {emb} {qtd}" for i, (nome, emb, qtd) in enumerate(itens)]
+    else:
+        # Layout novo: nomes primeiro, embalagem e quantidade em linhas separadas.
+        linhas += [f"{i + 1:03d}: {nome}" for i, (nome, _, _) in enumerate(itens)]
+        linhas += [f"{emb} {qtd}" for _, emb, qtd in itens]
+    return linhas
+
+def gerar_corpus_benchmark(quantidade, cidades_por_uf, semente=42):
+    """Garante `quantidade` contratos sintéticos em cache/ e devolve os caminhos (metade em cada layout)."""
+    from reportlab.pdfgen import canvas
+    pasta = _caminho_cache(os.path.join("bench_corpus", f"v{VERSAO_CORPUS_BENCHMARK}_s{semente}"))
+    os.makedirs(pasta, exist_ok=True)
+    cidades = [(cidade, uf) for uf, lista in sorted(cidades_por_uf.items()) for cidade, _ in lista]
+    rng = random.Random(semente)
+    caminhos = []
+    for i in range(quantidade):
+        # O rng avança sempre, mesmo para arquivos já gerados, para o corpus não depender do tamanho pedido.
+        linhas = _linhas_contrato_sintetico(rng, cidades, layout_antigo=(i % 2 == 0))
+        caminho = os.path.join(pasta, f"contrato_{i:05d}.pdf")
+        if not os.path.exists(caminho):
+            c = canvas.Canvas(caminho, pagesize=A4)
+            y = 800
+            for linha in linhas:
+                c.drawString(40, y, linha); y -= 18
+            c.save()
+        caminhos.append(caminho)
+    return caminhos
+
+def _estatisticas_etapa(tempos):
+    ordenados = sorted(tempos)
+    def percentil(p):
+        return ordenados[min(len(ordenados) - 1, int(round(p * (len(ordenados) - 1))))] * 1000
+    return {"total_s": round(sum(tempos), 4), "media_ms": round(sum(tempos) / len(tempos) * 1000, 3), "p50_ms": round(percentil(0.5), 3), "p95_ms": round(percentil(0.95), 3)}
+
+def medir_pipeline(pdf_paths, cidades_por_uf, data_carregamento="01/01/2025", motor=None):
+    global BANCO_CARREGAMENTOS
+    motor = motor or MOTOR_EXTRACAO_PDF
+    tempos = {"extracao": [], "cidades": [], "produtos": [], "excel": [], "gravacao": []}
+    if motor == "paridade":
+        tempos["paridade"] = []
+        divergentes = 0
+    pasta_tmp = tempfile.mkdtemp(prefix="bench_excel_")
+    planilha = os.path.join(pasta_tmp, "planilha_geral.xlsx")
+    # Os lotes sintéticos vão para um banco descartável, nunca para o registro real.
+    banco_real, BANCO_CARREGAMENTOS = BANCO_CARREGAMENTOS, BancoCarregamentos(os.path.join(pasta_tmp, "bench.sqlite3"))
+    try:
+        # Os logs de debug das funções medidas iriam dominar o tempo e poluir o console.
+        with contextlib.redirect_stdout(io.StringIO()):
+            for pdf_path in pdf_paths:
+                inicio = time.perf_counter()
+                texto = extrair_texto_contrato_pdf(pdf_path, motor)
+                tempos["extracao"].append(time.perf_counter() - inicio)
+
+                if motor == "paridade":
+                    inicio = time.perf_counter()
+                    divergentes += bool(comparar_paridade_extracao(pdf_path, cidades_por_uf, texto))
+                    tempos["paridade"].append(time.perf_counter() - inicio)
+
+                inicio = time.perf_counter()
+                candidatas = encontrar_cidades_candidatas(texto, cidades_por_uf)
+                tempos["cidades"].append(time.perf_counter() - inicio)
+
+                inicio = time.perf_counter()
+                produtos = extrair_produtos_do_texto(texto, formatar_cidade_uf(*candidatas[0]) if candidatas else "")
+                tempos["produtos"].append(time.perf_counter() - inicio)
+
+                inicio = time.perf_counter()
+                append_rows_to_excel(planilha, produtos, data_carregamento)
+                tempos["excel"].append(time.perf_counter() - inicio)
+
+            # A planilha fica na sessão em memória; a gravação em disco é medida à parte.
+            inicio = time.perf_counter()
+            obter_sessao_planilha(planilha).gravar()
+            tempos["gravacao"].append(time.perf_counter() - inicio)
+    finally:
+        encerrar_sessao_planilha(planilha)
+        BANCO_CARREGAMENTOS.fechar()
+        BANCO_CARREGAMENTOS = banco_real
+        shutil.rmtree(pasta_tmp, ignore_errors=True)
+    if motor == "paridade":
+        print(f"{_get_timestamp()} [BENCH] Paridade: {divergentes} de {len(pdf_paths)} documento(s) com divergência (detalhes em debug_logs/paridade_extracao.jsonl).")
+    return {etapa: _estatisticas_etapa(valores) for etapa, valores in tempos.items()}
+
+def executar_benchmark(tamanhos, semente=42, motor=None):
+    cidades_por_uf = carregar_cidades_nova_logica(PLANILHA_CIDADES)
+    if not cidades_por_uf:
+        raise RuntimeError("A tabela de cidades não foi carregada; o benchmark precisa dela.")
+    obter_indice_cidades(cidades_por_uf)  # Montagem do índice fora da medição.
+    corpus = gerar_corpus_benchmark(max(tamanhos), cidades_por_uf, semente)
+    resultado = {"data": datetime.now().isoformat(timespec="seconds"), "python": platform.python_version(), "plataforma": platform.platform(), "cpus": os.cpu_count(),
+                 "motor_extracao": motor or MOTOR_EXTRACAO_PDF, "semente": semente, "versao_corpus": VERSAO_CORPUS_BENCHMARK, "execucoes": []}
+    for n in tamanhos:
+        print(f"{_get_timestamp()} [BENCH] Medindo {n} documento(s)...")
+        inicio = time.perf_counter()
+        etapas = medir_pipeline(corpus[:n], cidades_por_uf, motor=motor)
+        resultado["execucoes"].append({"documentos": n, "total_s": round(time.perf_counter() - inicio, 4), "etapas": etapas})
+    return resultado
+
+def _itens_relatorio_sinteticos(quantidade, semente=42):
+    rnd = random.Random(semente)
+    for i in range(quantidade):
+        yield {"Data Pedido": f"{rnd.randint(1, 28):02d}/{rnd.randint(1, 12):02d}/2025", "Nro. Pedido": str(100000 + i),
+               "Cliente": f"CLIENTE {rnd.randint(1, 5000)} LTDA", "Cidade Dest.": rnd.choice(("RIO VERDE/GO", "SORRISO/MT", "UBERABA/MG", "BARREIRAS/BA")),
+               "Roteiro": f"R{rnd.randint(1, 40)}", "Peso (Ton)": f"{rnd.uniform(5, 40):.2f}".replace('.', ','), "Valor Frete": f"R$ {rnd.uniform(100, 4000):.2f}".replace('.', ',')}
+
+def _pico_memoria_processo_mb():
+    # Pico de RSS do processo; o módulo resource não existe no Windows.
+    try:
+        import resource
+    except ImportError:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(pico / 1024 / (1024 if sys.platform == "darwin" else 1), 1)
+
+def medir_relatorio_pedidos(quantidades, semente=42):
+    """Gera o relatório de pedidos em fluxo com linhas sintéticas e mede o tempo. O pico de memória
+    vem do tracemalloc numa passada separada só até 10 mil linhas (ele deixa o reportlab ~20x mais
+    lento); acima disso fica o pico de RSS do processo."""
+    medicoes = []
+    pasta = tempfile.mkdtemp(prefix="bench_relatorio_")
+    try:
+        for n in quantidades:
+            print(f"{_get_timestamp()} [BENCH] Relatório de pedidos com {n} linha(s)...")
+            caminho = os.path.join(pasta, f"relatorio_{n}.pdf")
+            inicio = time.perf_counter()
+            gerar_relatorio_pedidos(caminho, _itens_relatorio_sinteticos(n, semente), "BENCHMARK", "Nenhum")
+            duracao = time.perf_counter() - inicio
+            pico_python = None
+            if n <= 10000:
+                tracemalloc.start()
+                gerar_relatorio_pedidos(caminho, _itens_relatorio_sinteticos(n, semente), "BENCHMARK", "Nenhum")
+                pico_python = round(tracemalloc.get_traced_memory()[1] / 1024 / 1024, 1)
+                tracemalloc.stop()
+            medicoes.append({"linhas": n, "total_s": round(duracao, 3), "linhas_por_s": round(n / duracao) if duracao else None,
+                             "pico_python_mb": pico_python, "pico_rss_mb": _pico_memoria_processo_mb(), "tamanho_pdf_mb": round(os.path.getsize(caminho) / 1024 / 1024, 1)})
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
+    return medicoes
+
+def _imprimir_benchmark(resultado, anterior=None):
+    base = {e["documentos"]: e for e in anterior["execucoes"]} if anterior else {}
+    for execucao in resultado["execucoes"]:
+        print(f"\n{execucao['documentos']} documento(s) - {execucao['total_s']:.2f}s")
+        for etapa, est in execucao["etapas"].items():
+            linha = f"  {etapa:<9} média {est['media_ms']:>9.3f} ms  p95 {est['p95_ms']:>9.3f} ms  total {est['total_s']:>8.3f} s"
+            antes = base.get(execucao["documentos"], {}).get("etapas", {}).get(etapa)
+            if antes and antes["media_ms"]:
+                linha += f"  ({(est['media_ms'] / antes['media_ms'] - 1) * 100:+.1f}% vs. anterior)"
+            print(linha)
+    base_relatorio = {m["linhas"]: m for m in (anterior or {}).get("relatorio", [])}
+    for m in resultado.get("relatorio", []):
+        linha = (f"\nRelatório de pedidos - {m['linhas']} linha(s): {m['total_s']:.2f}s ({m['linhas_por_s']} linhas/s), "
+                 f"pico Python {m['pico_python_mb'] if m['pico_python_mb'] is not None else '-'} MB, pico RSS {m['pico_rss_mb'] or '-'} MB, PDF {m['tamanho_pdf_mb']:.1f} MB")
+        antes = base_relatorio.get(m["linhas"])
+        if antes and antes["total_s"]:
+            linha += f"  ({(m['total_s'] / antes['total_s'] - 1) * 100:+.1f}% vs. anterior)"
+        print(linha)
+
+def main_benchmark(args):
+    try:
+        tamanhos = sorted({int(t) for t in args.tamanhos.split(",") if t.strip()})
+        linhas_relatorio = sorted({int(t) for t in args.relatorio.split(",") if t.strip()})
+    except ValueError:
+        print(f"ERRO: --tamanhos/--relatorio inválido: '{args.tamanhos}' / '{args.relatorio}'")
+        return 2
+    if (not tamanhos and not linhas_relatorio) or min(tamanhos + linhas_relatorio) < 1:
+        print("ERRO: informe ao menos um tamanho positivo em --tamanhos ou --relatorio.")
+        return 2
+    anterior = None
+    if args.comparar:
+        with open(args.comparar, "r", encoding="utf-8") as f:
+            anterior = json.load(f)
+    if tamanhos:
+        resultado = executar_benchmark(tamanhos, args.semente, args.motor)
+    else:
+        resultado = {"data": datetime.now().isoformat(timespec="seconds"), "python": platform.python_version(), "plataforma": platform.platform(), "cpus": os.cpu_count(),
+                     "semente": args.semente, "execucoes": []}
+    if linhas_relatorio:
+        resultado["relatorio"] = medir_relatorio_pedidos(linhas_relatorio, args.semente)
+    os.makedirs(args.saida, exist_ok=True)
+    caminho = os.path.join(args.saida, f"bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(caminho, "w", encoding="utf-8") as f:
+        json.dump(resultado, f, ensure_ascii=False, indent=2)
+    _imprimir_benchmark(resultado, anterior)
+    print(f"\n{_get_timestamp()} [BENCH] Resultado gravado em {caminho}")
+    return 0
+
 # ==============================================================================
 # Classe GUI - Redesenhada
 # ==============================================================================
@@ -1098,6 +4134,10 @@ class PDFInserterApp:
         today = datetime.today()
         self.ano = today.year
         self.produtos = []
+        self.cidades_pendentes = []
+        self.painel_cidades = None
+        self.monitor_pasta = None
+        self.contratos_monitorados_em_espera = []
         self.supplier_var = tk.StringVar(value="Fertimaxi") # Mudei para StringVar para usar no Combobox
 
         # --- Estrutura Principal do Layout ---
@@ -1124,6 +4164,7 @@ class PDFInserterApp:
         self.df_geu = None
         self.lock_shield = None
         self.dados_proprietario_pj_completo = None
+        self.ultimo_kit_motorista = None
 
         # --- Criação das Abas ---
         # Note que agora usamos ttk.Frame e aplicamos o estilo
@@ -1358,6 +4399,9 @@ class PDFInserterApp:
     def on_closing(self):
         print("Sinal de fechamento recebido. Encerrando threads...")
         self.is_closing = True
+        if self.monitor_pasta:
+            self.monitor_pasta.parar()
+        gravar_sessoes_planilha()
         self.root.destroy()
 
     def _process_ui_queue(self):
@@ -1397,6 +4441,11 @@ class PDFInserterApp:
 
     def enviar_email_planilha_geral(self):
         planilha_geral = EXCEL_FILE
+        try:
+            obter_sessao_planilha(planilha_geral).gravar()
+        except Exception as e:
+            messagebox.showerror("Erro ao Salvar", f"Não foi possível gravar a planilha geral antes do envio:\n\n{e}")
+            return
         if not os.path.exists(planilha_geral):
             messagebox.showwarning("Aviso", f"A planilha geral '{os.path.basename(planilha_geral)}' ainda não foi encontrada...")
             return
@@ -1430,13 +4479,62 @@ class PDFInserterApp:
             anexos.append(self.ultima_planilha_gerada)
         _enviar_email(destinatarios, assunto, corpo, anexos)
 
+    def _obter_texto_do_arquivo_com_azure(self, caminho_arquivo):
+        try:
+            texto = obter_texto_do_arquivo_com_azure(caminho_arquivo)
+        except Exception as e:
+            messagebox.showerror("Erro de OCR", f"Não foi possível ler o arquivo '{os.path.basename(caminho_arquivo)}'.\n\nDetalhe: {e}")
+            return ""
+        if not texto.strip():
+            messagebox.showwarning("Aviso", "Nenhum texto foi encontrado no arquivo selecionado.")
+        return texto
+
+    def _ler_documento(self, caminho_arquivo, tipo):
+        try:
+            return ler_documento(caminho_arquivo, tipo)
+        except Exception as e:
+            messagebox.showerror("Erro de Leitura", f"Não foi possível ler o arquivo '{os.path.basename(caminho_arquivo)}'.\n\nDetalhe: {e}")
+            return None
+
+    def selecionar_kit_motorista(self):
+        caminhos = filedialog.askopenfilenames(title="Selecione todos os documentos do motorista (CNH, CRLVs, RNTRC)", filetypes=[("Documentos", "*.pdf *.jpg *.jpeg *.png *.bmp"), ("Todos os arquivos", "*.*")])
+        if not caminhos: return
+        threading.Thread(target=self._worker_kit_motorista, args=(list(caminhos),), daemon=True).start()
+
+    def _worker_kit_motorista(self, caminhos):
+        try:
+            kit = montar_kit_motorista(ler_kit_motorista(caminhos))
+        except Exception as e:
+            traceback.print_exc()
+            self.ui_queue.put((messagebox.showerror, ("Erro", f"Falha ao ler o kit do motorista.\n\nDetalhe: {e}")))
+            return
+        self.ui_queue.put((self._preencher_kit_motorista, (kit,)))
+
+    def _preencher_kit_motorista(self, kit):
+        self.ultimo_kit_motorista = kit
+        motorista = kit["motorista"]
+        if motorista:
+            self.entry_nome.delete(0, tk.END); self.entry_cpf.delete(0, tk.END); self.entry_cnh.delete(0, tk.END)
+            self.entry_nome.insert(0, motorista.get("nome", "")); self.entry_cpf.insert(0, motorista.get("cpf", "")); self.entry_cnh.insert(0, motorista.get("numero", ""))
+        if kit["placas"]:
+            for entry, placa in itertools.zip_longest((self.entry_placa1, self.entry_placa2, self.entry_placa3), kit["placas"], fillvalue=""):
+                entry.delete(0, tk.END)
+                entry.insert(0, placa)
+        resumo = [f"Motorista: {motorista.get('nome', '—') if motorista else 'CNH não encontrada'}",
+                  f"Placas: {', '.join(kit['placas']) or 'nenhum CRLV lido'}",
+                  f"RNTRC: {kit['rntrc'] or '—'}"]
+        if kit["avisos"]:
+            messagebox.showwarning("Kit do Motorista", "\n".join(resumo + [""] + kit["avisos"]))
+        else:
+            messagebox.showinfo("Kit do Motorista", "\n".join(resumo))
+
     def selecionar_e_preencher_cnh(self):
         caminho_arquivo = filedialog.askopenfilename(title="Selecione o PDF ou Imagem da CNH", filetypes=[("Arquivos de CNH", "*.pdf *.jpg *.jpeg *.png *.bmp"),("Todos os arquivos", "*.*")])
         if not caminho_arquivo: return
-        texto_extraido = self._obter_texto_do_arquivo_com_azure(caminho_arquivo)
-        if not texto_extraido:
+        leitura = self._ler_documento(caminho_arquivo, "cnh")
+        if leitura is None:
             return
-        dados = extrair_dados_cnh_com_azure_api(texto_extraido)
+        dados = leitura["dados"]
         if not dados:
             messagebox.showerror("Erro", "Não foi possível extrair dados do texto lido no arquivo.")
             return
@@ -1448,10 +4546,10 @@ class PDFInserterApp:
         caminho_arquivo = filedialog.askopenfilename(title="Selecione o PDF ou Imagem do CRLV", filetypes=[("Arquivos de CRLV", "*.pdf *.jpg *.jpeg *.png *.bmp"), ("Todos os arquivos", "*.*")])
         if not caminho_arquivo:
             return
-        texto_extraido = self._obter_texto_do_arquivo_com_azure(caminho_arquivo)
-        if not texto_extraido:
+        leitura = self._ler_documento(caminho_arquivo, "crlv")
+        if leitura is None:
             return
-        dados_crlv = extrair_dados_crlv_com_azure_api(texto_extraido)
+        dados_crlv = leitura["dados"]
         if not dados_crlv:
             messagebox.showerror("Erro", "Não foi possível extrair os dados do CRLV do arquivo selecionado.")
             return
@@ -1533,6 +4631,14 @@ class PDFInserterApp:
         heringer_check = ttk.Checkbutton(heringer_frame, text="Heringer", variable=self.heringer_var, style="Switch.TCheckbutton")
         heringer_check.pack(anchor='w')
 
+        self.btn_cidades_pendentes = ttk.Button(top_controls_frame, text="⚠ Cidades Pendentes", command=self.abrir_painel_cidades_pendentes, style="Warning.TButton")
+        self.btn_cidades_pendentes.grid(row=0, column=3, sticky='e', pady=(18, 0))
+        self.btn_cidades_pendentes.grid_remove()
+
+        self.btn_monitorar_pasta = ttk.Button(top_controls_frame, text="📂 Monitorar Pasta", command=self.alternar_monitoramento_pasta, style="Secondary.TButton")
+        self.btn_monitorar_pasta.grid(row=0, column=4, sticky='e', padx=(10, 0), pady=(18, 0))
+        if PASTA_CONTRATOS_MONITORADA and os.path.isdir(PASTA_CONTRATOS_MONITORADA):
+            self._iniciar_monitoramento_pasta(PASTA_CONTRATOS_MONITORADA)
 
         # --- Botão Principal de Ação ---
         self.btn_select = ttk.Button(content_frame, text="Selecionar Contratos (PDF)", command=self.selecionar_pdfs, style="Accent.TButton")
@@ -1595,6 +4701,9 @@ class PDFInserterApp:
         btn_import_photo = ttk.Button(heringer_actions_frame, text="📸 Importar da Foto do Pedido", command=self._importar_foto_pedido_heringer, style="Info.TButton")
         btn_import_photo.pack(side=tk.LEFT, padx=10)
         
+        self.btn_import_lote_heringer = ttk.Button(heringer_actions_frame, text="🗂 Importar Pedidos em Lote", command=self._importar_pedidos_heringer_em_lote, style="Info.TButton")
+        self.btn_import_lote_heringer.pack(side=tk.LEFT, padx=10)
+
         btn_add_produto = ttk.Button(heringer_actions_frame, text="➕ Adicionar Produto à Lista", command=self._adicionar_produto_manual, style="Success.TButton")
         btn_add_produto.pack(side=tk.LEFT, padx=10)
 
@@ -1621,6 +4730,8 @@ class PDFInserterApp:
 
     def _toggle_supplier_mode(self, event=None):
         self.produtos.clear()
+        self.cidades_pendentes.clear()
+        self._atualizar_botao_cidades_pendentes()
         for i in self.tree.get_children():
             self.tree.delete(i)
 
@@ -1628,10 +4739,206 @@ class PDFInserterApp:
         if escolha == "Fertimaxi":
             self.btn_select.pack(fill=tk.X, pady=10, ipady=8)
             self.heringer_frame.pack_forget()
+            while self.contratos_monitorados_em_espera:
+                self._adicionar_resultado_contrato(self.contratos_monitorados_em_espera.pop(0))
         else: # Heringer
             self.btn_select.pack_forget()
             self.heringer_frame.pack(fill=tk.X, pady=10)
     
+    # ==============================================================================
+    # INGESTÃO DE CONTRATOS EM LOTE
+    # ==============================================================================
+
+    def selecionar_pdfs(self):
+        caminhos = filedialog.askopenfilenames(title="Selecione os Contratos (PDF)", filetypes=[("Arquivos PDF", "*.pdf"), ("Todos os arquivos", "*.*")])
+        if not caminhos: return
+        self._lote_total = len(caminhos)
+        self._lote_resultados = []
+        self.btn_select.config(state="disabled", text=f"Processando contratos... 0/{self._lote_total}")
+        threading.Thread(target=self._worker_processar_lote_contratos, args=(list(caminhos),), daemon=True).start()
+
+    def _worker_processar_lote_contratos(self, caminhos):
+        try:
+            processar_contratos_em_lote(caminhos, self.cidades_por_uf, lambda r: self.ui_queue.put((self._receber_contrato_processado, (r,))))
+        except Exception as e:
+            print(f"ERRO na ingestão em lote: {e}")
+            traceback.print_exc()
+        self.ui_queue.put((self._finalizar_lote_contratos, ()))
+
+    def _receber_contrato_processado(self, resultado):
+        self._lote_resultados.append(resultado)
+        self._adicionar_resultado_contrato(resultado)
+        self.btn_select.config(text=f"Processando contratos... {len(self._lote_resultados)}/{self._lote_total}")
+
+    def _adicionar_resultado_contrato(self, resultado):
+        if not resultado["erro"]:
+            indices = []
+            for p in resultado["produtos"]:
+                self.produtos.append(p)
+                indices.append(len(self.produtos) - 1)
+                self._inserir_produto_na_tree(len(self.produtos) - 1)
+            if not resultado["cidade"] and len(resultado["candidatas"]) > 1 and indices:
+                self.cidades_pendentes.append({"arquivo": resultado["arquivo"], "sha256": resultado["sha256"], "candidatas": resultado["candidatas"], "indices": indices})
+                self._atualizar_botao_cidades_pendentes()
+
+    def _inserir_produto_na_tree(self, idx):
+        p = self.produtos[idx]
+        cidade = f"⚠ Escolher cidade ({len(p['cidades_candidatas'])} opções)" if p.get("cidades_candidatas") else p.get("cidade", "")
+        valores = ("☐", _format_peso(p.get("toneladas")), p.get("embalagem", ""), p.get("contrato", ""), p.get("cliente", ""), cidade)
+        if self.tree.exists(str(idx)):
+            self.tree.item(str(idx), values=valores)
+        else:
+            self.tree.insert("", tk.END, iid=str(idx), values=valores)
+
+    def _finalizar_lote_contratos(self):
+        self.btn_select.config(state="normal", text="Selecionar Contratos (PDF)")
+        falhas = [r for r in self._lote_resultados if r["erro"]]
+        total_produtos = sum(len(r["produtos"]) for r in self._lote_resultados if not r["erro"])
+        tempo_total = sum(r["duracao"] for r in self._lote_resultados)
+        resumo = f"{len(self._lote_resultados) - len(falhas)} de {len(self._lote_resultados)} contrato(s) processado(s), {total_produtos} produto(s) encontrado(s).\nTempo somado de processamento: {tempo_total:.1f}s"
+        if self.cidades_pendentes:
+            resumo += f"\n\n{len(self.cidades_pendentes)} contrato(s) aguardando a escolha da cidade."
+        if falhas:
+            detalhes = "\n".join(f"- {os.path.basename(r['arquivo'])}: {r['erro']}" for r in falhas)
+            messagebox.showwarning("Contratos Processados com Falhas", f"{resumo}\n\nFalhas:\n{detalhes}")
+        else:
+            messagebox.showinfo("Contratos Processados", resumo)
+        if self.cidades_pendentes:
+            self.abrir_painel_cidades_pendentes()
+
+    # ==============================================================================
+    # IMPORTAÇÃO DE PEDIDOS HERINGER EM LOTE
+    # ==============================================================================
+
+    def _importar_pedidos_heringer_em_lote(self):
+        caminhos = filedialog.askopenfilenames(title="Selecione os Pedidos Heringer (PDF ou fotos)", filetypes=[("Pedidos", "*.pdf *.jpg *.jpeg *.png *.bmp"), ("Todos os arquivos", "*.*")])
+        if not caminhos: return
+        self.btn_import_lote_heringer.config(state="disabled", text="Lendo pedidos...")
+        contratos_existentes = [p.get("contrato") for p in self.produtos]
+        threading.Thread(target=self._worker_pedidos_heringer_em_lote, args=(list(caminhos), contratos_existentes), daemon=True).start()
+
+    def _worker_pedidos_heringer_em_lote(self, caminhos, contratos_existentes):
+        try:
+            resultado = importar_pedidos_heringer_em_lote(caminhos, contratos_existentes)
+        except Exception as e:
+            traceback.print_exc()
+            resultado = {"produtos": [], "paginas": [], "duracao": 0.0, "erro": f"{type(e).__name__}: {e}"}
+        self.ui_queue.put((self._receber_pedidos_heringer_em_lote, (resultado,)))
+
+    def _receber_pedidos_heringer_em_lote(self, resultado):
+        self.btn_import_lote_heringer.config(state="normal", text="🗂 Importar Pedidos em Lote")
+        if resultado.get("erro"):
+            messagebox.showerror("Erro", f"Falha na importação dos pedidos.\n\nDetalhe: {resultado['erro']}")
+            return
+        # Se o operador trocou para Fertimaxi durante a leitura, a lista atual não é mais a da Heringer.
+        adicionados = resultado["produtos"] if self.supplier_var.get() == "Heringer" else []
+        for p in adicionados:
+            self.produtos.append(p)
+            self._inserir_produto_na_tree(len(self.produtos) - 1)
+        def descrever(linha):
+            pagina = f" p{linha['pagina']}" if linha["pagina"] else ""
+            if linha["status"] == "erro":
+                detalhe = linha["erro"]
+            elif linha["status"] == "ok":
+                detalhe = f"{linha['novos']} novo(s), {linha['duplicados']} duplicado(s) ({'/'.join(linha['formatos'])})"
+            else:
+                detalhe = linha["status"]
+            return f"- {os.path.basename(linha['arquivo'])}{pagina}: {detalhe}"
+        paginas = resultado["paginas"]
+        resumo = (f"{len(adicionados)} produto(s) adicionado(s) de {len(paginas)} página(s) em {resultado['duracao']:.1f}s.\n\n"
+                  + "\n".join(descrever(l) for l in paginas))
+        if any(l["status"] != "ok" for l in paginas):
+            messagebox.showwarning("Pedidos Heringer", resumo)
+        else:
+            messagebox.showinfo("Pedidos Heringer", resumo)
+
+    # ==============================================================================
+    # REVISÃO DE CIDADES PENDENTES
+    # ==============================================================================
+
+    def _atualizar_botao_cidades_pendentes(self):
+        if self.cidades_pendentes:
+            self.btn_cidades_pendentes.config(text=f"⚠ Cidades Pendentes ({len(self.cidades_pendentes)})")
+            self.btn_cidades_pendentes.grid()
+        else:
+            self.btn_cidades_pendentes.grid_remove()
+
+    def abrir_painel_cidades_pendentes(self):
+        if not self.cidades_pendentes: return
+        if self.painel_cidades and self.painel_cidades.winfo_exists():
+            self.painel_cidades.destroy()
+        # Janela não modal: a interface (e novos lotes) continuam funcionando enquanto ela está aberta.
+        painel = Toplevel(self.root)
+        painel.title("Revisar Cidades Pendentes")
+        painel.configure(bg=BG_COLOR)
+        painel.transient(self.root)
+        self.painel_cidades = painel
+        ttk.Label(painel, text="Escolha a cidade correta de cada contrato:", style="Title.TLabel").pack(padx=15, pady=(15, 10), anchor='w')
+        lista_frame = ttk.Frame(painel, style="App.TFrame")
+        lista_frame.pack(fill=tk.BOTH, expand=True, padx=15)
+        escolhas = []
+        for linha, pendente in enumerate(self.cidades_pendentes):
+            p = self.produtos[pendente["indices"][0]]
+            descricao = f"{os.path.basename(pendente['arquivo'])} - Pedido {p.get('contrato') or '?'} - {p.get('cliente') or ''}"
+            ttk.Label(lista_frame, text=descricao, style="App.TLabel").grid(row=linha, column=0, sticky='w', padx=(0, 10), pady=4)
+            opcoes = [f"{cidade} - {uf}" for cidade, uf in pendente["candidatas"]]
+            combo = ttk.Combobox(lista_frame, values=opcoes, state="readonly", width=40, font=("Segoe UI", 10))
+            combo.current(0)
+            combo.grid(row=linha, column=1, sticky='ew', pady=4)
+            escolhas.append((pendente, combo))
+        botoes = ttk.Frame(painel, style="App.TFrame")
+        botoes.pack(fill=tk.X, padx=15, pady=15)
+        ttk.Button(botoes, text="Confirmar Todas", command=lambda: self._confirmar_cidades_pendentes(escolhas), style="Success.TButton").pack(side=tk.RIGHT)
+        ttk.Button(botoes, text="Decidir Depois", command=painel.destroy, style="Secondary.TButton").pack(side=tk.RIGHT, padx=10)
+
+    def _confirmar_cidades_pendentes(self, escolhas):
+        for pendente, combo in escolhas:
+            if pendente not in self.cidades_pendentes:
+                continue
+            cidade, uf = pendente["candidatas"][combo.current()]
+            resolver_cidade_pendente([self.produtos[idx] for idx in pendente["indices"]], pendente["sha256"], cidade, uf)
+            for idx in pendente["indices"]:
+                self._inserir_produto_na_tree(idx)
+            self.cidades_pendentes.remove(pendente)
+        self._atualizar_botao_cidades_pendentes()
+        if self.painel_cidades and self.painel_cidades.winfo_exists():
+            self.painel_cidades.destroy()
+
+    # ==============================================================================
+    # PASTA MONITORADA DE CONTRATOS
+    # ==============================================================================
+
+    def alternar_monitoramento_pasta(self):
+        if self.monitor_pasta and self.monitor_pasta.ativo:
+            self.monitor_pasta.parar()
+            self.monitor_pasta = None
+            self.btn_monitorar_pasta.config(text="📂 Monitorar Pasta", style="Secondary.TButton")
+            return
+        pasta = filedialog.askdirectory(title="Selecione a pasta de contratos a monitorar", initialdir=PASTA_CONTRATOS_MONITORADA or None)
+        if pasta:
+            self._iniciar_monitoramento_pasta(pasta)
+
+    def _iniciar_monitoramento_pasta(self, pasta):
+        self.monitor_pasta = MonitorPastaContratos(pasta, self._processar_contrato_monitorado)
+        self.monitor_pasta.iniciar()
+        self.btn_monitorar_pasta.config(text=f"⏹ Monitorando: {os.path.basename(pasta) or pasta}", style="Success.TButton")
+
+    def _processar_contrato_monitorado(self, caminho):
+        # Roda na thread do monitor; só o resultado passa pela fila da interface.
+        resultado = processar_contrato(caminho, self.cidades_por_uf)
+        self.ui_queue.put((self._receber_contrato_monitorado, (resultado,)))
+        return resultado
+
+    def _receber_contrato_monitorado(self, resultado):
+        if resultado["erro"]:
+            print(f"ERRO ao processar contrato da pasta monitorada '{resultado['arquivo']}': {resultado['erro']}")
+            return
+        if self.supplier_var.get() != "Fertimaxi":
+            # A lista atual é da Heringer; o contrato entra quando o operador voltar para Fertimaxi.
+            self.contratos_monitorados_em_espera.append(resultado)
+            return
+        self._adicionar_resultado_contrato(resultado)
+
     # ... Restante do código ...
     # O código continua com TODAS as suas funções, sem nenhuma omissão.
     # O restante do código pode ser colado diretamente após esta seção.
@@ -1643,6 +4950,7 @@ class PDFInserterApp:
 # ==============================================================================
 def main():
     global root
+    recuperar_diarios_planilha()
     CIDADES_VALIDAS = carregar_cidades_nova_logica(PLANILHA_CIDADES)
     if not CIDADES_VALIDAS:
         messagebox.showwarning("Aviso", "A lista de cidades não foi carregada.")
@@ -1748,4 +5056,7 @@ def main():
     root.mainloop()
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    if MODO_HEADLESS:
+        sys.exit(main_headless(sys.argv[1:]))
     main()
@@ -0,0 +1,81 @@
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app
+
+PRODUTOS = [
+    {"cliente": "FAZENDA BOA VISTA", "contrato": f"4500{i:02d}", "produto": "UREIA", "embalagem": "BIG BAG", "toneladas": 30.0, "cidade": "RIO VERDE/GO"}
+    for i in range(24)
+]
+
+
+@pytest.fixture
+def banco(monkeypatch, tmp_path):
+    banco = app.BancoCarregamentos(str(tmp_path / "carregamentos.db"))
+    monkeypatch.setattr(app, "BANCO_CARREGAMENTOS", banco)
+    yield banco
+    banco.fechar()
+
+
+def _registrar_com_motorista(banco, planilha, data):
+    lote_id = banco.registrar_lote(planilha, PRODUTOS, data)
+    banco.atribuir_motorista(planilha, [p["contrato"] for p in PRODUTOS], "JOAO DA SILVA", "ABC-1D23")
+    return lote_id
+
+
+def test_reexportar_a_mesma_data_substitui_o_lote(banco, tmp_path, monkeypatch):
+    planilha = str(tmp_path / "geral.xlsx")
+    primeiro = _registrar_com_motorista(banco, planilha, "10/03/2025")
+    segundo = _registrar_com_motorista(banco, planilha, "10/03/2025")
+    gerados = []
+    monkeypatch.setattr(app, "criar_planilha_especifica_motorista", lambda caminho, produtos, *args: gerados.append(produtos) or True)
+
+    assert app.exportar_planilha_motorista(str(tmp_path / "motorista.xlsx"), "JOAO DA SILVA", "10/03/2025")
+
+    assert len(gerados[0]) == len(PRODUTOS)
+    assert {i["lote_id"] for i in banco.historico_data("10/03/2025")} == {segundo}
+    assert len(banco.itens_do_lote(primeiro)) == len(PRODUTOS)  # o lote antigo continua no banco
+    assert len(app._itens_da_data_por_motorista("10/03/2025")["JOAO DA SILVA"]) == len(PRODUTOS)
+
+
+def test_outra_planilha_ou_data_nao_substitui(banco, tmp_path):
+    _registrar_com_motorista(banco, str(tmp_path / "geral.xlsx"), "10/03/2025")
+    _registrar_com_motorista(banco, str(tmp_path / "geral.xlsx"), "11/03/2025")
+    _registrar_com_motorista(banco, str(tmp_path / "outra.xlsx"), "10/03/2025")
+
+    assert len(banco.historico_data("10/03/2025")) == 2 * len(PRODUTOS)
+    assert len(banco.historico_data("11/03/2025")) == len(PRODUTOS)
+
+
+def test_banco_da_versao_1_ganha_a_coluna(tmp_path):
+    caminho = str(tmp_path / "v1.db")
+    with sqlite3.connect(caminho) as con:
+        con.execute("CREATE TABLE lotes (id INTEGER PRIMARY KEY, planilha TEXT NOT NULL, data_carregamento TEXT NOT NULL, data_iso TEXT, criado_em TEXT NOT NULL)")
+    con.close()
+    banco = app.BancoCarregamentos(caminho)
+
+    _registrar_com_motorista(banco, str(tmp_path / "geral.xlsx"), "10/03/2025")
+    _registrar_com_motorista(banco, str(tmp_path / "geral.xlsx"), "10/03/2025")
+
+    assert len(banco.itens_do_motorista("JOAO DA SILVA", "10/03/2025")) == len(PRODUTOS)
+    banco.fechar()
+
+
+def test_historico_por_pedido_placa_e_data(banco, tmp_path, capsys):
+    planilha = str(tmp_path / "geral.xlsx")
+    _registrar_com_motorista(banco, planilha, "10/03/2025")
+    banco.registrar_lote(planilha, PRODUTOS[:2], "11/03/2025")
+    banco.atribuir_motorista(planilha, [PRODUTOS[0]["contrato"]], "PEDRO SOUZA", "xyz 9k87")
+
+    assert [(i["data_carregamento"], i["motorista"]) for i in banco.historico_pedido(" 450000 ")] == [("10/03/2025", "JOAO DA SILVA"), ("11/03/2025", "PEDRO SOUZA")]
+    assert [i["pedido"] for i in banco.historico_placa("XYZ-9K87")] == ["450000"]
+    assert len(banco.historico_placa("abc1d23")) == len(PRODUTOS)
+    assert len(banco.historico_data("11/03/2025")) == 2
+
+    assert app.main_headless(["historico", "--placa", "XYZ9K87"]) == 0
+    saida = capsys.readouterr().out
+    assert "pedido 450000" in saida and "PEDRO SOUZA" in saida and "1 item(ns)" in saida
@@ -0,0 +1,66 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app
+
+VALOR = {"texto": "x" * 980}  # ~1 KB por entrada
+
+
+@pytest.fixture
+def varreduras(monkeypatch):
+    chamadas = []
+    scandir = os.scandir
+    monkeypatch.setattr(os, "scandir", lambda caminho: chamadas.append(caminho) or scandir(caminho))
+    return chamadas
+
+
+def _chaves(cache):
+    return sorted(nome[:-len(cache.EXTENSAO)] for nome in os.listdir(cache.diretorio))
+
+
+def test_gravar_abaixo_do_limite_so_varre_a_cada_folga(tmp_path, varreduras):
+    tamanho = len(app.json.dumps(VALOR))
+    cache = app.CacheDisco(str(tmp_path), 100 * tamanho)
+
+    for i in range(50):
+        cache.guardar(f"k{i:03d}", VALOR)
+
+    # A que monta o índice e uma a cada 10 gravações (folga de 10% do limite), não uma por gravação.
+    assert len(varreduras) <= 1 + 50 // 10
+    assert len(_chaves(cache)) == 50
+
+
+def test_despejo_remove_os_menos_usados_ate_a_fracao_do_limite(tmp_path):
+    tamanho = len(app.json.dumps(VALOR))
+    cache = app.CacheDisco(str(tmp_path), 100 * tamanho)
+    for i in range(100):
+        cache.guardar(f"k{i:03d}", VALOR)
+    assert cache.obter("k000") == VALOR  # k000 passa a ser o mais recente
+
+    cache.guardar("k100", VALOR)
+
+    assert _chaves(cache) == ["k000"] + [f"k{i:03d}" for i in range(12, 101)]
+
+
+def test_despejo_conta_o_que_outro_processo_gravou(tmp_path):
+    tamanho = len(app.json.dumps(VALOR))
+    cache, outro = app.CacheDisco(str(tmp_path), 10 * tamanho), app.CacheDisco(str(tmp_path), 10 * tamanho)
+    cache.guardar("a0", VALOR)
+    for i in range(9):
+        outro.guardar(f"b{i}", VALOR)
+
+    cache.guardar("a1", VALOR)
+
+    assert len(_chaves(cache)) <= 9
+    assert "a1" in _chaves(cache)
+
+
+def test_entrada_vencida_sai_do_indice(tmp_path):
+    cache = app.CacheOCR(str(tmp_path), 100 * 1024, 3600)
+    cache.guardar("velha", {"texto": "", "criado_em": 0})
+
+    assert cache.obter("velha") is None
+    assert cache._total == 0
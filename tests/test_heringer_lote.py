@@ -0,0 +1,60 @@
+import io
+import os
+import sys
+
+import pytest
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app
+
+
+def _produto(contrato, produto, cliente="JOSE FILHO"):
+    return {"contrato": contrato, "produto": produto, "cliente": cliente, "toneladas": "30.00", "embalagem": "BIG BAG", "cidade": ""}
+
+
+# Cada página é uma imagem de largura diferente; o OCR falso devolve o texto da largura e o
+# leitor falso devolve os produtos do texto.
+PRODUTOS_POR_TEXTO = {
+    "pagina 1": [_produto("1111111", "FERTILIZANTE 20-00-20"), _produto("", "FERTILIZANTE 04-14-08"), _produto(None, "FERTILIZANTE 10-10-10")],
+    "pagina 2": [_produto("1111111", "FERTILIZANTE 20-00-20"), _produto("", "FERTILIZANTE 04-14-08", "MARIA FILHO"), _produto("2222222", "FERTILIZANTE 00-18-18")],
+    "pagina 3": [_produto("3333333", "FERTILIZANTE 05-25-15")],
+}
+TEXTOS_POR_LARGURA = {400: "pagina 1", 500: "pagina 2", 600: "pagina 3"}
+
+
+@pytest.fixture
+def pedidos(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(app, "CACHE_OCR", app.CacheOCR(str(tmp_path / "ocr"), 10 * 1024 * 1024, 3600))
+    monkeypatch.setattr(app, "_ocr_azure_imagem", lambda dados: {"texto": TEXTOS_POR_LARGURA[Image.open(io.BytesIO(dados)).width], "linhas": []})
+    monkeypatch.setattr(app, "_extrair_pedido_heringer_antigo", lambda texto: [dict(p) for p in PRODUTOS_POR_TEXTO.get(texto, [])])
+    monkeypatch.setattr(app, "_extrair_pedido_heringer_eurochem", lambda texto: [])
+    caminhos = []
+    for largura in TEXTOS_POR_LARGURA:
+        caminho = str(tmp_path / f"pedido_{largura}.png")
+        Image.new("L", (largura, 300), 0).save(caminho)
+        caminhos.append(caminho)
+    em_branco = str(tmp_path / "em_branco.png")
+    Image.new("L", (450, 300), 255).save(em_branco)
+    return caminhos[:2] + [em_branco] + caminhos[2:]
+
+
+def test_produtos_sem_contrato_nao_sao_descartados(pedidos):
+    resultado = app.importar_pedidos_heringer_em_lote(pedidos, max_workers=2)
+
+    assert [(p["contrato"], p["produto"]) for p in resultado["produtos"]] == [
+        ("1111111", "FERTILIZANTE 20-00-20"), ("", "FERTILIZANTE 04-14-08"), (None, "FERTILIZANTE 10-10-10"),
+        ("", "FERTILIZANTE 04-14-08"), ("2222222", "FERTILIZANTE 00-18-18"), ("3333333", "FERTILIZANTE 05-25-15"),
+    ]
+    assert [(l["status"], l["novos"], l["duplicados"]) for l in resultado["paginas"]] == [
+        ("ok", 3, 0), ("ok", 2, 1), ("em branco", 0, 0), ("ok", 1, 0),
+    ]
+
+
+def test_contratos_existentes_ficam_fora(pedidos):
+    resultado = app.importar_pedidos_heringer_em_lote(pedidos, contratos_existentes=["2222222", "", None], max_workers=2)
+
+    contratos = [p["contrato"] for p in resultado["produtos"]]
+    assert "2222222" not in contratos
+    assert contratos.count("") == 2 and contratos.count("1111111") == 1
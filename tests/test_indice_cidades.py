@@ -0,0 +1,99 @@
+import os
+import re
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app
+
+# Nomes com acento e nomes contidos em outros (na mesma UF e em UFs diferentes).
+CIDADES = {
+    "GO": [("RIO VERDE",), ("JATAÍ",), ("SANTA HELENA DE GOIÁS",), ("BOM JESUS DE GOIÁS",), ("ITAJÁ",)],
+    "MS": [("RIO VERDE DE MATO GROSSO",), ("SANTA HELENA",)],
+    "MT": [("LUCAS DO RIO VERDE",), ("SORRISO",), ("SÃO JOSÉ DO RIO CLARO",)],
+    "SP": [("SÃO PAULO",), ("SÃO JOSÉ DO RIO PRETO",), ("SÃO JOSÉ",)],
+    "AM": [("SÃO PAULO DE OLIVENÇA",)],
+    "PI": [("BOM JESUS",)],
+    "BA": [("CONCEIÇÃO DO JACUÍPE",), ("SÃO GONÇALO DOS CAMPOS",)],
+    "TO": [("PARAÍSO DO TOCANTINS",), ("PARAÍSO",)],
+}
+SEPARADOR_B = "CONCEIÇÃO DO JACUÍPE - BA. E-mail comercial@fertimaxi.com.br,"
+
+TEXTOS = [
+    "Cliente: Fazenda Boa Vista, Lucas do Rio Verde - MT, entrega em Rio Verde/GO",
+    "CLIENTE: AGRO LTDA\nEndereço: Rodovia BR 060, km 10\nRio Verde de Mato Grosso MS",
+    "cliente: x  São Paulo de Olivença-AM e também São Paulo / SP",
+    "Cliente: Sítio São José do Rio Preto SP; filial São José - SP; São José do Rio Claro MT",
+    "Cliente: Jataí GO Itajá GO Jataí-GO",
+    "Cliente: Fazenda Santa Helena de Goiás GO Santa Helena MS Paraíso do Tocantins TO",
+    "Cliente: Conceição do Jacuípe BA, São Gonçalo dos Campos - BA",
+    "Cliente: Bom Jesus PI e Bom Jesus de Goiás-GO",
+    "Cliente: Fazenda Sorriso Cidade Sorriso e Cidade Paraíso do Tocantins, sem UF",
+    "Cliente: Cidade Rio Verdejante e Cidade São José do Rio",
+    f"Cliente: Granja X Cidade SÃO JOSÉ DO {SEPARADOR_B} RIO PRETO SP, Telefones 000",
+    f"Cliente: Granja Y Cidade PARAÍSO DO {SEPARADOR_B} TOCANTINS TO Telefones 000",
+    "Cliente: Sorrisos MT e Rio Verde-GOIANIA",
+    "Sem cliente: Sorriso MT",
+    "",
+]
+
+
+def _varredura_linear(texto_pdf, cidades_por_uf):
+    """A busca original, com um regex por cidade, que o índice substituiu."""
+    lista = sorted(((app.normalizar_texto_sem_acento(c[0]), uf, c[0]) for uf, cidades in cidades_por_uf.items() for c in cidades),
+                   key=lambda x: len(x[0]), reverse=True)
+    texto = texto_pdf
+    idx_cliente = texto.upper().find("CLIENTE:")
+    if idx_cliente != -1:
+        texto = texto[idx_cliente:]
+    texto = app.normalizar_texto_sem_acento(texto.replace('\n', ' '))
+
+    def filtrar(encontradas):
+        return [(c, u) for p, (c, u) in sorted(encontradas, key=lambda x: x[0]) if "JACUIPE" not in app.normalizar_texto_sem_acento(c)]
+
+    plano_a = filtrar([(m.start(), (orig, uf)) for norm, uf, orig in lista
+                       for m in [re.search(r'\b' + re.escape(norm) + r'[\s/-]+' + re.escape(uf) + r'\b', texto)] if m])
+    if plano_a:
+        return plano_a
+    separador = "CONCEICAO DO JACUIPE - BA. E-MAIL COMERCIAL@FERTIMAXI.COM.BR,"
+    m = re.search(fr"CIDADE\s+(.*?)\s*{re.escape(separador)}\s*(.*?)(?:,|$|\sTELEFONES)", texto)
+    if m:
+        nome = f"{m.group(1).strip()} {m.group(2).strip()}".strip()
+        for norm, uf, orig in lista:
+            if norm in nome and uf in nome:
+                return [(orig, uf)]
+    return filtrar([(m.start(), (orig, uf)) for norm, uf, orig in lista
+                    for m in [re.search(r'CIDADE\s+' + re.escape(norm) + r'\b', texto)] if m])
+
+
+@pytest.mark.parametrize("texto", TEXTOS)
+def test_indice_igual_a_varredura_linear(texto):
+    assert app.encontrar_cidades_candidatas(texto, CIDADES) == _varredura_linear(texto, CIDADES)
+
+
+def test_casos_cobrem_os_tres_planos():
+    resultados = [app.encontrar_cidades_candidatas(t, CIDADES) for t in TEXTOS]
+
+    assert resultados[0] == [("LUCAS DO RIO VERDE", "MT"), ("RIO VERDE", "GO")]
+    assert resultados[3] == [("SÃO JOSÉ DO RIO PRETO", "SP"), ("SÃO JOSÉ", "SP"), ("SÃO JOSÉ DO RIO CLARO", "MT")]
+    assert resultados[10] == [("SÃO JOSÉ DO RIO PRETO", "SP")]  # Plano B
+    assert resultados[8] == [("SORRISO", "MT"), ("PARAÍSO DO TOCANTINS", "TO"), ("PARAÍSO", "TO")]  # Plano C
+
+
+def test_tabela_de_cidades_so_e_lida_de_novo_quando_o_conteudo_muda(monkeypatch, tmp_path):
+    monkeypatch.setattr(app, "CACHE_DIR", str(tmp_path / "cache"))
+    leituras = []
+    monkeypatch.setattr(app, "_ler_planilha_cidades", lambda caminho: leituras.append(caminho) or {"MT": [("SORRISO", "5107925")]})
+    planilha = tmp_path / "ibge.xlsx"
+    planilha.write_bytes(b"versao 1")
+
+    assert app._carregar_cidades_com_cache(str(planilha))["cidades_por_uf"] == {"MT": [("SORRISO", "5107925")]}
+    app._carregar_cidades_com_cache(str(planilha))
+    os.utime(planilha, ns=(0, 0))  # outro mtime, mesmo conteúdo: decide o SHA-256
+    app._carregar_cidades_com_cache(str(planilha))
+    assert len(leituras) == 1
+
+    planilha.write_bytes(b"versao 2")
+    assert app._carregar_cidades_com_cache(str(planilha))["normalizadas"] == {"SORRISO": "SORRISO"}
+    assert len(leituras) == 2
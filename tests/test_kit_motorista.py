@@ -0,0 +1,85 @@
+import io
+import os
+import sys
+import threading
+import time
+
+import pytest
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app
+
+TEXTOS_POR_LARGURA = {
+    400: "CARTEIRA NACIONAL DE HABILITAÇÃO\nNOME\nJOAO DA SILVA\nCPF 123.456.789-09",
+    500: "CERTIFICADO DE REGISTRO E LICENCIAMENTO CRLV\nRENAVAM\n01234567890\nPLACA\nABC1D23",
+    600: "REGISTRO NACIONAL DE TRANSPORTADORES RODOVIÁRIOS ANTT\nRNTRC 012345678",
+}
+
+
+class Simultaneas:
+    """Conta quantas chamadas estão em andamento ao mesmo tempo."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.agora = 0
+        self.maximo = 0
+
+    def __enter__(self):
+        with self.lock:
+            self.agora += 1
+            self.maximo = max(self.maximo, self.agora)
+
+    def __exit__(self, *exc):
+        with self.lock:
+            self.agora -= 1
+
+
+@pytest.fixture
+def kit(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(app, "CACHE_OCR", app.CacheOCR(str(tmp_path / "ocr"), 10 * 1024 * 1024, 3600))
+    uploads, preparos = Simultaneas(), Simultaneas()
+
+    def azure_falso(dados):
+        with uploads:
+            time.sleep(0.3)
+            largura = Image.open(io.BytesIO(dados)).width
+            return {"texto": TEXTOS_POR_LARGURA[largura], "linhas": []}
+
+    preparar_original = app.preparar_imagem_ocr
+
+    def preparar_contando(*args):
+        with preparos:
+            time.sleep(0.05)
+            return preparar_original(*args)
+
+    monkeypatch.setattr(app, "_ocr_azure_imagem", azure_falso)
+    monkeypatch.setattr(app, "preparar_imagem_ocr", preparar_contando)
+    caminhos = []
+    for largura in TEXTOS_POR_LARGURA:
+        caminho = str(tmp_path / f"doc_{largura}.png")
+        Image.new("L", (largura, 300), 0).save(caminho)
+        caminhos.append(caminho)
+    return caminhos, uploads, preparos
+
+
+def test_kit_prepara_um_arquivo_por_vez_e_sobe_em_paralelo(kit):
+    caminhos, uploads, preparos = kit
+
+    resultados = app.ler_kit_motorista(caminhos, max_workers=3)
+
+    assert [r["tipo"] for r in resultados] == ["cnh", "crlv", "rntrc"]
+    assert all(r["erro"] is None for r in resultados)
+    assert preparos.maximo == 1
+    assert uploads.maximo > 1
+
+
+def test_kit_nao_sobe_de_novo_o_que_esta_no_cache(kit):
+    caminhos, uploads, _ = kit
+    app.ler_kit_motorista(caminhos, max_workers=3)
+    uploads.maximo = 0
+
+    resultados = app.ler_kit_motorista(caminhos, max_workers=3)
+
+    assert [r["tipo"] for r in resultados] == ["cnh", "crlv", "rntrc"]
+    assert uploads.maximo == 0
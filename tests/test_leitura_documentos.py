@@ -0,0 +1,52 @@
+import os
+import sys
+
+import fitz
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app
+
+TEXTO_CNH_AZURE = "CARTEIRA NACIONAL DE HABILITAÇÃO\nNOME\nJOAO DA SILVA\nCPF 123.456.789-09"
+
+
+def _pdf_com_texto(caminho, texto):
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), texto)
+    doc.save(caminho)
+    doc.close()
+    return str(caminho)
+
+
+@pytest.fixture
+def azure_falso(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)  # debug_logs/ vai para o diretório temporário
+    chamadas = []
+
+    def obter_texto(caminho):
+        chamadas.append(caminho)
+        return TEXTO_CNH_AZURE
+
+    monkeypatch.setattr(app, "obter_texto_do_arquivo_com_azure", obter_texto)
+    return chamadas
+
+
+def test_cnh_com_camada_de_texto_sem_campos_vai_para_o_azure(tmp_path, azure_falso):
+    caminho = _pdf_com_texto(tmp_path / "cnh.pdf", "Documento qualquer sem dados de CNH")
+
+    resultado = app.ler_documento(caminho, "cnh")
+
+    assert azure_falso == [caminho]
+    assert resultado["caminho"] == "azure"
+    assert "nome" in resultado["motivo"] and "cpf" in resultado["motivo"]
+    assert resultado["dados"]["cpf"] == "123.456.789-09"
+
+
+def test_kit_ignora_cnh_sem_nome_e_cpf(tmp_path):
+    dados = app.extrair_dados_cnh_com_azure_api("Documento qualquer sem dados de CNH")
+    leitura = {"arquivo": str(tmp_path / "cnh.pdf"), "tipo": "cnh", "dados": dados, "caminho": "azure", "erro": None, "duracao": 0.0}
+
+    kit = app.montar_kit_motorista([leitura])
+
+    assert kit["motorista"] == {}
+    assert kit["avisos"]
@@ -0,0 +1,64 @@
+import os
+import random
+import sys
+
+import pytest
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app
+
+CIDADES = {"GO": [("RIO VERDE",), ("JATAÍ",)], "MT": [("SORRISO",)]}
+
+
+def _contrato(caminho, semente, cidade):
+    linhas = app._linhas_contrato_sintetico(random.Random(semente), [cidade], layout_antigo=True)
+    c = canvas.Canvas(str(caminho), pagesize=A4)
+    y = 800
+    for linha in linhas:
+        c.drawString(40, y, linha)
+        y -= 18
+    c.save()
+    return str(caminho)
+
+
+@pytest.fixture
+def contratos(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(app, "CACHE_CONTRATOS", app.CacheDisco(str(tmp_path / "contratos"), 10 * 1024 * 1024))
+    cidades = [("RIO VERDE", "GO"), ("SORRISO", "MT"), ("JATAÍ", "GO"), ("RIO VERDE", "GO")]
+    caminhos = [_contrato(tmp_path / f"c{i}.pdf", i, cidade) for i, cidade in enumerate(cidades)]
+    corrompido = tmp_path / "corrompido.pdf"
+    corrompido.write_bytes(b"%PDF-1.4 isto nao e um pdf")
+    return caminhos, str(corrompido), cidades
+
+
+def _por_arquivo(resultados):
+    return {os.path.basename(r["arquivo"]): r for r in resultados}
+
+
+def test_pool_de_processos_igual_ao_serial_e_isola_falhas(contratos, monkeypatch, tmp_path):
+    caminhos, corrompido, cidades = contratos
+    concluidos = []
+
+    em_pool = _por_arquivo(app.processar_contratos_em_lote(caminhos + [corrompido], CIDADES, concluidos.append, max_workers=2))
+    monkeypatch.setattr(app, "CACHE_CONTRATOS", app.CacheDisco(str(tmp_path / "serial"), 10 * 1024 * 1024))
+    serial = _por_arquivo(app.processar_contratos_em_lote(caminhos, CIDADES, lambda r: None, max_workers=1))
+
+    assert len(concluidos) == len(caminhos) + 1  # ao_concluir chamado para cada arquivo
+    assert em_pool["corrompido.pdf"]["erro"]
+    for i, (cidade, uf) in enumerate(cidades):
+        r = em_pool[f"c{i}.pdf"]
+        assert r["erro"] is None and r["produtos"]
+        assert r["cidade"] == app.formatar_cidade_uf(cidade, uf)
+        assert [p["contrato"] for p in r["produtos"]] == [p["contrato"] for p in serial[f"c{i}.pdf"]["produtos"]]
+
+
+def test_pool_grava_no_cache_de_contratos(contratos):
+    caminhos, _, _ = contratos
+    app.processar_contratos_em_lote(caminhos, CIDADES, lambda r: None, max_workers=2)
+
+    resultados = app.processar_contratos_em_lote(caminhos, CIDADES, lambda r: None, max_workers=2)
+
+    assert all(r["do_cache"] for r in resultados)
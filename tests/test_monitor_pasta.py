@@ -0,0 +1,111 @@
+import os
+import shutil
+import sys
+import threading
+import time
+
+import fitz
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app
+
+
+def _inotify_disponivel(pasta):
+    if not sys.platform.startswith("linux"):
+        return False
+    try:
+        app._InotifyPasta(str(pasta)).fechar()
+    except (OSError, AttributeError):
+        return False
+    return True
+
+
+def _pdf(caminho, texto):
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), texto)
+    doc.save(str(caminho))
+    doc.close()
+    return str(caminho)
+
+
+class Detectados:
+    def __init__(self):
+        self.caminhos = []
+        self.evento = threading.Event()
+
+    def __call__(self, caminho):
+        self.caminhos.append(caminho)
+        self.evento.set()
+        return {"erro": None}
+
+    def aguardar(self, timeout=5.0):
+        ok = self.evento.wait(timeout)
+        self.evento.clear()
+        return ok
+
+
+@pytest.fixture
+def pastas(monkeypatch, tmp_path):
+    monkeypatch.setattr(app, "CACHE_DIR", str(tmp_path / "cache"))
+    vigiada, origem = tmp_path / "contratos", tmp_path / "origem"
+    vigiada.mkdir()
+    origem.mkdir()
+    return vigiada, origem
+
+
+@pytest.fixture
+def monitor(pastas):
+    criados = []
+
+    def criar(ao_detectar, **kwargs):
+        m = app.MonitorPastaContratos(str(pastas[0]), ao_detectar, **kwargs)
+        criados.append(m)
+        m.iniciar()
+        time.sleep(0.2)  # a varredura inicial roda antes de o arquivo chegar
+        return m
+
+    yield criar
+    for m in criados:
+        m.parar()
+        m._thread.join(timeout=5)
+
+
+def test_inotify_avisa_sem_esperar_a_varredura(pastas, monitor):
+    vigiada, origem = pastas
+    if not _inotify_disponivel(vigiada):
+        pytest.skip("inotify indisponível nesta plataforma")
+    detectados = Detectados()
+    # Pela varredura, o PDF só seria tratado depois de duas varreduras e da estabilização (6 s ou
+    # mais); só o evento do inotify explica uma detecção rápida. O select espera até 3 s ao parar.
+    monitor(detectados, intervalo=3, estabilizacao=3)
+
+    inicio = time.monotonic()
+    shutil.copyfile(_pdf(origem / "c1.pdf", "CONTRATO 1"), vigiada / "c1.pdf")
+
+    assert detectados.aguardar()
+    assert time.monotonic() - inicio < 2
+    assert detectados.caminhos == [str(vigiada / "c1.pdf")]
+
+    # Mesmo conteúdo com outro nome (movido para a pasta): reconhecido pelo SHA-256.
+    shutil.copyfile(origem / "c1.pdf", origem / "copia.pdf")
+    os.replace(origem / "copia.pdf", vigiada / "copia.pdf")
+    shutil.copyfile(_pdf(origem / "c2.pdf", "CONTRATO 2"), vigiada / "c2.pdf")
+    assert detectados.aguardar()
+    assert detectados.caminhos == [str(vigiada / "c1.pdf"), str(vigiada / "c2.pdf")]
+
+
+def test_sem_inotify_a_varredura_encontra_o_pdf(pastas, monitor, monkeypatch):
+    vigiada, origem = pastas
+
+    def indisponivel(pasta):
+        raise OSError("sem inotify")
+
+    monkeypatch.setattr(app, "_InotifyPasta", indisponivel)
+    detectados = Detectados()
+    monitor(detectados, intervalo=0.1, estabilizacao=0.2)
+
+    shutil.copyfile(_pdf(origem / "c1.pdf", "CONTRATO 1"), vigiada / "c1.pdf")
+
+    assert detectados.aguardar()
+    assert detectados.caminhos == [str(vigiada / "c1.pdf")]
@@ -0,0 +1,71 @@
+import os
+import random
+import sys
+
+import pytest
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app
+
+CIDADES = {"GO": [("RIO VERDE",)], "MT": [("SORRISO",)]}
+
+
+def _contrato(caminho, semente=1):
+    linhas = app._linhas_contrato_sintetico(random.Random(semente), [("RIO VERDE", "GO")], layout_antigo=True)
+    c = canvas.Canvas(str(caminho), pagesize=A4)
+    y = 800
+    for linha in linhas:
+        c.drawString(40, y, linha)
+        y -= 18
+    c.save()
+    return str(caminho)
+
+
+@pytest.fixture
+def contrato(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)  # debug_logs/ vai para o diretório temporário
+    monkeypatch.setattr(app, "CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(app, "CACHE_CONTRATOS", app.CacheDisco(str(tmp_path / "contratos"), 10 * 1024 * 1024))
+    return _contrato(tmp_path / "contrato.pdf")
+
+
+def _lote(caminho, motor):
+    return app.processar_contratos_em_lote([caminho], CIDADES, lambda r: None, max_workers=1, motor=motor)[0]
+
+
+def test_paridade_compara_sempre_e_nao_encontra_divergencia(contrato, monkeypatch):
+    comparacoes = []
+    comparar = app.comparar_paridade_extracao
+    monkeypatch.setattr(app, "comparar_paridade_extracao", lambda *args: comparacoes.append(comparar(*args)) or comparacoes[-1])
+
+    primeiro = _lote(contrato, "paridade")
+    segundo = _lote(contrato, "paridade")
+
+    assert primeiro["erro"] is None and primeiro["produtos"]
+    assert primeiro["cidade"] == segundo["cidade"] == app.formatar_cidade_uf("RIO VERDE", "GO")
+    assert comparacoes == [[], []]
+    assert not segundo["do_cache"]
+    assert not os.path.exists(os.path.join("debug_logs", "paridade_extracao.jsonl"))
+
+
+def test_cada_motor_tem_sua_entrada_no_cache(contrato):
+    assert not _lote(contrato, "pymupdf")["do_cache"]
+    assert _lote(contrato, "pymupdf")["do_cache"]
+    assert not _lote(contrato, "pdfplumber")["do_cache"]
+    assert [p["produto"] for p in _lote(contrato, "pymupdf")["produtos"]] == [p["produto"] for p in _lote(contrato, "pdfplumber")["produtos"]]
+
+
+def test_motor_desconhecido_volta_como_erro(contrato):
+    assert "Motor de extração desconhecido" in _lote(contrato, "ocr")["erro"]
+
+
+def test_cli_repassa_o_motor(contrato, monkeypatch, tmp_path):
+    chamadas = []
+    monkeypatch.setattr(app, "executar_lote_headless", lambda *args: chamadas.append(args) or {"contratos": [], "produtos": 0, "cidades_pendentes": [], "arquivos_gerados": [], "erros": []})
+
+    assert app.main_headless(["batch", "--contracts", str(tmp_path), "--date", "01/01/2025", "--motor", "paridade"]) == 0
+    assert chamadas[0][-1] == "paridade"
+    with pytest.raises(SystemExit):
+        app.main_headless(["batch", "--contracts", str(tmp_path), "--date", "01/01/2025", "--motor", "ocr"])
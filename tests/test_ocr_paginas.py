@@ -0,0 +1,73 @@
+import io
+import os
+import sys
+
+import fitz
+import pytest
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app
+
+
+def _png(largura, altura):
+    saida = io.BytesIO()
+    Image.new("L", (largura, altura), 0).save(saida, "PNG")
+    return saida.getvalue()
+
+
+@pytest.fixture
+def scan(tmp_path):
+    """PDF de três páginas A4: uma em branco, uma com um carimbo pequeno e uma com texto."""
+    caminho = str(tmp_path / "scan.pdf")
+    doc = fitz.open()
+    doc.new_page()
+    doc.new_page().insert_image(fitz.Rect(100, 100, 300, 200), stream=_png(400, 200))
+    doc.new_page().insert_text((72, 72), "PEDIDO 1234567")
+    doc.save(caminho)
+    doc.close()
+    return caminho
+
+
+@pytest.fixture
+def rasterizacoes(monkeypatch):
+    areas = []
+    get_pixmap = fitz.Page.get_pixmap
+
+    def contar(pagina, *args, **kwargs):
+        pixmap = get_pixmap(pagina, *args, **kwargs)
+        areas.append((pagina.number + 1, kwargs.get("clip"), pixmap.width, pixmap.height))
+        return pixmap
+
+    monkeypatch.setattr(fitz.Page, "get_pixmap", contar)
+    return areas
+
+
+def test_pagina_sem_conteudo_nao_e_rasterizada(scan, rasterizacoes):
+    preparadas = {numero: obter() for numero, obter in app._paginas_para_ocr(scan)}
+
+    assert preparadas[1] is None
+    assert [numero for numero, *_ in rasterizacoes] == [2, 3]
+
+
+def test_so_a_area_com_conteudo_e_rasterizada(scan, rasterizacoes):
+    preparadas = {numero: obter() for numero, obter in app._paginas_para_ocr(scan)}
+
+    _, area, largura, altura = rasterizacoes[0]
+    margem = app.OCR_MARGEM_RECORTE
+    assert area == fitz.Rect(100 - margem, 100 - margem, 300 + margem, 200 + margem)
+    assert max(largura, altura) <= app.OCR_LADO_MAXIMO
+    # O canto do carimbo na imagem enviada volta para perto de (100, 100) na página.
+    _, geometria = preparadas[2]
+    (x, y), = app._poligono_na_origem([[0, 0]], geometria)
+    assert 100 - margem <= x <= 100 and 100 - margem <= y <= 100
+
+
+def test_lote_heringer_registra_pagina_sem_conteudo_como_em_branco(scan, rasterizacoes, monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(app, "CACHE_OCR", app.CacheOCR(str(tmp_path / "ocr"), 10 * 1024 * 1024, 3600))
+    monkeypatch.setattr(app, "_ocr_azure_imagem", lambda dados: {"texto": "", "linhas": []})
+
+    resultado = app.importar_pedidos_heringer_em_lote([scan], max_workers=1)
+
+    assert [l["status"] for l in resultado["paginas"]] == ["em branco", "sem produtos", "sem produtos"]
@@ -0,0 +1,66 @@
+import os
+import sys
+
+import fitz
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app
+
+PRODUTOS = [
+    {"cliente": "FAZENDA BOA VISTA & CIA", "contrato": "450001", "produto": "UREIA GRANULADA", "embalagem": "BIG BAG", "toneladas": 32.5, "cidade": "RIO VERDE/GO"},
+    {"cliente": "AGRO <NORTE> LTDA", "contrato": "450002", "produto": "MAP 11-52-00", "embalagem": "GRANEL", "toneladas": 14, "cidade": "SORRISO/MT"},
+]
+
+
+@pytest.fixture(autouse=True)
+def cache_saidas(monkeypatch, tmp_path):
+    monkeypatch.setattr(app, "CACHE_SAIDAS", app.CacheSaidas(str(tmp_path / "saidas"), 10 * 1024 * 1024))
+
+
+def _texto(caminho):
+    with fitz.open(caminho) as doc:
+        return " ".join(" ".join(pagina.get_text().split()) for pagina in doc)
+
+
+def _dados_oc(**extra):
+    return {"produtos": PRODUTOS, "cpf": "123.456.789-09", "nome": "JOAO DA SILVA", "cnh": "01234567890", "fone": "(27) 99999-0000",
+            "placa1": "ABC1D23", "placa2": "DEF4G56", "placa3": "", "data_carregamento": "10/03/2025", "modelo_docx": "sem_modelo.docx", **extra}
+
+
+def test_oc_em_pdf_nativo_sem_o_modelo_docx(tmp_path):
+    caminho = str(tmp_path / "oc.pdf")
+
+    resultado = app.gerar_documento("oc", caminho, _dados_oc())
+
+    assert resultado["erro"] is None and not resultado["do_cache"]
+    texto = _texto(caminho)
+    for esperado in ("ORDEM DE COLETA", "10/03/2025", "JOAO DA SILVA", "01234567890", "ABC1D23", "DEF4G56",
+                     "450001", "450002", "UREIA GRANULADA", "FAZENDA BOA VISTA & CIA", "AGRO <NORTE> LTDA", "RIO VERDE/GO"):
+        assert esperado in texto
+    assert app.gerar_documento("oc", str(tmp_path / "oc2.pdf"), _dados_oc())["do_cache"]
+
+
+def test_carta_frete_em_pdf_nativo(tmp_path):
+    caminho = str(tmp_path / "carta.pdf")
+    dados = {"VALOR_FRETE": "1234.5", "DATA": "10/03/2025", "CONDUTOR": "JOAO DA SILVA", "CPF": "123.456.789-09",
+             "PLACA_CAVALO": "ABC1D23", "PLACA_CARRETA": "DEF4G56", "CTE": "98765"}
+
+    resultado = app.gerar_documento("carta_frete", caminho, dados)
+
+    assert resultado["erro"] is None
+    texto = _texto(caminho)
+    for rotulo, chave in app.LAYOUT_CARTA_FRETE_PADRAO["campos"]:
+        assert f"{rotulo} {dados[chave]}" in texto
+    assert f"R$ {app.formatar_moeda_brasileira('1234.5')}" in texto
+
+
+def test_lote_de_documentos_em_processos(tmp_path):
+    trabalhos = [{"tipo": "oc", "pdf": str(tmp_path / f"oc{i}.pdf"), "dados": _dados_oc(nome=f"MOTORISTA {i}")} for i in range(4)]
+
+    resultados = app.gerar_documentos_em_lote(trabalhos, max_workers=2)
+
+    assert [r["pdf"] for r in resultados] == [t["pdf"] for t in trabalhos]
+    assert all(r["erro"] is None for r in resultados)
+    assert [f"MOTORISTA {i}" in _texto(t["pdf"]) for i, t in enumerate(trabalhos)] == [True] * 4
+    assert app.CACHE_SAIDAS.copiar_contagem()["oc_pdf"] == {"acertos": 0, "faltas": 4}
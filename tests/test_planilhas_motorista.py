@@ -0,0 +1,75 @@
+import os
+import sys
+
+import pytest
+from openpyxl import Workbook, load_workbook
+from openpyxl.styles import Font, PatternFill
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app
+
+CABECALHO = ["Cliente", "Data de Carregamento", "Placa cavalo mecânico", "Nome do condutor", "Número do pedido", "Produto", "Embalagem", "Quantidade", "Cidade/UF"]
+
+
+def _modelo(caminho):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = app.SHEET_NAME
+    ws.append(CABECALHO)
+    for linha in range(3, 31):
+        for col in range(1, len(CABECALHO) + 1):
+            celula = ws.cell(row=linha, column=col, value="antigo")
+            celula.font = Font(bold=linha <= 14)
+            if linha > 14:
+                celula.fill = PatternFill("solid", fgColor="DDDDDD")
+        ws.row_dimensions[linha].height = 18 if linha <= 14 else 30
+    wb.save(caminho)
+
+
+def _produtos(n, contrato_inicial):
+    return [{"cliente": f"CLIENTE {i}", "contrato": str(contrato_inicial + i), "produto": "UREIA", "embalagem": "GRANEL", "toneladas": 32.5, "cidade": "SORRISO/MT"} for i in range(n)]
+
+
+def _trabalho(pasta, nome, n, contrato_inicial):
+    return {"caminho": str(pasta / f"{nome}.xlsx"), "produtos": _produtos(n, contrato_inicial), "nome_condutor": nome, "placa_cavalo": "ABC1D23"}
+
+
+def _conteudo(caminho):
+    ws = load_workbook(caminho)[app.SHEET_NAME]
+    return [[(c.value, c.font.b, c.fill.fgColor.rgb) for c in linha] for linha in ws.iter_rows(min_row=1, max_row=30, max_col=len(CABECALHO))], \
+        [ws.row_dimensions[r].height for r in range(1, 31)]
+
+
+@pytest.fixture
+def modelo(monkeypatch, tmp_path):
+    caminho = str(tmp_path / "geral.xlsx")
+    _modelo(caminho)
+    monkeypatch.setattr(app, "MODELO_PLANILHA_MOTORISTA", app.ModeloPlanilhaMotorista(caminho))
+    monkeypatch.setattr(app, "CACHE_SAIDAS", app.CacheSaidas(str(tmp_path / "saidas"), 10 * 1024 * 1024))
+    return caminho
+
+
+def test_planilha_gerada_depois_de_outras_igual_a_de_modelo_novo(modelo, tmp_path):
+    trabalhos = [_trabalho(tmp_path, "LONGO", 20, 1000), _trabalho(tmp_path, "CURTO", 3, 2000)]
+
+    resultados = app.criar_planilhas_motoristas_em_lote(trabalhos, "10/03/2025", max_workers=1)
+
+    assert all(r["ok"] for r in resultados)
+    dados_modelo, _ = app.MODELO_PLANILHA_MOTORISTA.preparado()
+    referencia = str(tmp_path / "referencia.xlsx")
+    app.CopiaModeloPlanilhaMotorista(dados_modelo).gerar(referencia, trabalhos[1]["produtos"], "10/03/2025", "CURTO", "ABC1D23")
+    assert _conteudo(trabalhos[1]["caminho"]) == _conteudo(referencia)
+    valores, alturas = _conteudo(trabalhos[0]["caminho"])
+    assert [linha[4][0] for linha in valores[2:22]] == [str(1000 + i) for i in range(20)]
+    assert valores[20][0][1] is True and alturas[20] == 18  # linha 21 copia o estilo da 14
+    assert valores[22][0] == (None, False, "00DDDDDD") and alturas[22] == 30  # linha 23 segue o modelo
+
+
+def test_contagem_do_cache_volta_dos_processos(modelo, tmp_path):
+    trabalhos = [_trabalho(tmp_path, f"MOTORISTA {i}", 2, 1000 * i) for i in range(4)]
+    app.criar_planilhas_motoristas_em_lote(trabalhos, "10/03/2025", max_workers=2)
+
+    resultados = app.criar_planilhas_motoristas_em_lote(trabalhos, "10/03/2025", max_workers=2)
+
+    assert all(r["do_cache"] for r in resultados)
+    assert app.CACHE_SAIDAS.copiar_contagem()["planilha_motorista"] == {"acertos": 4, "faltas": 4}
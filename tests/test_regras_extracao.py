@@ -0,0 +1,37 @@
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app
+
+TEXTO_RNTRC = "REGISTRO NACIONAL DE TRANSPORTADORES RODOVIÁRIOS ANTT\nRNTRC 012345678"
+
+
+def test_rntrc_registra_o_diagnostico(capsys):
+    dados = app.extrair_dados_rntrc_com_azure_api(TEXTO_RNTRC)
+
+    assert dados.get("rntrc")
+    assert "[REGRAS] RNTRC: rntrc=" in capsys.readouterr().out
+
+
+def test_estatisticas_nao_perdem_contagem_entre_threads(monkeypatch):
+    monkeypatch.setattr(app, "ESTATISTICAS_REGRAS", app.collections.defaultdict(lambda: {"acertos": 0, "tentativas": 0, "tempo": 0.0}))
+    intervalo = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # troca de thread a todo instante, para expor a corrida
+    doc = app.TextoDocumento(TEXTO_RNTRC.replace("RNTRC", ""))
+
+    def aplicar():
+        for _ in range(500):
+            app.REGRAS_RNTRC.aplicar(doc)
+
+    try:
+        threads = [threading.Thread(target=aplicar) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        sys.setswitchinterval(intervalo)
+
+    assert sum(e["tentativas"] for (nome, _, _), e in app.ESTATISTICAS_REGRAS.items() if nome == "RNTRC") == 8 * 500 * len(app.REGRAS_RNTRC.campos)
@@ -0,0 +1,56 @@
+import os
+import sys
+
+import fitz
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app
+
+
+def _gerar(caminho, quantidade, paginas_por_parte, monkeypatch):
+    monkeypatch.setattr(app, "PAGINAS_POR_PARTE_RELATORIO", paginas_por_parte)
+    totais = app.gerar_relatorio_pedidos(str(caminho), app._itens_relatorio_sinteticos(quantidade, 3), "01/03/2025 a 31/03/2025", "Nenhum")
+    with fitz.open(str(caminho)) as doc:
+        return totais, [pagina.get_text() for pagina in doc]
+
+
+@pytest.fixture(autouse=True)
+def pasta(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.mark.parametrize("quantidade", [1, 150, 400])
+def test_relatorio_em_partes_igual_ao_de_uma_parte(quantidade, pasta, monkeypatch):
+    totais, paginas = _gerar(pasta / "partes.pdf", quantidade, 2, monkeypatch)
+    _, referencia = _gerar(pasta / "inteiro.pdf", quantidade, 10_000, monkeypatch)
+
+    pedidos = {str(100000 + i) for i in range(quantidade)}
+    linhas = [linha for texto in paginas for linha in texto.splitlines() if linha in pedidos]
+    assert linhas == sorted(pedidos)
+    assert totais.pedidos == quantidade
+    assert len(paginas) == len(referencia)
+    assert all(texto.count("Nro. Pedido") == 1 for texto in paginas)  # cabeçalho em toda página
+    assert [texto.count("Total Geral de Pedidos") for texto in paginas] == [0] * (len(paginas) - 1) + [1]
+    if quantidade == 400:
+        assert len(paginas) > 2 * 2  # mais de duas partes de fato
+
+
+def _resumo(paginas):
+    # (cabeçalhos, linhas de pedido, totais) de cada página.
+    return [(texto.count("Nro. Pedido"), sum(1 for l in texto.splitlines() if l.isdigit() and len(l) == 6), texto.count("Total Geral de Pedidos"))
+            for texto in paginas]
+
+
+def test_parte_que_termina_junto_com_as_linhas(pasta, monkeypatch):
+    # Exatamente as linhas de duas páginas: os totais vão sozinhos para a página seguinte, como no
+    # relatório de uma parte, sem parte vazia nem totais repetidos.
+    _, paginas = _gerar(pasta / "medida.pdf", 400, 10_000, monkeypatch)
+    quantidade = sum(linhas for _, linhas, _ in _resumo(paginas)[:2])
+
+    _, paginas = _gerar(pasta / "exato.pdf", quantidade, 2, monkeypatch)
+    _, referencia = _gerar(pasta / "inteiro.pdf", quantidade, 10_000, monkeypatch)
+
+    assert _resumo(paginas) == _resumo(referencia)
+    assert _resumo(paginas)[-1] == (0, 0, 1)
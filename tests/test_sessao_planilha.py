@@ -0,0 +1,90 @@
+import os
+import shutil
+import sys
+
+import pytest
+from openpyxl import load_workbook
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app
+
+PRODUTOS = [
+    {"cliente": "FAZENDA BOA VISTA", "contrato": f"4500{i:02d}", "produto": "UREIA", "embalagem": "BIG BAG", "toneladas": 30.5, "cidade": "RIO VERDE/GO"}
+    for i in range(16)
+]
+
+
+@pytest.fixture
+def ambiente(monkeypatch, tmp_path):
+    monkeypatch.setattr(app, "CACHE_DIR", str(tmp_path / "cache"))
+    banco = app.BancoCarregamentos(str(tmp_path / "carregamentos.db"))
+    monkeypatch.setattr(app, "BANCO_CARREGAMENTOS", banco)
+    monkeypatch.setattr(app, "_SESSOES_PLANILHA", {})
+    yield tmp_path
+    for sessao in list(app._SESSOES_PLANILHA.values()):
+        sessao.fechar()
+    banco.fechar()
+
+
+def _sessao(caminho):
+    # Sem gravação automática: o que não for gravado explicitamente só existe no diário.
+    sessao = app.SessaoPlanilha(os.path.abspath(caminho), atraso_gravacao=None)
+    app._SESSOES_PLANILHA[os.path.abspath(caminho)] = sessao
+    return sessao
+
+
+def _operar(caminho):
+    app.append_rows_to_excel(caminho, PRODUTOS, "10/03/2025")
+    app.update_excel_with_driver_data(caminho, "JOAO DA SILVA", "ABC1D23", PRODUTOS[:3])
+    app.update_excel_with_driver_data(caminho, "PEDRO SOUZA", "XYZ9K87", PRODUTOS[3:5])
+
+
+def _valores(caminho):
+    ws = load_workbook(caminho)[app.SHEET_NAME]
+    return [list(linha) for linha in ws.iter_rows(values_only=True)]
+
+
+@pytest.fixture
+def referencia(ambiente):
+    caminho = str(ambiente / "referencia.xlsx")
+    sessao = _sessao(caminho)
+    _operar(caminho)
+    assert sessao.gravar()
+    return _valores(caminho)
+
+
+def test_queda_antes_de_gravar_reconstroi_pelo_diario(ambiente, referencia):
+    caminho = str(ambiente / "geral.xlsx")
+    sessao = _sessao(caminho)
+    sessao.abrir()
+    assert sessao.gravar()  # só o cabeçalho chega ao disco
+    _operar(caminho)
+    assert len(app._ler_diario_planilha(sessao.caminho_diario)) == 3
+    with open(sessao.caminho_diario, "a", encoding="utf-8") as f:
+        f.write('{"op": "motorista", "driver_na')  # linha cortada pela queda
+    app._SESSOES_PLANILHA.clear()  # o processo caiu: o workbook em memória se perdeu
+    assert len(_valores(caminho)) == 1
+
+    app.recuperar_diarios_planilha()
+
+    valores = _valores(caminho)
+    assert valores == referencia
+    assert [linha[3] for linha in valores[2:7]] == ["JOAO DA SILVA"] * 3 + ["PEDRO SOUZA"] * 2
+    assert len(valores) == 2 + len(PRODUTOS)
+    assert not os.path.exists(sessao.caminho_diario)
+
+
+def test_diario_de_gravacao_concluida_nao_altera_a_planilha(ambiente, referencia):
+    caminho = str(ambiente / "geral.xlsx")
+    sessao = _sessao(caminho)
+    _operar(caminho)
+    copia_diario = str(ambiente / "diario.jsonl")
+    shutil.copyfile(sessao.caminho_diario, copia_diario)
+    assert sessao.gravar()
+    shutil.copyfile(copia_diario, sessao.caminho_diario)  # caiu depois do os.replace, antes de apagar o diário
+    app._SESSOES_PLANILHA.clear()
+
+    app.recuperar_diarios_planilha()
+
+    assert _valores(caminho) == referencia
+    assert not os.path.exists(sessao.caminho_diario)